@@ -0,0 +1,179 @@
+"""
+Per-user activity counters and recent posts.
+
+UserDetail keeps denormalized counts of a user's live questions, answers and
+comments and of the upvotes their posts received. They are updated on every
+write through record_user_activity() and can be recomputed from the source
+tables with rebuild_user_counters(). A user's recent questions and answers are
+keyset-paginated on id (newest first) over the (user, -id) indexes, so an
+activity summary costs the same two queries (per shard) however active the
+user is.
+"""
+from collections import Counter
+
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from rest_framework.utils.urls import replace_query_param
+
+from . import sharding
+from .models import Answer, Comment, Question, Upvote, UserDetail
+
+DEFAULT_RECENT_LIMIT = 5
+MAX_RECENT_LIMIT = 50
+
+# counter name in responses -> UserDetail field
+COUNTERS = {
+    "questions": "question_count",
+    "answers": "answer_count",
+    "comments": "comment_count",
+    "upvotes_received": "upvotes_received",
+}
+
+
+def record_user_activity(user_id, questions=0, answers=0, comments=0, upvotes_received=0):
+    """Apply counter deltas (+1 / -1) to a user's activity counters."""
+    deltas = {
+        "question_count": questions,
+        "answer_count": answers,
+        "comment_count": comments,
+        "upvotes_received": upvotes_received,
+    }
+    UserDetail.objects.filter(id=user_id).update(
+        **{
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+            if delta
+        }
+    )
+
+
+def rebuild_user_counters(batch_size=1000, ids=None):
+    """
+    Recount every user's (or only the given ids') activity counters from the
+    source tables.
+
+    :return: number of users updated
+    """
+    users = UserDetail.objects.only("id")
+    if ids is not None:
+        users = users.filter(id__in=ids)
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(users.filter(id__gt=last_id).order_by("id")[:batch_size])
+        if not batch:
+            return updated
+        ids = [user.id for user in batch]
+
+        def grouped(queryset, field="user_id"):
+            counts = Counter()
+            for _ in sharding.each_shard():
+                counts.update(
+                    dict(
+                        queryset.filter(**{f"{field}__in": ids})
+                        .values_list(field)
+                        .annotate(n=Count("id"))
+                    )
+                )
+            return counts
+
+        questions = grouped(Question.objects.filter(question_deleted=False))
+        answers = grouped(Answer.objects.filter(answer_deleted=False))
+        comments = grouped(Comment.objects.filter(comment_deleted=False))
+        question_votes = grouped(
+            Upvote.objects.filter(question__isnull=False), "question__user_id"
+        )
+        answer_votes = grouped(Upvote.objects.filter(answer__isnull=False), "answer__user_id")
+
+        for user in batch:
+            user.question_count = questions.get(user.id, 0)
+            user.answer_count = answers.get(user.id, 0)
+            user.comment_count = comments.get(user.id, 0)
+            user.upvotes_received = question_votes.get(user.id, 0) + answer_votes.get(
+                user.id, 0
+            )
+        UserDetail.objects.bulk_update(batch, list(COUNTERS.values()))
+        updated += len(batch)
+        last_id = ids[-1]
+
+
+# ----------------- Activity summary -----------------
+
+
+def _before(request, name):
+    try:
+        return int(request.GET.get(name, 0)) or None
+    except ValueError:
+        return None
+
+
+def recent_post_querysets(user, request):
+    """
+    Return (limit, questions, answers): querysets of the user's live recent
+    questions and answers, newest first, sliced to one row more than the page
+    so the presence of a next page is known. ?questions_before= and
+    ?answers_before= continue after the given id, ?limit= sets the page size.
+    """
+    try:
+        limit = int(request.GET.get("limit", DEFAULT_RECENT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_RECENT_LIMIT
+    limit = min(max(limit, 1), MAX_RECENT_LIMIT)
+
+    questions = Question.objects.filter(user_id=user.id, question_deleted=False)
+    before = _before(request, "questions_before")
+    if before:
+        questions = questions.filter(id__lt=before)
+    answers = Answer.objects.filter(user_id=user.id, answer_deleted=False)
+    before = _before(request, "answers_before")
+    if before:
+        answers = answers.filter(id__lt=before)
+
+    questions = sharding.scatter(
+        questions.order_by("-id").values(
+            "id", "question_title", "question_tag", "answer_count", "upvote_count", "timestamp"
+        )
+    )[: limit + 1]
+    answers = sharding.scatter(
+        answers.order_by("-id").values(
+            "id", "question_id", "question__question_title", "vote_count", "timestamp"
+        )
+    )[: limit + 1]
+    return limit, questions, answers
+
+
+def _page(request, rows, limit, param):
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_url = replace_query_param(request.build_absolute_uri(), param, rows[-1]["id"])
+    return {"next": next_url, "results": rows}
+
+
+def activity_summary(user, request, questions, answers, limit):
+    """Build the activity payload from evaluated recent_post_querysets rows."""
+    for answer in answers:
+        answer["question_title"] = answer.pop("question__question_title")
+    return {
+        "counts": {name: getattr(user, field) for name, field in COUNTERS.items()},
+        "recent_questions": _page(request, questions, limit, "questions_before"),
+        "recent_answers": _page(request, answers, limit, "answers_before"),
+    }
+
+
+def user_activity(user, request):
+    """Activity counters and recent posts of a user (two queries)."""
+    limit, questions, answers = recent_post_querysets(user, request)
+    return activity_summary(user, request, list(questions), list(answers), limit)
+
+
+async def auser_activity(user, request):
+    """Async version of user_activity."""
+    limit, questions, answers = recent_post_querysets(user, request)
+    return activity_summary(
+        user,
+        request,
+        [row async for row in questions],
+        [row async for row in answers],
+        limit,
+    )
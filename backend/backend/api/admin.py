@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import UserDetail, Admin, Question, Answer, Upvote, Notification, Comment
+from .models import (
+    UserDetail,
+    Admin,
+    Question,
+    Answer,
+    Upvote,
+    Notification,
+    Comment,
+    ImportJob,
+)
 
 admin.site.register(UserDetail)
 admin.site.register(Admin)
@@ -8,3 +17,4 @@ admin.site.register(Answer)
 admin.site.register(Upvote)
 admin.site.register(Notification)
 admin.site.register(Comment)
+admin.site.register(ImportJob)
@@ -0,0 +1,213 @@
+"""
+Pre-aggregated activity counts for the admin analytics endpoint.
+
+refresh_rollups() reads only the rows created since the last run (tracked
+per metric and shard by an id watermark) and adds them to daily and weekly
+ActivityRollup buckets, both overall (tag "") and per tag (the lower-cased
+names of a comma-separated question_tag, see split_tags). Each
+batch of counts is committed together with its watermark, so the job is
+idempotent and can be run as often as wanted. Rows are bucketed by their own
+timestamp, so imported historical rows land in the right periods. Counts are
+of rows created: later soft deletes and removed upvotes are not subtracted.
+"""
+import datetime
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import sharding
+from .models import (
+    ActivityRollup,
+    Answer,
+    Comment,
+    Question,
+    RollupWatermark,
+    Upvote,
+    UserDetail,
+)
+from .utils import split_tags
+
+# metric -> (model, timestamp field, tag expression or None)
+METRICS = {
+    "users": (UserDetail, "date_joined", None),
+    "questions": (Question, "timestamp", F("question_tag")),
+    "answers": (Answer, "timestamp", F("question__question_tag")),
+    "comments": (Comment, "timestamp", F("answer__question__question_tag")),
+    "votes": (
+        Upvote,
+        "timestamp",
+        Coalesce("question__question_tag", "answer__question__question_tag"),
+    ),
+}
+PERIODS = ["day", "week"]
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def period_start(day, period):
+    """Return the first day of the period containing day (weeks start on Monday)."""
+    if period == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+def _new_rows(metric, last_id, batch_size):
+    """Return up to batch_size (id, timestamp, tag) rows after last_id."""
+    model, timestamp_field, tag = METRICS[metric]
+    queryset = model.objects.filter(id__gt=last_id).order_by("id")
+    if tag is None:
+        return [
+            (row_id, timestamp, None)
+            for row_id, timestamp in queryset.values_list("id", timestamp_field)[:batch_size]
+        ]
+    return list(
+        queryset.annotate(rollup_tag=tag).values_list("id", timestamp_field, "rollup_tag")[
+            :batch_size
+        ]
+    )
+
+
+def _add_counts(metric, counts):
+    """Add {(period, period_start, tag): n} to the rollup rows of a metric."""
+    lookup = Q()
+    for period, start, tag in counts:
+        lookup |= Q(period=period, period_start=start, tag=tag)
+    existing = {
+        (row.period, row.period_start, row.tag): row
+        for row in ActivityRollup.objects.filter(lookup, metric=metric)
+    }
+
+    created = []
+    for key, n in counts.items():
+        if key in existing:
+            existing[key].count += n
+        else:
+            period, start, tag = key
+            created.append(
+                ActivityRollup(
+                    period=period, period_start=start, metric=metric, tag=tag, count=n
+                )
+            )
+    ActivityRollup.objects.bulk_update(existing.values(), ["count"])
+    ActivityRollup.objects.bulk_create(created)
+
+
+def watermark_name(metric, alias=None):
+    """The watermark of a metric on a shard (the first shard keeps the plain name)."""
+    if alias is None or alias == sharding.shards()[0]:
+        return metric
+    return f"{metric}@{alias}"
+
+
+def refresh_metric(metric, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Roll up the rows of one metric created since its watermark(s).
+
+    :return: number of rows counted
+    """
+    if not sharding.is_sharded(METRICS[metric][0]):
+        return _refresh(metric, watermark_name(metric), batch_size)
+    return sum(
+        _refresh(metric, watermark_name(metric, alias), batch_size)
+        for alias in sharding.each_shard()
+    )
+
+
+def _refresh(metric, name, batch_size):
+    RollupWatermark.objects.get_or_create(metric=name)
+    processed = 0
+    while True:
+        with transaction.atomic(using=sharding.global_database()):
+            watermark = RollupWatermark.objects.select_for_update().get(metric=name)
+            rows = _new_rows(metric, watermark.last_id, batch_size)
+            if not rows:
+                return processed
+
+            counts = Counter()
+            for _, timestamp, tag in rows:
+                day = timezone.localtime(timestamp).date()
+                for period in PERIODS:
+                    start = period_start(day, period)
+                    counts[(period, start, "")] += 1
+                    for tag_name in set(split_tags(tag)):
+                        counts[(period, start, tag_name)] += 1
+            _add_counts(metric, counts)
+
+            watermark.last_id = rows[-1][0]
+            watermark.save(update_fields=["last_id", "updated_at"])
+        processed += len(rows)
+
+
+def refresh_rollups(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Bring every metric's rollups up to date.
+
+    :return: {metric: rows counted}
+    """
+    return {metric: refresh_metric(metric, batch_size=batch_size) for metric in METRICS}
+
+
+def rebuild_rollups(batch_size=DEFAULT_BATCH_SIZE):
+    """Drop every rollup and watermark and roll all rows up again."""
+    with transaction.atomic(using=sharding.global_database()):
+        ActivityRollup.objects.all().delete()
+        RollupWatermark.objects.all().delete()
+    return refresh_rollups(batch_size=batch_size)
+
+
+def rollup_series(period, metrics, since, until, tag=""):
+    """
+    Return {metric: [{"date": ..., "count": ...}]} for the periods starting
+    between since and until, read from the rollups only. Periods without
+    activity are left out.
+    """
+    series = {metric: [] for metric in metrics}
+    rows = (
+        ActivityRollup.objects.filter(
+            period=period,
+            metric__in=metrics,
+            tag=tag,
+            period_start__gte=period_start(since, period),
+            period_start__lte=until,
+        )
+        .order_by("metric", "period_start")
+        .values_list("metric", "period_start", "count")
+    )
+    for metric, start, count in rows:
+        series[metric].append({"date": start, "count": count})
+    return series
+
+
+def top_tags(period, metrics, since, until, limit=10):
+    """Return the most active tags over a date range, from the rollups."""
+    rows = (
+        ActivityRollup.objects.filter(
+            period=period,
+            metric__in=metrics,
+            period_start__gte=period_start(since, period),
+            period_start__lte=until,
+        )
+        .exclude(tag="")
+        .values_list("tag", "metric", "count")
+    )
+    totals = {}
+    for tag, metric, count in rows:
+        entry = totals.setdefault(tag, {"tag": tag, "total": 0})
+        entry[metric] = entry.get(metric, 0) + count
+        entry["total"] += count
+    return sorted(totals.values(), key=lambda entry: (-entry["total"], entry["tag"]))[
+        :limit
+    ]
+
+
+def last_refreshed():
+    """Return when the least recently refreshed metric was last rolled up."""
+    watermarks = list(RollupWatermark.objects.values_list("updated_at", flat=True))
+    if len(watermarks) < len(METRICS) + (len(sharding.shards()) - 1) * sum(
+        sharding.is_sharded(model) for model, _, _ in METRICS.values()
+    ):
+        return None
+    return min(watermarks)
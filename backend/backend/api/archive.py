@@ -0,0 +1,526 @@
+"""
+Archival of soft-deleted rows.
+
+archive_deleted() moves users, questions, answers and comments that have been
+soft-deleted for longer than ARCHIVE["RETENTION_DAYS"] out of the hot tables
+into ArchivedRecord, in batches of ARCHIVE["BATCH_SIZE"] per transaction.
+Every archived record carries its dependent rows, so nothing left behind
+points at a removed row:
+
+- a comment is archived on its own;
+- an answer takes its comments and upvotes with it;
+- a question takes its upvotes and its answers (with their comments and
+  upvotes) with it;
+- a user is archived only once no question, answer or comment of theirs is
+  left in the hot tables, and takes the upvotes they cast with it.
+
+Notifications about archived rows are dropped. Counters that included the
+moved rows are recounted for the affected questions, answers and users.
+restore() puts an archived record back under its original ids (and clears
+its soft delete), provided the rows it depends on are present. Comments,
+answers and questions are archived shard by shard and restored to the shard
+of their question.
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import sharding, typeahead
+from .activity import rebuild_user_counters
+from .compression import CompressedText, text
+from .models import (
+    Answer,
+    ArchivedRecord,
+    Comment,
+    Notification,
+    Question,
+    Upvote,
+    UserDetail,
+)
+from .ranking import rebuild_answer_vote_counts, rebuild_question_counters
+from .routers import archive_database
+from .similarity import index_question
+
+DEFAULTS = {
+    "DATABASE": "default",
+    "RETENTION_DAYS": 30,
+    "BATCH_SIZE": 200,
+}
+
+
+def get_archive_setting(name):
+    return getattr(settings, "ARCHIVE", {}).get(name, DEFAULTS[name])
+
+
+class RestoreError(Exception):
+    """Raised when an archived record cannot be put back."""
+
+
+def _grouped(queryset, key):
+    groups = defaultdict(list)
+    for row in queryset.values():
+        groups[row[key]].append(row)
+    return groups
+
+
+def _expired(flag, cutoff, created_field="timestamp"):
+    """Soft-deleted before cutoff; rows deleted before deleted_at existed fall
+    back to their creation time."""
+    return Q(**{flag: True}) & (
+        Q(deleted_at__lt=cutoff)
+        | Q(deleted_at__isnull=True, **{f"{created_field}__lt": cutoff})
+    )
+
+
+def _save_archive(records):
+    ArchivedRecord.objects.using(archive_database()).bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=["record_type", "original_id"],
+        update_fields=["summary", "payload", "deleted_at", "archived_at"],
+    )
+
+
+def _plain(value):
+    """Make archived rows JSON-serializable without losing microseconds
+    (DjangoJSONEncoder rounds datetimes to milliseconds)."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, CompressedText):
+        return text(value)
+    return value
+
+
+def _archive_record(record_type, row, summary, **dependents):
+    return ArchivedRecord(
+        record_type=record_type,
+        original_id=row["id"],
+        summary=(text(summary) or "")[:255],
+        deleted_at=row.get("deleted_at"),
+        payload=_plain({"row": row, **dependents}),
+    )
+
+
+class _Recount:
+    """Ids whose denormalized counters must be recounted after a batch."""
+
+    def __init__(self):
+        self.questions = set()
+        self.answers = set()
+        self.users = set()
+
+    def add_rows(self, rows):
+        for row in rows:
+            for field in ("user_id", "by_user_id"):
+                if row.get(field):
+                    self.users.add(row[field])
+
+    def apply(self):
+        if self.questions:
+            rebuild_question_counters(ids=self.questions)
+        if self.answers:
+            rebuild_answer_vote_counts(ids=self.answers)
+        if self.users:
+            rebuild_user_counters(ids=self.users)
+
+
+# ----------------- Archiving -----------------
+
+
+def _archive_comments(cutoff, batch_size, recount):
+    comments = list(
+        Comment.objects.filter(_expired("comment_deleted", cutoff)).order_by("id").values()[
+            :batch_size
+        ]
+    )
+    if not comments:
+        return 0
+    _save_archive(
+        [_archive_record("comment", row, row["comment_content"]) for row in comments]
+    )
+    Comment.objects.filter(id__in=[row["id"] for row in comments]).delete()
+    recount.add_rows(comments)
+    return len(comments)
+
+
+def _answer_payloads(answer_ids, recount):
+    """Return ({answer id: dependents}) for answers about to be archived."""
+    comments = _grouped(Comment.objects.filter(answer_id__in=answer_ids), "answer_id")
+    upvotes = _grouped(Upvote.objects.filter(answer_id__in=answer_ids), "answer_id")
+    for rows in list(comments.values()) + list(upvotes.values()):
+        recount.add_rows(rows)
+    return {
+        answer_id: {"comments": comments.get(answer_id, []), "upvotes": upvotes.get(answer_id, [])}
+        for answer_id in answer_ids
+    }
+
+
+def _archive_answers(cutoff, batch_size, recount):
+    answers = list(
+        Answer.objects.filter(_expired("answer_deleted", cutoff)).order_by("id").values()[
+            :batch_size
+        ]
+    )
+    if not answers:
+        return 0
+    ids = [row["id"] for row in answers]
+    dependents = _answer_payloads(ids, recount)
+    _save_archive(
+        [
+            _archive_record("answer", row, row["answer_description"], **dependents[row["id"]])
+            for row in answers
+        ]
+    )
+    Notification.objects.filter(answer_id__in=ids).delete()
+    Answer.objects.filter(id__in=ids).delete()  # cascades to comments and upvotes
+    recount.add_rows(answers)
+    recount.questions.update(row["question_id"] for row in answers)
+    return len(answers)
+
+
+def _archive_questions(cutoff, batch_size, recount):
+    questions = list(
+        Question.objects.filter(_expired("question_deleted", cutoff))
+        .order_by("id")
+        .values()[:batch_size]
+    )
+    if not questions:
+        return 0
+    ids = [row["id"] for row in questions]
+    answers = _grouped(Answer.objects.filter(question_id__in=ids), "question_id")
+    answer_ids = [row["id"] for rows in answers.values() for row in rows]
+    answer_dependents = _answer_payloads(answer_ids, recount)
+    upvotes = _grouped(Upvote.objects.filter(question_id__in=ids), "question_id")
+    for rows in list(answers.values()) + list(upvotes.values()):
+        recount.add_rows(rows)
+
+    _save_archive(
+        [
+            _archive_record(
+                "question",
+                row,
+                row["question_title"],
+                upvotes=upvotes.get(row["id"], []),
+                answers=[
+                    {"row": answer, **answer_dependents[answer["id"]]}
+                    for answer in answers.get(row["id"], [])
+                ],
+            )
+            for row in questions
+        ]
+    )
+    Notification.objects.filter(Q(question_id__in=ids) | Q(answer_id__in=answer_ids)).delete()
+    Question.objects.filter(id__in=ids).delete()  # cascades to answers, comments, upvotes
+    recount.add_rows(questions)
+    return len(questions)
+
+
+def _users_without_posts(cutoff, batch_size):
+    candidates = UserDetail.objects.filter(_expired("is_user_deleted", cutoff, "date_joined"))
+    if not sharding.enabled():
+        return list(
+            candidates.exclude(Exists(Question.objects.filter(user=OuterRef("pk"))))
+            .exclude(Exists(Answer.objects.filter(user=OuterRef("pk"))))
+            .exclude(Exists(Comment.objects.filter(user=OuterRef("pk"))))
+            .order_by("id")
+            .values()[:batch_size]
+        )
+    # Posts are on the shards, so they can't be excluded in the same query
+    users = []
+    last_id = 0
+    while len(users) < batch_size:
+        rows = list(candidates.filter(id__gt=last_id).order_by("id").values()[:batch_size])
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        ids = {row["id"] for row in rows}
+        for _ in sharding.each_shard():
+            for model in (Question, Answer, Comment):
+                ids.difference_update(
+                    model.objects.filter(user_id__in=ids).values_list("user_id", flat=True)
+                )
+        users.extend(row for row in rows if row["id"] in ids)
+    return users[:batch_size]
+
+
+def _archive_users(cutoff, batch_size, recount):
+    users = _users_without_posts(cutoff, batch_size)
+    if not users:
+        return 0
+    ids = [row["id"] for row in users]
+    upvotes = defaultdict(list)
+    for _ in sharding.each_shard():
+        shard_upvotes = _grouped(Upvote.objects.filter(by_user_id__in=ids), "by_user_id")
+        for user_id, rows in shard_upvotes.items():
+            upvotes[user_id].extend(rows)
+    _save_archive(
+        [
+            _archive_record("user", row, row["username"], upvotes=upvotes.get(row["id"], []))
+            for row in users
+        ]
+    )
+
+    for _ in sharding.each_shard():
+        voted = Upvote.objects.filter(by_user_id__in=ids)
+        question_ids = set(voted.exclude(question=None).values_list("question_id", flat=True))
+        answer_ids = set(voted.exclude(answer=None).values_list("answer_id", flat=True))
+        recount.users.update(
+            Question.objects.filter(id__in=question_ids).values_list("user_id", flat=True)
+        )
+        recount.users.update(
+            Answer.objects.filter(id__in=answer_ids).values_list("user_id", flat=True)
+        )
+        voted.delete()
+        Notification.objects.filter(Q(user_id__in=ids) | Q(mention_by_id__in=ids)).delete()
+        # Vote counts live next to the votes, so they are recounted per shard
+        if question_ids:
+            rebuild_question_counters(ids=question_ids)
+        if answer_ids:
+            rebuild_answer_vote_counts(ids=answer_ids)
+    UserDetail.objects.filter(id__in=ids).delete()
+    recount.users.difference_update(ids)
+    return len(users)
+
+
+# Children before parents, so a question's answers that were deleted on their
+# own are archived as answers first
+ARCHIVERS = [
+    ("comments", _archive_comments),
+    ("answers", _archive_answers),
+    ("questions", _archive_questions),
+    ("users", _archive_users),
+]
+
+
+def archive_deleted(retention_days=None, batch_size=None):
+    """
+    Archive every row soft-deleted longer than the retention window.
+
+    :return: {"comments": n, "answers": n, "questions": n, "users": n}
+    """
+    retention_days = (
+        get_archive_setting("RETENTION_DAYS") if retention_days is None else retention_days
+    )
+    batch_size = batch_size or get_archive_setting("BATCH_SIZE")
+    cutoff = timezone.now() - datetime.timedelta(days=retention_days)
+
+    archived = {}
+    for name, archiver in ARCHIVERS:
+        archived[name] = 0
+        # Users span the shards, posts are archived shard by shard
+        for _ in [None] if name == "users" else sharding.each_shard():
+            while True:
+                recount = _Recount()
+                with _archive_transaction(name), transaction.atomic(using=archive_database()):
+                    count = archiver(cutoff, batch_size, recount)
+                    recount.apply()
+                archived[name] += count
+                if count < batch_size:
+                    break
+    return archived
+
+
+def _archive_transaction(name):
+    return sharding.atomic_everywhere() if name == "users" else sharding.atomic()
+
+
+# ----------------- Restoring -----------------
+
+
+def _create(model, rows):
+    """Re-insert archived rows under their original ids, keeping timestamps."""
+    if not rows:
+        return
+    fields = model._meta.concrete_fields
+    objects = [
+        model(**{f.attname: f.to_python(row[f.attname]) for f in fields if f.attname in row})
+        for row in rows
+    ]
+    if model.objects.filter(id__in=[obj.id for obj in objects]).exists():
+        raise RestoreError(f"Some {model._meta.verbose_name} rows already exist")
+    timestamps = [getattr(obj, "timestamp", None) for obj in objects]
+    model.objects.bulk_create(objects)
+    if any(timestamps):
+        # auto_now_add overwrote them on insert
+        for obj, timestamp in zip(objects, timestamps):
+            obj.timestamp = timestamp
+        model.objects.bulk_update(objects, ["timestamp"])
+
+
+def _require(model, ids, message):
+    ids = set(ids)
+    missing = ids - set(model.objects.filter(id__in=ids).values_list("id", flat=True))
+    if missing:
+        raise RestoreError(f"{message}: {', '.join(str(i) for i in sorted(missing))}")
+
+
+def _undelete(row, flag):
+    row[flag] = False
+    row["deleted_at"] = None
+
+
+def _content_shard(record_type, row):
+    """The shard an archived question, answer or comment goes back to."""
+    if not sharding.enabled():
+        return sharding.shards()[0]
+    if record_type == "question":
+        return sharding.question_shard(row["id"])
+    if record_type == "answer":
+        return sharding.question_shard(row["question_id"])
+    return sharding.locate(Answer, row["answer_id"]) or sharding.slot_shard(row["answer_id"])
+
+
+def _upvote_shards(upvotes):
+    """Group archived upvotes of a user by the shard of what they voted on."""
+    if not sharding.enabled():
+        return {sharding.shards()[0]: upvotes} if upvotes else {}
+    questions = sharding.question_shards(u["question_id"] for u in upvotes if u["question_id"])
+    answers = sharding.locate_many(Answer, [u["answer_id"] for u in upvotes if u["answer_id"]])
+    groups = defaultdict(list)
+    for upvote in upvotes:
+        if upvote["question_id"]:
+            alias = questions[upvote["question_id"]]
+        else:
+            # Missing answers are reported by _restore_content
+            alias = answers.get(upvote["answer_id"]) or sharding.slot_shard(upvote["answer_id"])
+        groups[alias].append(upvote)
+    return groups
+
+
+def _restore_content(questions, answers, comments, upvotes, recount):
+    """Re-insert rows on the current shard and recount its questions and answers."""
+    _require(
+        Question,
+        {a["question_id"] for a in answers} - {q["id"] for q in questions},
+        "Restore these archived questions first",
+    )
+    _require(
+        Answer,
+        {c["answer_id"] for c in comments} - {a["id"] for a in answers},
+        "Restore these archived answers first",
+    )
+    _require(
+        Question,
+        {u["question_id"] for u in upvotes if u["question_id"]} - {q["id"] for q in questions},
+        "Voted questions are missing",
+    )
+    _require(
+        Answer,
+        {u["answer_id"] for u in upvotes if u["answer_id"]} - {a["id"] for a in answers},
+        "Voted answers are missing",
+    )
+
+    _create(Question, questions)
+    _create(Answer, answers)
+    _create(Comment, comments)
+    _create(Upvote, upvotes)
+
+    question_ids = {q["id"] for q in questions}
+    question_ids.update(a["question_id"] for a in answers)
+    question_ids.update(
+        Answer.objects.filter(id__in=[c["answer_id"] for c in comments]).values_list(
+            "question_id", flat=True
+        )
+    )
+    question_ids.update(u["question_id"] for u in upvotes if u["question_id"])
+    answer_ids = {a["id"] for a in answers}
+    answer_ids.update(u["answer_id"] for u in upvotes if u["answer_id"])
+    recount.add_rows(questions + answers + comments + upvotes)
+    recount.users.update(
+        Question.objects.filter(id__in=question_ids).values_list("user_id", flat=True)
+    )
+    recount.users.update(
+        Answer.objects.filter(id__in=answer_ids).values_list("user_id", flat=True)
+    )
+    if question_ids:
+        rebuild_question_counters(ids=question_ids)
+    if answer_ids:
+        rebuild_answer_vote_counts(ids=answer_ids)
+    return question_ids
+
+
+def restore(record_type, original_id):
+    """
+    Put an archived record and its dependent rows back into the hot tables,
+    un-deleted.
+
+    :raises ArchivedRecord.DoesNotExist: nothing archived under that id
+    :raises RestoreError: a row it depends on is missing (e.g. its question
+        or author is archived too), or its id is taken
+    :return: the restored top-level instance
+    """
+    archive = ArchivedRecord.objects.get(record_type=record_type, original_id=original_id)
+    payload = archive.payload
+    row = dict(payload["row"])
+
+    users, questions, answers, comments, upvotes = [], [], [], [], []
+    if record_type == "user":
+        _undelete(row, "is_user_deleted")
+        users = [row]
+        upvotes = payload.get("upvotes", [])
+    elif record_type == "question":
+        _undelete(row, "question_deleted")
+        questions = [row]
+        upvotes = list(payload.get("upvotes", []))
+        for answer in payload.get("answers", []):
+            answers.append(answer["row"])
+            comments.extend(answer.get("comments", []))
+            upvotes.extend(answer.get("upvotes", []))
+    elif record_type == "answer":
+        _undelete(row, "answer_deleted")
+        answers = [row]
+        comments = payload.get("comments", [])
+        upvotes = payload.get("upvotes", [])
+    else:
+        _undelete(row, "comment_deleted")
+        comments = [row]
+
+    restored_users = {user["id"] for user in users}
+    needed_users = {
+        r[field]
+        for r in questions + answers + comments + upvotes
+        for field in ("user_id", "by_user_id")
+        if r.get(field) and r[field] not in restored_users
+    }
+
+    if record_type == "user":
+        content = {
+            alias: ([], [], [], shard_upvotes)
+            for alias, shard_upvotes in _upvote_shards(upvotes).items()
+        }
+        shard = sharding.global_database()
+    else:
+        shard = _content_shard(record_type, row)
+        content = {shard: (questions, answers, comments, upvotes)}
+
+    recount = _Recount()
+    touched = {}
+    with sharding.atomic_everywhere():
+        _require(UserDetail, needed_users, "Restore these archived users first")
+        _create(UserDetail, users)
+        recount.add_rows(users)
+        for alias, rows in content.items():
+            with sharding.use_shard(alias):
+                touched[alias] = _restore_content(*rows, recount)
+        recount.apply()
+
+    archive.delete()
+    restored_questions = {q["id"] for q in questions}
+    for alias, question_ids in touched.items():
+        with sharding.use_shard(alias):
+            for question in Question.objects.filter(id__in=question_ids, question_deleted=False):
+                if question.id in restored_questions:
+                    index_question(question)
+                typeahead.record_question(question)
+
+    model = {"user": UserDetail, "question": Question, "answer": Answer, "comment": Comment}
+    with sharding.use_shard(shard):
+        return model[record_type].objects.get(id=original_id)
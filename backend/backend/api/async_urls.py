@@ -0,0 +1,22 @@
+from django.urls import path
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+# URLconf used under ASGI: the read endpoints resolve to their async
+# implementations first, every other route falls through to api/urls.py.
+urlpatterns = [
+    path("auth/user/profile/", async_views.user_profile, name="user_profile"),
+    path("auth/admin/profile/", async_views.admin_profile, name="admin_profile"),
+    path(
+        "auth/admin/user/<int:user_id>/",
+        async_views.admin_view_user_profile,
+        name="admin_view_user_profile",
+    ),
+    path("questions/", async_views.question_list, name="question-list"),
+    path(
+        "questions/<int:question_id>/",
+        async_views.question_detail,
+        name="question-detail",
+    ),
+    path("answers/<int:answer_id>/", async_views.answer_detail, name="answer_detail"),
+] + sync_urlpatterns
@@ -0,0 +1,225 @@
+"""
+Async implementations of the read-only endpoints.
+
+When the project is served through backend/asgi.py these views take the place
+of their sync counterparts in views.py (see backend/asgi_urls.py). Database
+access goes through Django's async ORM and the serializers only ever see fully
+prefetched instances, so a request never blocks the event loop and does not
+hold a thread while it waits on the database.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import filters, status
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import sharding
+from .activity import auser_activity
+from .authentication import CustomJWTAuthentication
+from .models import *
+from .pagination import AnswerCursorPagination
+from .permissions import IsAdminAuthenticated, IsUserAuthenticated
+from .serializers import *
+from .view_counts import record_view, viewer_key
+from .views import QuestionListView, QuestionOrderingFilter
+
+
+def _response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status_code,
+        content_type="application/json",
+    )
+
+
+async def _authenticate(request):
+    """
+    Set request.user from the bearer token the way DRF does for the sync
+    views (AnonymousUser without a valid one).
+    """
+    authenticator = CustomJWTAuthentication()
+    result = await authenticator.aauthenticate(request)
+    request.user = result[0] if result else AnonymousUser()
+    return authenticator, result
+
+
+async def _check_permission(request, permission_class):
+    """
+    Authenticate the request and check permission_class the way DRF does for
+    the sync views. Returns an error response, or None if access is granted.
+    """
+    authenticator, result = await _authenticate(request)
+
+    if permission_class().has_permission(request, None):
+        return None
+
+    if result is None:
+        response = _response(
+            {"detail": "Authentication credentials were not provided."},
+            status.HTTP_401_UNAUTHORIZED,
+        )
+        response["WWW-Authenticate"] = authenticator.authenticate_header(request)
+        return response
+    return _response(
+        {"detail": "You do not have permission to perform this action."},
+        status.HTTP_403_FORBIDDEN,
+    )
+
+
+@require_GET
+async def question_list(request):
+    """Async version of QuestionListView"""
+    drf_request = Request(request)
+    view = QuestionListView(request=drf_request, format_kwarg=None, args=(), kwargs={})
+    queryset = view.get_queryset()
+
+    # DjangoFilterBackend validates `user` with a database query, so the two
+    # exact-match filters are applied directly instead
+    user_id = request.GET.get("user")
+    if user_id:
+        if not user_id.isdigit():
+            return _response(
+                {"user": ["Select a valid choice. That choice is not one of the available choices."]},
+                status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = queryset.filter(user_id=user_id)
+    question_tag = request.GET.get("question_tag")
+    if question_tag:
+        queryset = queryset.filter(question_tag=question_tag)
+
+    for backend in (QuestionOrderingFilter, filters.SearchFilter):
+        queryset = backend().filter_queryset(drf_request, queryset, view)
+    queryset = sharding.scatter(queryset)
+
+    # Same page semantics as QuestionListPagination
+    paginator = view.paginator
+    page_size = paginator.get_page_size(drf_request)
+    count = await queryset.acount()
+    num_pages = max(1, -(-count // page_size))
+
+    page_number = request.GET.get(paginator.page_query_param) or 1
+    if page_number in paginator.last_page_strings:
+        page_number = num_pages
+    try:
+        page_number = int(page_number)
+    except (TypeError, ValueError):
+        page_number = 0
+    if not 1 <= page_number <= num_pages:
+        return _response({"detail": "Invalid page."}, status.HTTP_404_NOT_FOUND)
+
+    offset = (page_number - 1) * page_size
+    questions = [q async for q in queryset[offset : offset + page_size]]
+
+    context = {"request": drf_request}
+    for key, count_queryset in question_list_count_queries(questions).items():
+        context[key] = {question_id: n async for question_id, n in count_queryset}
+
+    url = drf_request.build_absolute_uri()
+    next_url = previous_url = None
+    if page_number < num_pages:
+        next_url = replace_query_param(
+            url, paginator.page_query_param, page_number + 1
+        )
+    if page_number == 2:
+        previous_url = remove_query_param(url, paginator.page_query_param)
+    elif page_number > 2:
+        previous_url = replace_query_param(
+            url, paginator.page_query_param, page_number - 1
+        )
+
+    return _response(
+        {
+            "count": count,
+            "next": next_url,
+            "previous": previous_url,
+            "results": QuestionListSerializer(
+                questions, many=True, context=context
+            ).data,
+        }
+    )
+
+
+@require_GET
+@sharding.routed
+async def question_detail(request, question_id):
+    """Async version of views.question_detail"""
+    question = await with_question_details(
+        Question.objects.filter(id=question_id, question_deleted=False)
+    ).afirst()
+    if question is None:
+        return _response({"error": "Question not found"}, status.HTTP_404_NOT_FOUND)
+
+    # CursorPagination only has a sync API; this one page query runs in the
+    # shared ORM thread, like any other sync_to_async database call
+    paginator = AnswerCursorPagination()
+    try:
+        answers = await sync_to_async(paginator.paginate_queryset)(
+            question_answers(question), Request(request)
+        )
+    except NotFound as exc:
+        return _response({"detail": exc.detail}, status.HTTP_404_NOT_FOUND)
+    await _authenticate(request)
+    record_view(question.id, viewer_key(request, request.user))
+    context = {"answers": answers, **compact_context(request)}
+    data = QuestionDetailSerializer(question, context=context).data
+    data["answers_next"] = paginator.get_next_link()
+    return _response(add_side_loaded_users(data, context))
+
+
+@require_GET
+@sharding.routed
+async def answer_detail(request, answer_id):
+    """Async version of views.answer_detail"""
+    answer = await with_answer_details(
+        Answer.objects.filter(id=answer_id, answer_deleted=False)
+    ).afirst()
+    if answer is None:
+        return _response({"error": "Answer not found"}, status.HTTP_404_NOT_FOUND)
+    context = compact_context(request)
+    return _response(
+        add_side_loaded_users(AnswerSerializer(answer, context=context).data, context)
+    )
+
+
+@require_GET
+async def user_profile(request):
+    """Async version of views.user_profile"""
+    error = await _check_permission(request, IsUserAuthenticated)
+    if error:
+        return error
+    # The authenticator already loaded the live account
+    data = UserProfileSerializer(request.user).data
+    data["activity"] = await auser_activity(request.user, request)
+    return _response(data)
+
+
+@require_GET
+async def admin_profile(request):
+    """Async version of views.admin_profile"""
+    error = await _check_permission(request, IsAdminAuthenticated)
+    if error:
+        return error
+    return _response(AdminProfileSerializer(request.user).data)
+
+
+@require_GET
+async def admin_view_user_profile(request, user_id):
+    """Async version of views.admin_view_user_profile"""
+    error = await _check_permission(request, IsAdminAuthenticated)
+    if error:
+        return error
+    try:
+        user = await UserDetail.objects.aget(id=user_id)
+    except UserDetail.DoesNotExist:
+        return _response({"error": "User not found"}, status.HTTP_404_NOT_FOUND)
+    if user.is_user_deleted:
+        return _response(
+            {"error": "User account has been deleted"}, status.HTTP_404_NOT_FOUND
+        )
+    data = UserProfileSerializer(user).data
+    data["activity"] = await auser_activity(user, request)
+    return _response(data)
@@ -1,6 +1,7 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from django.contrib.auth.models import AnonymousUser
+from . import identity
 from .models import UserDetail, Admin
 
 class CustomJWTAuthentication(JWTAuthentication):
@@ -13,7 +14,7 @@ class CustomJWTAuthentication(JWTAuthentication):
             user_type = validated_token.get('user_type', 'user')
             
             if user_type == 'user':
-                user = UserDetail.objects.get(id=user_id, is_user_deleted=False)
+                user = identity.get(UserDetail, user_id, is_user_deleted=False)
             elif user_type == 'admin':
                 user = Admin.objects.get(id=user_id, is_admin_deleted=False)
             else:
@@ -25,6 +26,47 @@ class CustomJWTAuthentication(JWTAuthentication):
         except Exception as e:
             raise InvalidToken('Token is invalid or expired')
     
+    async def aget_user(self, validated_token):
+        """
+        Async counterpart of get_user, used by the async read views.
+        """
+        try:
+            user_id = validated_token['user_id']
+            user_type = validated_token.get('user_type', 'user')
+
+            if user_type == 'user':
+                user = await identity.aget(UserDetail, user_id, is_user_deleted=False)
+            elif user_type == 'admin':
+                user = await Admin.objects.aget(id=user_id, is_admin_deleted=False)
+            else:
+                raise InvalidToken('Invalid user type')
+
+            return user
+        except (UserDetail.DoesNotExist, Admin.DoesNotExist):
+            raise InvalidToken('User not found')
+        except Exception as e:
+            raise InvalidToken('Token is invalid or expired')
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of authenticate. Token validation is pure CPU, only
+        the user lookup touches the database.
+        """
+        try:
+            header = self.get_header(request)
+            if header is None:
+                return None
+
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+        except Exception as e:
+            # If authentication fails, return None (anonymous user)
+            return None
+
     def authenticate(self, request):
         """
         Override to handle custom user types properly.
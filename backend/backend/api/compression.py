@@ -0,0 +1,248 @@
+"""
+Transparent compression of large text columns.
+
+CompressedTextField is a TextField that stores values of at least
+COMPRESSION["THRESHOLD"] characters compressed, as a BLOB of one codec byte
+followed by the compressed data. Shorter values are stored as plain text, so
+existing rows stay readable as they are and compress_text_columns can
+convert them in batches. SQLite keeps BLOBs in a TEXT column as they are; on
+other backends values are always stored as plain text.
+
+The codec is zstd (with the optional trained dictionary
+COMPRESSION["ZSTD_DICTIONARY"]) when the zstandard package is installed and
+COMPRESSION["CODEC"] is "zstd", else stdlib zlib. Reading handles both, but
+zstd rows need zstandard installed to be read. Rows compressed with a
+dictionary carry its id, so after training a new one, list the previous
+dictionary in COMPRESSION["ZSTD_PREVIOUS_DICTIONARIES"] to keep its rows
+readable.
+
+Compressed values are decompressed when the attribute is first read, not as
+rows are loaded, so lists that never show the text don't pay for it.
+values() and values_list() return compressed values as CompressedText; pass
+them through text().
+
+Only values are compressed, never lookup arguments, so lookups on a
+compressed column compare against compressed data. Do not compress columns
+that are searched or filtered in SQL (question_description is searched by
+QuestionListView).
+"""
+import contextvars
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import models
+from django.db.models import F, Func, IntegerField, TextField
+from django.db.models.functions import Length
+from django.db.models.query_utils import DeferredAttribute
+
+from . import sharding
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+DEFAULTS = {
+    "ENABLED": True,
+    "THRESHOLD": 1024,
+    "CODEC": "zstd",
+    "LEVEL": 6,
+    "ZSTD_DICTIONARY": None,
+    "ZSTD_PREVIOUS_DICTIONARIES": (),
+}
+
+# Value headers. ZSTD_DICT is followed by the 4-byte dictionary id.
+ZLIB = b"\x01"
+ZSTD = b"\x02"
+ZSTD_DICT = b"\x03"
+
+_disabled = contextvars.ContextVar("compression_disabled", default=False)
+
+
+def get_compression_setting(name):
+    return getattr(settings, "COMPRESSION", {}).get(name, DEFAULTS[name])
+
+
+@lru_cache(maxsize=None)
+def _load_dictionary(path):
+    with open(path, "rb") as handle:
+        return zstandard.ZstdCompressionDict(handle.read())
+
+
+def _zstd_dictionary():
+    """The dictionary new values are compressed with, or None."""
+    path = get_compression_setting("ZSTD_DICTIONARY")
+    return _load_dictionary(str(path)) if path else None
+
+
+def _zstd_dictionary_by_id(dict_id):
+    for path in [
+        get_compression_setting("ZSTD_DICTIONARY"),
+        *get_compression_setting("ZSTD_PREVIOUS_DICTIONARIES"),
+    ]:
+        if path and _load_dictionary(str(path)).dict_id() == dict_id:
+            return _load_dictionary(str(path))
+    raise LookupError(
+        f"zstd dictionary {dict_id} is not configured; add it to "
+        "COMPRESSION['ZSTD_PREVIOUS_DICTIONARIES']"
+    )
+
+
+def codec():
+    """The codec new values are written with: "zstd" or "zlib"."""
+    if get_compression_setting("CODEC") == "zstd" and zstandard is not None:
+        return "zstd"
+    return "zlib"
+
+
+def compress(text):
+    data = text.encode("utf-8")
+    level = get_compression_setting("LEVEL")
+    if codec() == "zstd":
+        dictionary = _zstd_dictionary()
+        compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+        if dictionary is None:
+            return ZSTD + compressor.compress(data)
+        return ZSTD_DICT + dictionary.dict_id().to_bytes(4, "big") + compressor.compress(data)
+    return ZLIB + zlib.compress(data, level)
+
+
+def decompress(value):
+    value = bytes(value)
+    header, data = value[:1], value[1:]
+    if header == ZLIB:
+        return zlib.decompress(data).decode("utf-8")
+    if header in (ZSTD, ZSTD_DICT):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed text")
+        if header == ZSTD_DICT:
+            dict_id, data = int.from_bytes(data[:4], "big"), data[4:]
+        else:
+            # Written before dictionary ids were in the header; the frame has it
+            dict_id = zstandard.get_frame_parameters(data).dict_id
+        dictionary = _zstd_dictionary_by_id(dict_id) if dict_id else None
+        decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressor.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown text compression header {header!r}")
+
+
+class CompressedText:
+    """A compressed column value as loaded from the database, not yet decompressed."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = bytes(data)
+
+    def __str__(self):
+        return decompress(self.data)
+
+    def __repr__(self):
+        return f"<CompressedText {len(self.data)} bytes>"
+
+
+def text(value):
+    """The text of a value read with values() / values_list()."""
+    if isinstance(value, CompressedText):
+        return decompress(value.data)
+    return value
+
+
+def train_dictionary(samples, size=64 * 1024):
+    """Train a zstd dictionary on sample texts and return its bytes."""
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to train a dictionary")
+    encoded = [sample.encode("utf-8") for sample in samples]
+    return zstandard.train_dictionary(size, encoded).as_bytes()
+
+
+@contextmanager
+def disabled():
+    """Store CompressedTextField values uncompressed inside this block."""
+    token = _disabled.set(True)
+    try:
+        yield
+    finally:
+        _disabled.reset(token)
+
+
+class _DecompressingAttribute(DeferredAttribute):
+    """
+    Decompresses a loaded value on first access and keeps the text. A data
+    descriptor (unlike DeferredAttribute), so it sees every read.
+    """
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = instance.__dict__[self.field.attname] = decompress(value.data)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """A TextField stored compressed once it reaches COMPRESSION["THRESHOLD"]."""
+
+    descriptor_class = _DecompressingAttribute
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, (bytes, memoryview)):
+            return CompressedText(value)
+        return value
+
+    def get_db_prep_save(self, value, connection):
+        value = super().get_db_prep_save(value, connection)
+        if (
+            isinstance(value, str)
+            and connection.vendor == "sqlite"
+            and get_compression_setting("ENABLED")
+            and not _disabled.get()
+            and len(value) >= get_compression_setting("THRESHOLD")
+        ):
+            return compress(value)
+        return value
+
+
+# ----------------- Converting existing rows -----------------
+
+
+class _StorageType(Func):
+    function = "TYPEOF"
+    output_field = TextField()
+
+
+def compress_column(model, field_name, batch_size=500, decompress_rows=False):
+    """
+    Rewrite a CompressedTextField column in batches: compress plain rows of at
+    least the threshold, or with decompress_rows store every compressed row
+    as plain text again (e.g. before removing the field type). SQLite only;
+    works on the current shard.
+
+    :return: number of rows rewritten
+    """
+    rows = model.objects.annotate(_storage=_StorageType(F(field_name)))
+    if decompress_rows:
+        rows = rows.filter(_storage="blob")
+    else:
+        rows = rows.annotate(_length=Length(field_name, output_field=IntegerField())).filter(
+            _storage="text", _length__gte=get_compression_setting("THRESHOLD")
+        )
+    rows = rows.order_by("id")
+
+    rewritten = last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id).only("id", field_name)[:batch_size])
+        if not batch:
+            return rewritten
+        with sharding.atomic():
+            if decompress_rows:
+                with disabled():
+                    model.objects.bulk_update(batch, [field_name])
+            else:
+                model.objects.bulk_update(batch, [field_name])
+        rewritten += len(batch)
+        last_id = batch[-1].id
@@ -0,0 +1,209 @@
+"""
+Personalized home feed of questions in the tags a user follows.
+
+Every new question is recorded once per tag in TagFeedEntry. For tags with at
+most FEED["FANOUT_MAX_FOLLOWERS"] followers it is also written into each
+follower's own FeedEntry rows (fan-out on write, in chunks of
+FEED["BATCH_SIZE"]). The first time a tag is seen with more followers it is
+marked merged on read (FollowedTag) for good: its questions are no longer
+copied per follower, and the feed query merges in all of its TagFeedEntry
+rows instead, including those of the time it was fanned out. So posting a
+question costs at most a few queries per tag whatever its audience, and a
+tag's questions never drop out of feeds as its following shrinks.
+
+Follower counts are counted from TagFollow (up to the threshold) when they
+are needed, so follows removed by cascade cannot skew them. Following a
+fanned-out tag copies its latest FEED["MAX_ENTRIES"] questions into the new
+follower's feed.
+
+A feed page is one query over Question by descending id (per shard, see
+api/sharding.py), matching either the reader's FeedEntry rows or the
+TagFeedEntry rows of the merged tags they follow. trim_feeds() caps every
+user's FeedEntry rows and every tag's TagFeedEntry rows at
+FEED["MAX_ENTRIES"].
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+
+from . import sharding
+from .models import FeedEntry, FollowedTag, Question, TagFeedEntry, TagFollow
+from .utils import split_tags
+
+DEFAULTS = {
+    "FANOUT_MAX_FOLLOWERS": 1000,
+    "MAX_ENTRIES": 500,
+    "BATCH_SIZE": 500,
+}
+
+
+def get_feed_setting(name):
+    return getattr(settings, "FEED", {}).get(name, DEFAULTS[name])
+
+
+def normalize_tag(tag):
+    tags = split_tags(tag)
+    return tags[0] if len(tags) == 1 else None
+
+
+def _merged_tags(tags):
+    """The given tags whose questions are merged into feeds on read."""
+    return set(
+        FollowedTag.objects.filter(tag__in=tags, merge_on_read=True).values_list(
+            "tag", flat=True
+        )
+    )
+
+
+def _too_popular(tag):
+    """Whether the tag has more than FANOUT_MAX_FOLLOWERS followers (counted up to that)."""
+    limit = get_feed_setting("FANOUT_MAX_FOLLOWERS")
+    return TagFollow.objects.filter(tag=tag)[: limit + 1].count() > limit
+
+
+def _merge_on_read(tag):
+    FollowedTag.objects.bulk_create(
+        [FollowedTag(tag=tag, merge_on_read=True)],
+        update_conflicts=True,
+        unique_fields=["tag"],
+        update_fields=["merge_on_read"],
+    )
+
+
+def _backfill(user, tag):
+    """Copy the tag's latest questions into a new follower's feed."""
+    for _ in sharding.each_shard():
+        question_ids = (
+            TagFeedEntry.objects.filter(tag=tag)
+            .order_by("-question_id")
+            .values_list("question_id", flat=True)[: get_feed_setting("MAX_ENTRIES")]
+        )
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user=user, question_id=question_id) for question_id in question_ids],
+            ignore_conflicts=True,
+        )
+
+
+def follow_tag(user, tag):
+    """:return: False if the user already followed the tag"""
+    try:
+        with transaction.atomic(using=sharding.global_database()):
+            TagFollow.objects.create(user=user, tag=tag)
+    except IntegrityError:
+        return False
+    if _merged_tags([tag]):
+        return True
+    if _too_popular(tag):
+        _merge_on_read(tag)
+    else:
+        _backfill(user, tag)
+    return True
+
+
+def unfollow_tag(user, tag):
+    """:return: False if the user did not follow the tag"""
+    deleted, _ = TagFollow.objects.filter(user=user, tag=tag).delete()
+    return bool(deleted)
+
+
+def fan_out_question(question):
+    """Deliver a new question to the feeds of its tags' followers."""
+    tags = split_tags(question.question_tag)
+    if not tags:
+        return
+    TagFeedEntry.objects.bulk_create(
+        [TagFeedEntry(tag=tag, question=question) for tag in tags],
+        ignore_conflicts=True,
+    )
+
+    merged = _merged_tags(tags)
+    fanned_out = []
+    for tag in tags:
+        if tag in merged:
+            continue
+        if _too_popular(tag):
+            _merge_on_read(tag)
+        else:
+            fanned_out.append(tag)
+    if not fanned_out:
+        return
+
+    batch_size = get_feed_setting("BATCH_SIZE")
+    followers = (
+        TagFollow.objects.filter(tag__in=fanned_out)
+        .exclude(user_id=question.user_id)
+        .values_list("user_id", flat=True)
+        .distinct()
+        .order_by("user_id")
+    )
+    last_id = 0
+    while True:
+        user_ids = list(followers.filter(user_id__gt=last_id)[:batch_size])
+        if not user_ids:
+            return
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=user_id, question=question) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        last_id = user_ids[-1]
+
+
+def feed_queryset(user):
+    """Live questions of the user's feed, newest first (one query per page and shard)."""
+    # Tag follows are global, feed entries are on the shards of their questions
+    merged_tags = list(
+        TagFollow.objects.filter(
+            user=user,
+            tag__in=FollowedTag.objects.filter(merge_on_read=True).values("tag"),
+        ).values_list("tag", flat=True)
+    )
+    fanned_out = FeedEntry.objects.filter(user=user).values("question_id")
+    merged = TagFeedEntry.objects.filter(tag__in=merged_tags).values("question_id")
+    return (
+        Question.objects.filter(question_deleted=False)
+        .filter(Q(id__in=fanned_out) | Q(id__in=merged))
+        .select_related("user")
+        .order_by("-id")
+    )
+
+
+def _trim(model, owner_field, max_entries, batch_size):
+    """Delete the oldest rows of every owner with more than max_entries."""
+    deleted = 0
+    owners = list(
+        model.objects.values_list(owner_field)
+        .annotate(n=Count("id"))
+        .filter(n__gt=max_entries)
+        .values_list(owner_field, flat=True)
+    )
+    for owner in owners:
+        rows = model.objects.filter(**{owner_field: owner})
+        oldest_kept = (
+            rows.order_by("-question_id").values_list("question_id", flat=True)[
+                max_entries - 1
+            ]
+        )
+        while True:
+            ids = list(
+                rows.filter(question_id__lt=oldest_kept).values_list("id", flat=True)[
+                    :batch_size
+                ]
+            )
+            if not ids:
+                break
+            deleted += model.objects.filter(id__in=ids).delete()[0]
+    return deleted
+
+
+def trim_feeds(max_entries=None, batch_size=None):
+    """
+    Cap every user's feed entries and every tag's entries.
+
+    :return: {"feed_entries": n, "tag_entries": n} rows deleted
+    """
+    max_entries = max_entries or get_feed_setting("MAX_ENTRIES")
+    batch_size = batch_size or get_feed_setting("BATCH_SIZE")
+    return {
+        "feed_entries": _trim(FeedEntry, "user_id", max_entries, batch_size),
+        "tag_entries": _trim(TagFeedEntry, "tag", max_entries, batch_size),
+    }
@@ -0,0 +1,146 @@
+"""
+Question follows and the fan-out of new-answer notifications.
+
+When an answer is posted, the question author and every follower (except
+the answerer) get a notification. For questions with at most
+FOLLOWS["FANOUT_MAX_FOLLOWERS"] followers the rows are inserted right away,
+reading follower ids and inserting notifications in chunks of
+FOLLOWS["BATCH_SIZE"]. Above that a single FollowEvent is recorded instead,
+and each follower's notifications for such events are created when they next
+read their notification feed (sync_follow_events), so posting an answer
+never costs more than a couple of queries per chunk.
+"""
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F, Max
+
+from . import sharding
+from .models import FollowEvent, Notification, Question, QuestionFollow
+
+DEFAULTS = {
+    "FANOUT_MAX_FOLLOWERS": 1000,
+    "BATCH_SIZE": 500,
+}
+
+
+def get_follow_setting(name):
+    return getattr(settings, "FOLLOWS", {}).get(name, DEFAULTS[name])
+
+
+def _latest_event_id():
+    return FollowEvent.objects.aggregate(latest=Max("id"))["latest"] or 0
+
+
+def follow_question(user, question):
+    """
+    Follow a question. Only answers posted from now on are notified.
+
+    :return: False if the user already followed it
+    """
+    try:
+        with sharding.atomic():
+            QuestionFollow.objects.create(
+                user=user, question=question, synced_event_id=_latest_event_id()
+            )
+    except IntegrityError:
+        return False
+    Question.objects.filter(id=question.id).update(
+        follower_count=F("follower_count") + 1
+    )
+    return True
+
+
+def unfollow_question(user, question):
+    """:return: False if the user did not follow it"""
+    deleted, _ = QuestionFollow.objects.filter(user=user, question=question).delete()
+    if not deleted:
+        return False
+    Question.objects.filter(id=question.id, follower_count__gt=0).update(
+        follower_count=F("follower_count") - 1
+    )
+    return True
+
+
+def fan_out_answer(answer):
+    """Notify the question author and followers of a new answer."""
+    question = answer.question
+    if question.user_id != answer.user_id:
+        Notification.objects.create(
+            user_id=question.user_id,
+            question=question,
+            answer=answer,
+            mention_by_id=answer.user_id,
+        )
+
+    if question.follower_count > get_follow_setting("FANOUT_MAX_FOLLOWERS"):
+        FollowEvent.objects.create(
+            question=question, answer=answer, actor_id=answer.user_id
+        )
+        return
+
+    batch_size = get_follow_setting("BATCH_SIZE")
+    followers = (
+        QuestionFollow.objects.filter(question=question)
+        .exclude(user_id__in=[answer.user_id, question.user_id])
+        .values_list("user_id", flat=True)
+        .order_by("user_id")
+    )
+    last_id = 0
+    while True:
+        user_ids = list(followers.filter(user_id__gt=last_id)[:batch_size])
+        if not user_ids:
+            return
+        Notification.objects.bulk_create(
+            Notification(
+                user_id=user_id,
+                question=question,
+                answer=answer,
+                mention_by_id=answer.user_id,
+            )
+            for user_id in user_ids
+        )
+        last_id = user_ids[-1]
+
+
+def sync_follow_events(user):
+    """
+    Create the user's notifications for FollowEvents on the questions they
+    follow that they have not been notified of yet (on the current shard).
+
+    :return: number of notifications created
+    """
+    latest = _latest_event_id()
+    if not latest:
+        return 0
+    with sharding.atomic():
+        follows = QuestionFollow.objects.select_for_update().filter(
+            user=user, synced_event_id__lt=latest
+        )
+        if not follows.exists():
+            return 0
+        events = (
+            FollowEvent.objects.filter(
+                question__follows__user=user,
+                id__gt=F("question__follows__synced_event_id"),
+                id__lte=latest,
+            )
+            .exclude(actor=user)
+            .exclude(question__user=user)
+            .order_by("id")
+            .values_list("question_id", "answer_id", "actor_id")
+        )
+        notifications = [
+            Notification(
+                user=user,
+                question_id=question_id,
+                answer_id=answer_id,
+                mention_by_id=actor_id,
+            )
+            for question_id, answer_id, actor_id in events
+        ]
+        Notification.objects.bulk_create(
+            notifications, batch_size=get_follow_setting("BATCH_SIZE")
+        )
+        follows.update(synced_event_id=latest)
+    return len(notifications)
+
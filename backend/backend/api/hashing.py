@@ -0,0 +1,142 @@
+"""
+Password hashing service.
+
+PBKDF2 is deliberately CPU-expensive, so hashing inline lets a burst of logins
+or registrations occupy every core and starve the other endpoints. The
+functions here mirror django.contrib.auth.hashers.make_password and
+check_password but run the work in a small process pool. Only
+PASSWORD_HASHING["WORKERS"] hashes run at once per web worker, up to
+PASSWORD_HASHING["MAX_PENDING"] more wait in the queue, and anything beyond
+that is rejected with a 503 once PASSWORD_HASHING["QUEUE_TIMEOUT"] expires.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+DEFAULTS = {
+    "WORKERS": 2,
+    "MAX_PENDING": 32,
+    "QUEUE_TIMEOUT": 5,
+    "PBKDF2_ITERATIONS": None,
+}
+
+
+def get_hashing_setting(name):
+    return getattr(settings, "PASSWORD_HASHING", {}).get(name, DEFAULTS[name])
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many login attempts in progress, please retry shortly."
+    default_code = "hashing_unavailable"
+
+
+class TunedPBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the work factor taken from
+    PASSWORD_HASHING["PBKDF2_ITERATIONS"]. It keeps the stock algorithm name,
+    so existing hashes verify with it and get upgraded on the next login
+    whenever the iteration count changes.
+    """
+
+    @property
+    def iterations(self):
+        return (
+            get_hashing_setting("PBKDF2_ITERATIONS")
+            or hashers.PBKDF2PasswordHasher.iterations
+        )
+
+
+# ----------------- Worker side -----------------
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _verify_password(password, encoded):
+    return hashers.verify_password(password, encoded)
+
+
+# ----------------- Pool -----------------
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            workers = get_hashing_setting("WORKERS")
+            # spawn rather than fork: web workers are multi-threaded
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+            _slots = threading.BoundedSemaphore(
+                workers + get_hashing_setting("MAX_PENDING")
+            )
+        return _pool, _slots
+
+
+def _reset_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _slots = None
+
+
+def _run(func, *args):
+    """Run func in the hashing pool, or inline when the pool is disabled."""
+    if not get_hashing_setting("WORKERS"):
+        return func(*args)
+
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=get_hashing_setting("QUEUE_TIMEOUT")):
+        raise HashingUnavailable()
+    try:
+        return pool.submit(func, *args).result()
+    except BrokenProcessPool:
+        _reset_pool()
+        raise HashingUnavailable()
+    finally:
+        slots.release()
+
+
+# ----------------- Public API -----------------
+
+
+def make_password(password):
+    """Hash a raw password with the preferred hasher, off the request thread."""
+    return _run(_make_password, password)
+
+
+def check_password(password, encoded, setter=None):
+    """
+    Return whether the raw password matches the encoded hash.
+
+    As with Django's check_password, if the hash was made with outdated
+    parameters and the password is correct, setter(password) is called so the
+    caller can store a fresh hash.
+    """
+    is_correct, must_update = _run(_verify_password, password, encoded)
+    if setter and is_correct and must_update:
+        setter(password)
+    return is_correct
@@ -0,0 +1,124 @@
+"""
+Request-scoped identity map for UserDetail, Question and Answer instances.
+
+IdentityMapMiddleware gives every request a fresh map, held in a context
+variable so concurrent requests (threads or ASGI tasks) never share one, and
+drops it when the response is returned. Within the request:
+
+- get() / aget() return the instance already loaded for a primary key (e.g.
+  the authenticated user) instead of querying it again;
+- prime() resolves a foreign key over a list of instances with one query for
+  all the keys not already in the map, and points every instance at the same
+  related object (PrimedListSerializer does this before serializing a list).
+
+Instances are not refreshed within a request, so code that changes rows with
+queryset.update() and then reads them back should query them directly.
+Outside a request (management commands, shell) nothing is cached and prime()
+still batches.
+"""
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.db import router
+
+from .models import Answer, Question, UserDetail
+
+IDENTITY_MODELS = (UserDetail, Question, Answer)
+
+_identity_map = ContextVar("identity_map", default=None)
+
+
+def activate():
+    """Start a fresh map for the current context; returns a reset token."""
+    return _identity_map.set({})
+
+
+def deactivate(token):
+    _identity_map.reset(token)
+
+
+def remember(instance):
+    """Add instance to the map; returns the instance already mapped for its key."""
+    identity_map = _identity_map.get()
+    if identity_map is None or type(instance) not in IDENTITY_MODELS or instance.pk is None:
+        return instance
+    return identity_map.setdefault((type(instance), instance.pk), instance)
+
+
+def _mapped(model, pk, filters):
+    identity_map = _identity_map.get()
+    instance = identity_map.get((model, pk)) if identity_map is not None else None
+    if instance is not None and any(
+        getattr(instance, name) != value for name, value in filters.items()
+    ):
+        raise model.DoesNotExist(f"{model.__name__} matching query does not exist.")
+    return instance
+
+
+def get(model, pk, **filters):
+    """
+    Return the instance of model with primary key pk, loading it only if it
+    is not mapped yet. filters are exact field values it must have.
+    """
+    instance = _mapped(model, pk, filters)
+    if instance is None:
+        instance = remember(model.objects.get(pk=pk, **filters))
+    return instance
+
+
+async def aget(model, pk, **filters):
+    """Async counterpart of get()."""
+    instance = _mapped(model, pk, filters)
+    if instance is None:
+        instance = remember(await model.objects.aget(pk=pk, **filters))
+    return instance
+
+
+def prime(instances, *paths):
+    """
+    Resolve foreign keys of instances in bulk.
+
+    :param paths: forward foreign key names, optionally spanning relations
+        with "__" (e.g. "answer__user")
+    """
+    instances = [instance for instance in instances if instance is not None]
+    if not instances:
+        return
+    identity_map = _identity_map.get() or {}
+
+    for path in paths:
+        name, _, rest = path.partition("__")
+        field = instances[0]._meta.get_field(name)
+        model = field.related_model
+
+        # (database, pk) -> instances; sharded rows are read from their shard
+        pending = defaultdict(list)
+        for instance in instances:
+            if field.is_cached(instance):
+                related = field.get_cached_value(instance)
+                if related is not None:
+                    field.set_cached_value(instance, remember(related))
+                continue
+            pk = getattr(instance, field.attname)
+            if pk is None:
+                continue
+            related = identity_map.get((model, pk))
+            if related is not None:
+                field.set_cached_value(instance, related)
+            else:
+                pending[router.db_for_read(model, instance=instance), pk].append(instance)
+
+        by_database = defaultdict(list)
+        for database, pk in pending:
+            by_database[database].append(pk)
+        for database, pks in by_database.items():
+            for pk, related in model.objects.db_manager(database).in_bulk(pks).items():
+                related = remember(related)
+                for instance in pending[database, pk]:
+                    field.set_cached_value(instance, related)
+
+        if rest:
+            prime(
+                [field.get_cached_value(i, None) for i in instances if field.is_cached(i)],
+                rest,
+            )
@@ -0,0 +1,678 @@
+"""
+Bulk import of a legacy Q&A dump.
+
+The dump is a stream of records in the NDJSON layout produced by api/export.py
+(one object per line with a "type" of user, question, answer, comment or
+upvote and the same field names), or a CSV file with a "type" column and the
+same field names as headers. Ids in the dump are the legacy site's ids and
+are mapped to local rows through ImportedRecord.
+
+Records are read in batches. Each batch is written with bulk_create inside one
+transaction, together with the job's resume point, so an interrupted import
+continues where it stopped. Notifications for the imported posts are built
+set-wise per batch. Question counters, hot scores and the secondary indexes
+of the content tables are only brought up to date once at the end. Imported
+questions are placed on shards like new ones, and their answers, comments,
+upvotes and notifications are written next to them.
+
+Dumps uploaded through the admin endpoint are stored under
+IMPORTS["UPLOAD_DIR"] and imported by a background thread (start_import);
+the import_corpus command resumes one that was interrupted. A running job
+records a heartbeat after every batch and every rebuild step; one whose
+heartbeat is older than IMPORTS["STALE_AFTER"] seconds died with its process
+or thread, and is marked failed (expire_stale_imports) so it can be resumed.
+"""
+import csv
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import sharding
+from .models import (
+    Answer,
+    Comment,
+    ImportedRecord,
+    ImportJob,
+    Notification,
+    Question,
+    Upvote,
+    UserDetail,
+)
+from .activity import rebuild_user_counters
+from .ranking import rebuild_answer_vote_counts, rebuild_question_counters
+from .similarity import index_questions
+from .typeahead import build_snapshot
+from .utils import extract_mentions, resolve_mentions
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "UPLOAD_DIR": None,
+    "STALE_AFTER": 600,
+}
+
+IMPORT_ORDER = ["user", "question", "answer", "comment", "upvote"]
+DEFAULT_BATCH_SIZE = 1000
+
+# Tables whose Meta indexes are dropped during the load and rebuilt after it
+DEFERRED_INDEX_MODELS = [Question, Answer, Comment, Upvote]
+
+
+class BulkImportError(Exception):
+    pass
+
+
+def get_import_setting(name):
+    value = getattr(settings, "IMPORTS", {}).get(name, DEFAULTS[name])
+    if name == "UPLOAD_DIR":
+        value = Path(value or Path(settings.BASE_DIR) / "imports")
+    return value
+
+
+def expire_stale_imports():
+    """
+    Mark running imports whose last heartbeat is older than
+    IMPORTS["STALE_AFTER"] seconds as failed.
+
+    :return: number of jobs marked failed
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=get_import_setting("STALE_AFTER"))
+    return ImportJob.objects.filter(status="running", heartbeat_at__lt=cutoff).update(
+        status="failed", updated_at=now
+    )
+
+
+def read_ndjson(stream):
+    """Yield records from a text stream of NDJSON lines."""
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Yielded anyway, as a record without a type, so it is
+                # counted as skipped and resume positions stay the same
+                yield {}
+
+
+def read_csv(stream):
+    """Yield records from a CSV text stream, dropping empty cells."""
+    for row in csv.DictReader(stream):
+        yield {key: value for key, value in row.items() if value not in ("", None)}
+
+
+def guess_format(name):
+    """ndjson or csv, from a dump's file name."""
+    name = name[:-3] if name.endswith(".gz") else name
+    return "csv" if name.endswith(".csv") else "ndjson"
+
+
+def read_dump(path, input_format=None):
+    """
+    Yield the records of a dump file, gunzipping .gz files.
+
+    :raises BulkImportError: the file can't be read, or is not valid gzip,
+        UTF-8 or CSV
+    """
+    path = str(path)
+    input_format = input_format or guess_format(path)
+    reader = read_csv if input_format == "csv" else read_ndjson
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rt", encoding="utf-8", newline="") as stream:
+            yield from reader(stream)
+    except (OSError, EOFError, UnicodeDecodeError, csv.Error) as e:
+        raise BulkImportError(f"Can't read the dump: {e}")
+
+
+def _external_id(value):
+    return None if value is None else str(value)
+
+
+def _as_int(value):
+    """int(value), 0 for an empty value, None if it is not a number."""
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "t")
+    return bool(value)
+
+
+def _shards_of(model, ids):
+    """{id: shard} of existing rows."""
+    if not sharding.enabled():
+        return dict.fromkeys(ids, sharding.shards()[0])
+    return sharding.locate_many(model, ids)
+
+
+def _as_datetime(value):
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(str(value))
+    except ValueError:
+        # Well formed but not a valid date
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class BulkImporter:
+    """
+    Import a dump under a named source. Running it again with the same
+    source resumes an interrupted import.
+    """
+
+    def __init__(self, source, batch_size=DEFAULT_BATCH_SIZE, notify=True, progress=None):
+        self.batch_size = batch_size
+        self.notify = notify
+        self.progress = progress
+        expire_stale_imports()
+        self.job, _ = ImportJob.objects.get_or_create(source=source)
+        if self.job.status == "done":
+            raise BulkImportError(f"Import '{source}' has already completed")
+        # Jobs that never started have no heartbeat
+        if self.job.status == "running" and self.job.heartbeat_at is not None:
+            raise BulkImportError(f"Import '{source}' is already running")
+        self.stats = defaultdict(int)
+
+    # ----------------- Driver -----------------
+
+    def run(self, records):
+        started = time.monotonic()
+        resume_after = self.job.rows_processed
+        self.job.status = "running"
+        self.job.heartbeat_at = timezone.now()
+        self.job.save(update_fields=["status", "heartbeat_at", "updated_at"])
+
+        self._drop_deferred_indexes()
+        try:
+            batch = []
+            rows = 0
+            for position, record in enumerate(records):
+                if position < resume_after:
+                    continue
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch)
+                    rows += len(batch)
+                    batch = []
+                    self._report(rows, started)
+            if batch:
+                self._import_batch(batch)
+                rows += len(batch)
+                self._report(rows, started)
+
+            for _ in sharding.each_shard():
+                rebuild_question_counters()
+                rebuild_answer_vote_counts()
+                self._heartbeat()
+            rebuild_user_counters()
+            self._heartbeat()
+            build_snapshot()
+        except Exception:
+            self.job.status = "failed"
+            self.job.save(update_fields=["status", "updated_at"])
+            raise
+        finally:
+            self._restore_deferred_indexes()
+
+        self.job.status = "done"
+        self.job.save(update_fields=["status", "updated_at"])
+
+        elapsed = time.monotonic() - started
+        return {
+            "source": self.job.source,
+            "rows": rows,
+            "resumed_after": resume_after,
+            "seconds": round(elapsed, 2),
+            "rows_per_sec": round(rows / elapsed, 1) if elapsed else rows,
+            **self.stats,
+        }
+
+    def _heartbeat(self):
+        self.job.heartbeat_at = timezone.now()
+        self.job.save(update_fields=["heartbeat_at", "updated_at"])
+
+    def _report(self, rows, started):
+        if self.progress:
+            elapsed = time.monotonic() - started
+            self.progress(rows, rows / elapsed if elapsed else rows)
+
+    def _import_batch(self, batch):
+        by_type = defaultdict(list)
+        for record in batch:
+            by_type[record.get("type")].append(record)
+
+        with sharding.atomic_everywhere():
+            self._notifications = []
+            for record_type in IMPORT_ORDER:
+                if by_type[record_type]:
+                    getattr(self, f"_import_{record_type}s")(by_type[record_type])
+            for record_type, records in by_type.items():
+                if record_type not in IMPORT_ORDER and record_type != "cursor":
+                    self.stats["skipped"] += len(records)
+
+            if self._notifications:
+                shards = _shards_of(Question, {n.question_id for n in self._notifications})
+                for alias, notifications in self._by_shard(
+                    self._notifications, lambda n: shards[n.question_id]
+                ).items():
+                    Notification.objects.using(alias).bulk_create(
+                        notifications, batch_size=self.batch_size
+                    )
+                self.stats["notifications"] += len(self._notifications)
+
+            self.job.rows_processed += len(batch)
+            self.job.heartbeat_at = timezone.now()
+            self.job.save(update_fields=["rows_processed", "heartbeat_at", "updated_at"])
+
+    # ----------------- Id mapping -----------------
+
+    def _lookup(self, record_type, external_ids):
+        external_ids = {i for i in external_ids if i is not None}
+        if not external_ids:
+            return {}
+        return dict(
+            ImportedRecord.objects.filter(
+                job=self.job, record_type=record_type, external_id__in=external_ids
+            ).values_list("external_id", "local_id")
+        )
+
+    def _remember(self, record_type, pairs):
+        ImportedRecord.objects.bulk_create(
+            [
+                ImportedRecord(
+                    job=self.job,
+                    record_type=record_type,
+                    external_id=external_id,
+                    local_id=local_id,
+                )
+                for external_id, local_id in pairs
+            ],
+            batch_size=self.batch_size,
+        )
+        self.stats[f"{record_type}s"] += len(pairs)
+
+    def _create(self, model, rows, record_type):
+        """
+        bulk_create (external_id, instance, timestamp) rows and record their
+        mapping. auto_now_add overwrites timestamps on insert, so the legacy
+        ones are written back with a single bulk_update.
+        """
+        if not rows:
+            return
+        model.objects.bulk_create([obj for _, obj, _ in rows], batch_size=self.batch_size)
+
+        dated = []
+        for _, obj, timestamp in rows:
+            if timestamp is not None:
+                obj.timestamp = timestamp
+                dated.append(obj)
+        if dated:
+            model.objects.bulk_update(dated, ["timestamp"], batch_size=self.batch_size)
+
+        self._remember(record_type, [(ext, obj.id) for ext, obj, _ in rows])
+
+    def _by_shard(self, items, shard_of):
+        groups = defaultdict(list)
+        for item in items:
+            groups[shard_of(item)].append(item)
+        return groups
+
+    def _create_on_shards(self, model, rows, record_type, shard_of):
+        """_create rows on the shard shard_of(instance) of each.
+
+        :return: {shard: rows}
+        """
+        groups = self._by_shard(rows, lambda row: shard_of(row[1]))
+        for alias, group in groups.items():
+            with sharding.use_shard(alias):
+                self._create(model, group, record_type)
+        return groups
+
+    # ----------------- Notifications -----------------
+
+    def _queue_notifications(self, items):
+        """
+        Queue notifications for imported posts.
+
+        :param items: (author_id, owner_id, text, question_id, answer_id)
+            tuples; owner_id is the author of the parent post (None for
+            questions), who is notified like create_answer_notification and
+            create_comment_notification do.
+        """
+        if not self.notify:
+            return
+        mentioned = resolve_mentions(
+            set().union(*(extract_mentions(text) for _, _, text, _, _ in items))
+        )
+
+        seen = set()
+        for author_id, owner_id, text, question_id, answer_id in items:
+            recipients = {mentioned[name] for name in extract_mentions(text) if name in mentioned}
+            if owner_id is not None:
+                recipients.add(owner_id)
+            recipients.discard(author_id)
+            for user_id in recipients:
+                key = (user_id, question_id, answer_id, author_id)
+                if key not in seen:
+                    seen.add(key)
+                    self._notifications.append(
+                        Notification(
+                            user_id=user_id,
+                            question_id=question_id,
+                            answer_id=answer_id,
+                            mention_by_id=author_id,
+                        )
+                    )
+
+    # ----------------- Record types -----------------
+
+    def _import_users(self, records):
+        known = self._lookup("user", (_external_id(r.get("id")) for r in records))
+        existing = dict(
+            UserDetail.objects.filter(
+                user_email__in={r.get("user_email") for r in records}
+            ).values_list("user_email", "id")
+        )
+
+        rows = []
+        pairs = []
+        created_by_email = {}
+        for record in records:
+            external_id = _external_id(record.get("id"))
+            email = record.get("user_email")
+            reputation = _as_int(record.get("reputation"))
+            if external_id is None or not email or external_id in known or reputation is None:
+                self.stats["skipped"] += 1
+                continue
+            if email in existing:
+                # Same person already has an account here: reuse it
+                pairs.append((external_id, existing[email]))
+                continue
+            if email in created_by_email:
+                created_by_email[email].append(external_id)
+                continue
+            created_by_email[email] = []
+            user = UserDetail(
+                username=(record.get("username") or email.split("@")[0])[:150],
+                user_email=email,
+                # Imported accounts log in after a password reset
+                user_password=make_password(None),
+                reputation=reputation,
+                is_user_deleted=_as_bool(record.get("is_user_deleted", False)),
+                date_joined=_as_datetime(record.get("date_joined")) or timezone.now(),
+            )
+            rows.append((external_id, user, None))
+
+        UserDetail.objects.bulk_create([user for _, user, _ in rows], batch_size=self.batch_size)
+        for external_id, user, _ in rows:
+            pairs.append((external_id, user.id))
+            pairs.extend((duplicate, user.id) for duplicate in created_by_email[user.user_email])
+        self._remember("user", pairs)
+
+    def _import_questions(self, records):
+        users = self._lookup("user", (_external_id(r.get("user_id")) for r in records))
+
+        rows = []
+        for record in records:
+            user_id = users.get(_external_id(record.get("user_id")))
+            if user_id is None or record.get("id") is None:
+                self.stats["skipped"] += 1
+                continue
+            timestamp = _as_datetime(record.get("timestamp"))
+            question = Question(
+                user_id=user_id,
+                question_title=(record.get("question_title") or "")[:255],
+                question_description=record.get("question_description") or "",
+                question_tag=(record.get("question_tag") or "")[:255],
+                question_deleted=_as_bool(record.get("question_deleted", False)),
+                last_activity=timestamp or timezone.now(),
+            )
+            rows.append((_external_id(record["id"]), question, timestamp))
+        placed = self._create_on_shards(
+            Question, rows, "question", lambda question: sharding.place_question()
+        )
+        for alias, group in placed.items():
+            with sharding.use_shard(alias):
+                index_questions([q for _, q, _ in group], batch_size=self.batch_size)
+
+        self._queue_notifications(
+            [
+                (
+                    q.user_id,
+                    None,
+                    f"{q.question_title} {q.question_description}",
+                    q.id,
+                    None,
+                )
+                for _, q, _ in rows
+                if not q.question_deleted
+            ]
+        )
+
+    def _import_answers(self, records):
+        users = self._lookup("user", (_external_id(r.get("user_id")) for r in records))
+        questions = self._lookup(
+            "question", (_external_id(r.get("question_id")) for r in records)
+        )
+        question_authors = dict(
+            sharding.scatter(Question.objects.filter(id__in=questions.values())).values_list(
+                "id", "user_id"
+            )
+        )
+        question_shards = _shards_of(Question, question_authors)
+
+        rows = []
+        for record in records:
+            user_id = users.get(_external_id(record.get("user_id")))
+            question_id = questions.get(_external_id(record.get("question_id")))
+            if user_id is None or question_id is None or record.get("id") is None:
+                self.stats["skipped"] += 1
+                continue
+            if question_id not in question_shards:
+                self.stats["skipped"] += 1
+                continue
+            answer = Answer(
+                user_id=user_id,
+                question_id=question_id,
+                answer_description=record.get("answer_description") or "",
+                answer_deleted=_as_bool(record.get("answer_deleted", False)),
+            )
+            rows.append(
+                (_external_id(record["id"]), answer, _as_datetime(record.get("timestamp")))
+            )
+        self._create_on_shards(
+            Answer, rows, "answer", lambda answer: question_shards[answer.question_id]
+        )
+
+        self._queue_notifications(
+            [
+                (
+                    a.user_id,
+                    question_authors.get(a.question_id),
+                    a.answer_description,
+                    a.question_id,
+                    a.id,
+                )
+                for _, a, _ in rows
+                if not a.answer_deleted
+            ]
+        )
+
+    def _import_comments(self, records):
+        users = self._lookup("user", (_external_id(r.get("user_id")) for r in records))
+        answers = self._lookup("answer", (_external_id(r.get("answer_id")) for r in records))
+        answer_info = {
+            answer_id: (user_id, question_id)
+            for answer_id, user_id, question_id in sharding.scatter(
+                Answer.objects.filter(id__in=answers.values())
+            ).values_list("id", "user_id", "question_id")
+        }
+        answer_shards = _shards_of(Answer, answer_info)
+
+        rows = []
+        for record in records:
+            user_id = users.get(_external_id(record.get("user_id")))
+            answer_id = answers.get(_external_id(record.get("answer_id")))
+            if user_id is None or answer_id is None or record.get("id") is None:
+                self.stats["skipped"] += 1
+                continue
+            if answer_id not in answer_shards:
+                self.stats["skipped"] += 1
+                continue
+            comment = Comment(
+                user_id=user_id,
+                answer_id=answer_id,
+                comment_content=record.get("comment_content") or "",
+                comment_deleted=_as_bool(record.get("comment_deleted", False)),
+            )
+            rows.append(
+                (_external_id(record["id"]), comment, _as_datetime(record.get("timestamp")))
+            )
+        self._create_on_shards(
+            Comment, rows, "comment", lambda comment: answer_shards[comment.answer_id]
+        )
+
+        self._queue_notifications(
+            [
+                (
+                    c.user_id,
+                    answer_info[c.answer_id][0],
+                    c.comment_content,
+                    answer_info[c.answer_id][1],
+                    c.answer_id,
+                )
+                for _, c, _ in rows
+                if not c.comment_deleted
+            ]
+        )
+
+    def _import_upvotes(self, records):
+        users = self._lookup("user", (_external_id(r.get("by_user_id")) for r in records))
+        questions = self._lookup(
+            "question", (_external_id(r.get("question_id")) for r in records)
+        )
+        answers = self._lookup("answer", (_external_id(r.get("answer_id")) for r in records))
+        question_shards = _shards_of(Question, questions.values())
+        answer_shards = _shards_of(Answer, answers.values())
+
+        rows = []
+        seen = set()
+        for record in records:
+            user_id = users.get(_external_id(record.get("by_user_id")))
+            question_id = questions.get(_external_id(record.get("question_id")))
+            answer_id = answers.get(_external_id(record.get("answer_id")))
+            key = (user_id, question_id, answer_id)
+            if (
+                user_id is None
+                or (question_id is None) == (answer_id is None)
+                or (question_id and question_id not in question_shards)
+                or (answer_id and answer_id not in answer_shards)
+                or record.get("id") is None
+                or key in seen
+            ):
+                self.stats["skipped"] += 1
+                continue
+            seen.add(key)
+            upvote = Upvote(by_user_id=user_id, question_id=question_id, answer_id=answer_id)
+            rows.append(
+                (_external_id(record["id"]), upvote, _as_datetime(record.get("timestamp")))
+            )
+        self._create_on_shards(
+            Upvote,
+            rows,
+            "upvote",
+            lambda upvote: question_shards.get(upvote.question_id)
+            or answer_shards[upvote.answer_id],
+        )
+
+    # ----------------- Deferred indexes -----------------
+
+    def _existing_index_names(self, connection, model):
+        with connection.cursor() as cursor:
+            return set(
+                connection.introspection.get_constraints(cursor, model._meta.db_table)
+            )
+
+    def _drop_deferred_indexes(self):
+        for alias in sharding.shards():
+            connection = connections[alias]
+            with connection.schema_editor() as editor:
+                for model in DEFERRED_INDEX_MODELS:
+                    existing = self._existing_index_names(connection, model)
+                    for index in model._meta.indexes:
+                        if index.name in existing:
+                            editor.remove_index(model, index)
+
+    def _restore_deferred_indexes(self):
+        for alias in sharding.shards():
+            connection = connections[alias]
+            with connection.schema_editor() as editor:
+                for model in DEFERRED_INDEX_MODELS:
+                    existing = self._existing_index_names(connection, model)
+                    for index in model._meta.indexes:
+                        if index.name not in existing:
+                            editor.add_index(model, index)
+
+
+# ----------------- Background imports -----------------
+
+_running = set()
+_running_lock = threading.Lock()
+
+
+def start_import(source, path, input_format=None, notify=True):
+    """
+    Import a stored dump file in a background thread and return its
+    ImportJob. The file is removed once the import completes; after a
+    failure it is kept for `import_corpus <path> --source <source>`.
+
+    :raises BulkImportError: the source has already been imported, or is
+        being imported
+    """
+    importer = BulkImporter(source, notify=notify)
+    with _running_lock:
+        if source in _running:
+            raise BulkImportError(f"Import '{source}' is already running")
+        _running.add(source)
+    threading.Thread(
+        target=_run_import,
+        args=(importer, path, input_format),
+        name=f"import-{importer.job.id}",
+        daemon=True,
+    ).start()
+    return importer.job
+
+
+def _run_import(importer, path, input_format):
+    try:
+        importer.run(read_dump(path, input_format))
+    except Exception:
+        logger.exception("Import '%s' failed", importer.job.source)
+    else:
+        os.remove(path)
+    finally:
+        with _running_lock:
+            _running.discard(importer.job.source)
+        connections.close_all()
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_deleted, get_archive_setting
+
+
+class Command(BaseCommand):
+    help = (
+        "Move users, questions, answers and comments soft-deleted longer than "
+        "the retention window (with their dependent rows) into the archive. "
+        "Meant to be run periodically (e.g. nightly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=None,
+            help=(
+                "Archive rows deleted more than this many days ago "
+                f"(default: ARCHIVE['RETENTION_DAYS'], {get_archive_setting('RETENTION_DAYS')})"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Rows archived per transaction (default: ARCHIVE['BATCH_SIZE'])",
+        )
+
+    def handle(self, *args, **options):
+        archived = archive_deleted(
+            retention_days=options["retention_days"], batch_size=options["batch_size"]
+        )
+        summary = ", ".join(f"{count} {name}" for name, count in archived.items())
+        self.stdout.write(self.style.SUCCESS(f"Archived {summary}"))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.related import DEFAULT_BATCH_SIZE, build_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the related-questions index with questions posted since the "
+        "last run. Meant to be run periodically, or kept running with --interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild from scratch (re-weights every question and drops deleted ones)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Questions per sparse similarity product (default: {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep running and refresh every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        full = options["full"]
+        while True:
+            started = time.monotonic()
+            stats = build_index(full=full, batch_size=options["batch_size"])
+            elapsed = time.monotonic() - started
+            if stats["version"]:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Indexed {stats['indexed']} questions "
+                        f"({stats['total']} total) in {elapsed:.1f}s as {stats['version']}"
+                    )
+                )
+            else:
+                self.stdout.write("No new questions to index")
+
+            if not options["interval"]:
+                return
+            full = False
+            time.sleep(options["interval"])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api import sharding
+from api.similarity import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Build (or rebuild) the MinHash/LSH index used for near-duplicate "
+        "question detection. New and edited questions are indexed as they are "
+        "saved; run this once to backfill existing questions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of questions indexed per batch (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        indexed = sum(
+            rebuild_index(batch_size=options["batch_size"]) for _ in sharding.each_shard()
+        )
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} questions"))
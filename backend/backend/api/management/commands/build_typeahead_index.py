@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.typeahead import build_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a fresh typeahead snapshot of all live questions (and start a "
+        "new journal). Run it after deploys and periodically so popularity "
+        "rankings stay current; workers pick up the new snapshot on their "
+        "next lookup."
+    )
+
+    def handle(self, *args, **options):
+        count = build_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Wrote typeahead snapshot of {count} questions"))
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+
+from api import sharding
+from api.notifications import compact_notifications, purge_read_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Collapse bursts of notifications about the same question into digests "
+        "and purge old read notifications. Meant to be run periodically "
+        "(e.g. hourly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window-hours",
+            type=int,
+            default=None,
+            help=(
+                "Maximum gap between digested notifications "
+                "(default: NOTIFICATIONS['DIGEST_WINDOW_HOURS'])"
+            ),
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=None,
+            help=(
+                "Age after which read notifications are purged "
+                "(default: NOTIFICATIONS['READ_RETENTION_DAYS'])"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help=(
+                "Users compacted / notifications purged per batch "
+                "(default: NOTIFICATIONS['BATCH_SIZE'])"
+            ),
+        )
+        parser.add_argument(
+            "--no-purge",
+            action="store_true",
+            help="Only compact, keep old read notifications",
+        )
+
+    def handle(self, *args, **options):
+        removed = sum(
+            compact_notifications(
+                window_hours=options["window_hours"], batch_size=options["batch_size"]
+            )
+            for _ in sharding.each_shard()
+        )
+        self.stdout.write(f"Collapsed {removed} notifications into digests")
+        if not options["no_purge"]:
+            purged = sum(
+                purge_read_notifications(
+                    retention_days=options["retention_days"],
+                    batch_size=options["batch_size"],
+                )
+                for _ in sharding.each_shard()
+            )
+            self.stdout.write(f"Purged {purged} old read notifications")
+        self.stdout.write(self.style.SUCCESS("Notifications compacted"))
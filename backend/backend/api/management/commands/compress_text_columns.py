@@ -0,0 +1,90 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api import sharding
+from api.compression import CompressedTextField, compress_column, text, train_dictionary
+
+
+def compressed_columns():
+    """(model, field name) of every CompressedTextField."""
+    return [
+        (model, field.name)
+        for model in apps.get_app_config("api").get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, CompressedTextField)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compress existing rows of every CompressedTextField column that reach "
+        "COMPRESSION['THRESHOLD'], in batches. Safe to interrupt and re-run. "
+        "With --decompress, store every compressed row as plain text again. "
+        "Run VACUUM afterwards to return the freed pages to the filesystem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Rows rewritten per transaction"
+        )
+        parser.add_argument(
+            "--decompress", action="store_true", help="Undo the compression"
+        )
+        parser.add_argument(
+            "--train-dictionary",
+            metavar="PATH",
+            help="Instead, train a zstd dictionary on existing rows and write it to PATH "
+            "(then set COMPRESSION['ZSTD_DICTIONARY'] to PATH and move the previous "
+            "dictionary, if any, to COMPRESSION['ZSTD_PREVIOUS_DICTIONARIES'])",
+        )
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=5000,
+            help="Rows sampled per column for --train-dictionary",
+        )
+
+    def handle(self, *args, **options):
+        if any(connections[alias].vendor != "sqlite" for alias in sharding.shards()):
+            raise CommandError("Text columns are only compressed on SQLite")
+        if options["train_dictionary"]:
+            self._train(options["train_dictionary"], options["samples"])
+            return
+
+        for model, field_name in compressed_columns():
+            rewritten = sum(
+                compress_column(
+                    model,
+                    field_name,
+                    batch_size=options["batch_size"],
+                    decompress_rows=options["decompress"],
+                )
+                for _ in sharding.each_shard()
+            )
+            self.stdout.write(
+                f"{model.__name__}.{field_name}: "
+                f"{'decompressed' if options['decompress'] else 'compressed'} {rewritten} rows"
+            )
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def _train(self, path, samples):
+        texts = []
+        for model, field_name in compressed_columns():
+            texts.extend(
+                text(value)
+                for value in sharding.scatter(model.objects.order_by("-id")).values_list(
+                    field_name, flat=True
+                )[:samples]
+            )
+        try:
+            dictionary = train_dictionary(texts)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        with open(path, "wb") as handle:
+            handle.write(dictionary)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote a {len(dictionary)} byte dictionary trained on {len(texts)} rows to {path}"
+            )
+        )
@@ -0,0 +1,80 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import (
+    DEFAULT_CHUNK_SIZE,
+    gzip_stream,
+    iter_ndjson,
+    iter_records,
+    parse_since,
+    parse_since_ids,
+    parse_types,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Export users, questions, answers, comments and upvotes as NDJSON "
+        "with constant memory, optionally gzip-compressed and incremental."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="Output file (default: stdout). A .gz suffix implies --gzip",
+        )
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output")
+        parser.add_argument(
+            "--types",
+            default="",
+            help="Comma separated types to export (default: all)",
+        )
+        parser.add_argument(
+            "--since-id",
+            default="",
+            help="Only rows with a greater id: one id, or per type (question:10,answer:20)",
+        )
+        parser.add_argument(
+            "--since",
+            default="",
+            help="Only rows created after this ISO date/datetime",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Rows fetched per database round trip (default: {DEFAULT_CHUNK_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            types = parse_types(options["types"])
+            since_ids = parse_since_ids(options["since_id"])
+            since = parse_since(options["since"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = options["output"]
+        chunks = iter_ndjson(
+            iter_records(
+                types=types,
+                since_ids=since_ids,
+                since=since,
+                chunk_size=options["chunk_size"],
+            )
+        )
+        if options["gzip"] or output.endswith(".gz"):
+            chunks = gzip_stream(chunks)
+
+        if output == "-":
+            stream = sys.stdout.buffer
+            for chunk in chunks:
+                stream.write(chunk)
+            stream.flush()
+        else:
+            with open(output, "wb") as stream:
+                for chunk in chunks:
+                    stream.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Exported corpus to {output}"))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import DEFAULT_BATCH_SIZE, BulkImporter, BulkImportError, read_dump
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import a legacy Q&A dump (NDJSON or CSV, optionally gzipped). "
+        "Re-running with the same --source resumes an interrupted import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Dump file (.ndjson, .jsonl, .csv, optionally .gz)")
+        parser.add_argument(
+            "--source",
+            help="Name identifying this import for resuming (default: the file name)",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["ndjson", "csv"],
+            help="Input format (default: guessed from the file name)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Records per transaction (default: {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--no-notifications",
+            action="store_true",
+            help="Don't create answer, comment and mention notifications",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+
+        def progress(rows, rows_per_sec):
+            self.stdout.write(f"{rows} rows imported ({rows_per_sec:.0f} rows/s)")
+
+        try:
+            importer = BulkImporter(
+                options["source"] or path,
+                batch_size=options["batch_size"],
+                notify=not options["no_notifications"],
+                progress=progress,
+            )
+        except BulkImportError as e:
+            raise CommandError(str(e))
+
+        try:
+            stats = importer.run(read_dump(path, options["format"]))
+        except BulkImportError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {stats['rows']} rows in {stats['seconds']}s "
+                f"({stats['rows_per_sec']} rows/s)"
+            )
+        )
+        for key, value in sorted(stats.items()):
+            if key not in ("rows", "seconds", "rows_per_sec", "source"):
+                self.stdout.write(f"  {key}: {value}")
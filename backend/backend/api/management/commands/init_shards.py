@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import sharding
+from api.models import Question, QuestionPlacement
+
+
+class Command(BaseCommand):
+    help = (
+        "Record where existing questions live after sharding was turned on or "
+        "shards were added: every question that is not on the shard its id "
+        "points to gets a QuestionPlacement. Run it once after "
+        "`migrate --database <alias>` for every shard, before serving "
+        "traffic. Safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Questions read and placements written per query (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError("Sharding is off: SHARDING['SHARDS'] has a single database")
+
+        batch_size = options["batch_size"]
+        for alias in sharding.shards():
+            ids = Question.objects.using(alias).order_by("id").values_list("id", flat=True)
+            placed = total = last_id = 0
+            while True:
+                batch = list(ids.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                misplaced = [i for i in batch if sharding.slot_shard(i) != alias]
+                QuestionPlacement.objects.bulk_create(
+                    [QuestionPlacement(question_id=i, shard=alias) for i in misplaced],
+                    update_conflicts=True,
+                    unique_fields=["question_id"],
+                    update_fields=["shard", "placed_at"],
+                )
+                placed += len(misplaced)
+                total += len(batch)
+                last_id = batch[-1]
+            self.stdout.write(f"{alias}: {total} questions, {placed} placements recorded")
+        self.stdout.write(self.style.SUCCESS("Shards initialized"))
@@ -0,0 +1,120 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import sharding
+from api.models import Question
+
+
+def plan_moves(counts, targets, drain=None, limit=None):
+    """
+    Yield (question id, source, target) moves that even out the question
+    counts of the shards, or with drain, empty that shard. counts is
+    updated as moves are planned.
+    """
+    pending = {alias: [] for alias in counts}
+    last_ids = dict.fromkeys(counts, 0)
+
+    def next_question(alias):
+        # Read ahead in batches instead of holding a cursor open while moving
+        if not pending[alias]:
+            pending[alias] = list(
+                Question.objects.using(alias)
+                .filter(id__gt=last_ids[alias])
+                .order_by("id")
+                .values_list("id", flat=True)[:1000]
+            )
+            if not pending[alias]:
+                return None
+            last_ids[alias] = pending[alias][-1]
+        return pending[alias].pop(0)
+
+    planned = 0
+    while limit is None or planned < limit:
+        target = min(targets, key=lambda alias: counts[alias])
+        if drain:
+            source = drain
+            if not counts[source]:
+                return
+        else:
+            source = max(counts, key=lambda alias: counts[alias])
+            if counts[source] - counts[target] <= 1:
+                return
+        question_id = next_question(source)
+        if question_id is None:
+            return
+        counts[source] -= 1
+        counts[target] += 1
+        planned += 1
+        yield question_id, source, target
+
+
+class Command(BaseCommand):
+    help = (
+        "Move questions (with their answers, comments, votes, notifications "
+        "and follows) between shards until every shard holds about as many, "
+        "or move every question off a shard with --drain. Ids are kept. "
+        "Writes to a question while it is moved may be lost, so run it at a "
+        "quiet time; an interrupted run is completed by running it again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--drain",
+            metavar="ALIAS",
+            help="Empty this shard (leave it out of SHARDING['PLACEMENT_SHARDS'] first)",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=None, help="Move at most this many questions"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows inserted per query (default: 500)",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only print the planned moves"
+        )
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError("Sharding is off: SHARDING['SHARDS'] has a single database")
+        drain = options["drain"]
+        aliases = sharding.shards()
+        if drain and drain not in aliases:
+            raise CommandError(f"{drain} is not in SHARDING['SHARDS']")
+        targets = [
+            alias
+            for alias in sharding.get_sharding_setting("PLACEMENT_SHARDS") or aliases
+            if alias != drain
+        ]
+        if not targets:
+            raise CommandError("No shard left to move questions to")
+
+        counts = {alias: Question.objects.using(alias).count() for alias in aliases}
+        self.stdout.write(
+            "Questions per shard: " + ", ".join(f"{a}: {n}" for a, n in counts.items())
+        )
+
+        moved = rows = 0
+        for question_id, source, target in plan_moves(
+            counts, targets, drain=drain, limit=options["limit"]
+        ):
+            if options["dry_run"]:
+                self.stdout.write(f"Question {question_id}: {source} -> {target}")
+                moved += 1
+                continue
+            try:
+                rows += sharding.move_question(
+                    question_id, target, batch_size=options["batch_size"]
+                )
+            except LookupError as e:
+                raise CommandError(f"{e} (run init_shards first)")
+            moved += 1
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Would move {moved} questions"))
+            return
+        self.stdout.write(
+            "Questions per shard: " + ", ".join(f"{a}: {n}" for a, n in counts.items())
+        )
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} questions ({rows} rows)"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.activity import rebuild_user_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount every user's question, answer, comment and upvotes-received "
+        "counters from the source tables (backfill or drift repair)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of users updated per batch (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        updated = rebuild_user_counters(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Recounted activity of {updated} users"))
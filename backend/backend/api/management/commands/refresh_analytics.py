@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.analytics import DEFAULT_BATCH_SIZE, rebuild_rollups, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Add rows created since the last run to the daily/weekly analytics "
+        "rollups. Idempotent; meant to be run periodically (e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Source rows rolled up per transaction (default: {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop the rollups and count every row again (e.g. after tag bucketing changed)",
+        )
+
+    def handle(self, *args, **options):
+        refresh = rebuild_rollups if options["rebuild"] else refresh_rollups
+        counted = refresh(batch_size=options["batch_size"])
+        for metric, rows in counted.items():
+            self.stdout.write(f"{metric}: {rows} new rows")
+        self.stdout.write(self.style.SUCCESS("Analytics rollups are up to date"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from api import sharding
+from api.ranking import (
+    decay_hot_scores,
+    rebuild_answer_vote_counts,
+    rebuild_question_counters,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-apply time decay to stored question hot scores in batches. "
+        "Meant to be run periodically (e.g. every few minutes from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of questions updated per query (default: 500)",
+        )
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help=(
+                "Recount question upvotes, answers and comments and answer "
+                "vote counts from the source tables first"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        updated = 0
+        for alias in sharding.each_shard():
+            if options["recount"]:
+                recounted = rebuild_question_counters(batch_size=batch_size)
+                self.stdout.write(f"{alias}: recounted activity for {recounted} questions")
+                recounted = rebuild_answer_vote_counts(batch_size=batch_size)
+                self.stdout.write(f"{alias}: recounted votes for {recounted} answers")
+            updated += decay_hot_scores(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Decayed hot scores of {updated} questions"))
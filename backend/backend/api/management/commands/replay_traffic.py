@@ -0,0 +1,178 @@
+import json
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from api.traffic import read_log, subject_token
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-issue captured traffic (see TRAFFIC_CAPTURE) against one or two "
+        "running builds, each serving its own copy of a database snapshot, and "
+        "report per-route latency and the difference between the builds. "
+        "Tokens are minted for the captured subjects, so the targets must "
+        "share this project's SECRET_KEY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("logs", nargs="+", help="Captured traffic-*.ndjson files")
+        parser.add_argument(
+            "--target",
+            action="append",
+            required=True,
+            help="name=base_url, once or twice (e.g. before=http://127.0.0.1:8000)",
+        )
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=1.0,
+            help="Replay speed relative to the capture (2 = twice as fast, 0 = no pauses)",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="Requests in flight (default: 8)"
+        )
+        parser.add_argument("--limit", type=int, default=None, help="Replay the first N requests")
+        parser.add_argument(
+            "--writes",
+            action="store_true",
+            help="Also replay writes (they change the snapshots; reset them between runs)",
+        )
+        parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout")
+        parser.add_argument("--json", dest="json_path", help="Also write the report as JSON")
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options["target"]:
+            name, _, base_url = target.partition("=")
+            if not base_url:
+                raise CommandError(f"--target must be name=base_url, got {target!r}")
+            targets.append((name, base_url.rstrip("/")))
+        if len(targets) > 2:
+            raise CommandError("At most two targets can be compared")
+
+        entries = [
+            entry
+            for entry in read_log(options["logs"])
+            if options["writes"] or entry["m"] in SAFE_METHODS
+        ][: options["limit"]]
+        if not entries:
+            raise CommandError("No requests to replay")
+
+        tokens = {
+            subject: subject_token(subject) for subject in {e["s"] for e in entries if e["s"]}
+        }
+        # (route, target) -> latencies; route -> requests answered differently
+        latencies = defaultdict(list)
+        mismatches = defaultdict(int)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+        local = threading.local()
+
+        def issue(base_url, entry):
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+            headers = {}
+            if entry["s"]:
+                headers["Authorization"] = f"Bearer {tokens[entry['s']]}"
+            url = base_url + entry["p"] + (f"?{entry['q']}" if entry["q"] else "")
+            started = time.perf_counter()
+            response = session.request(
+                entry["m"], url, json=entry["b"], headers=headers, timeout=options["timeout"]
+            )
+            return response.status_code, (time.perf_counter() - started) * 1000
+
+        def replay(index, entry):
+            # Alternate which build goes first so neither gets the warm cache
+            order = targets if index % 2 == 0 else targets[::-1]
+            statuses = {}
+            for name, base_url in order:
+                try:
+                    status_code, elapsed = issue(base_url, entry)
+                except requests.RequestException:
+                    with lock:
+                        errors[name] += 1
+                    continue
+                statuses[name] = status_code
+                with lock:
+                    latencies[(entry["r"], name)].append(elapsed)
+            if len(set(statuses.values())) > 1:
+                with lock:
+                    mismatches[entry["r"]] += 1
+
+        speed = options["speed"]
+        first = entries[0]["t"]
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            for index, entry in enumerate(entries):
+                if speed > 0:
+                    delay = (entry["t"] - first) / speed - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                pool.submit(replay, index, entry)
+        elapsed = time.monotonic() - started
+
+        report = self._report(targets, latencies, mismatches)
+        self.stdout.write(
+            f"Replayed {len(entries)} requests in {elapsed:.1f}s "
+            f"(errors: {dict(errors) or 0})"
+        )
+        self._print(targets, report)
+        if options["json_path"]:
+            with open(options["json_path"], "w", encoding="utf-8") as handle:
+                json.dump(report, handle, indent=2)
+
+    def _report(self, targets, latencies, mismatches):
+        names = [name for name, _ in targets]
+        report = []
+        for route in sorted({route for route, _ in latencies}):
+            row = {"route": route, "status_mismatches": mismatches.get(route, 0)}
+            for name in names:
+                values = latencies.get((route, name))
+                if values:
+                    row[name] = {
+                        "count": len(values),
+                        "p50": round(statistics.median(values), 2),
+                        "p95": round(percentile(values, 95), 2),
+                        "p99": round(percentile(values, 99), 2),
+                    }
+            if len(names) == 2 and all(name in row for name in names):
+                before, after = row[names[0]], row[names[1]]
+                row["p50_change_pct"] = round((after["p50"] / before["p50"] - 1) * 100, 1)
+                row["p95_change_pct"] = round((after["p95"] / before["p95"] - 1) * 100, 1)
+            report.append(row)
+        return report
+
+    def _print(self, targets, report):
+        names = [name for name, _ in targets]
+        header = f"{'route':<48} {'n':>6}"
+        for name in names:
+            header += f" {name + ' p50':>12} {name + ' p95':>12}"
+        if len(names) == 2:
+            header += f" {'p50 Δ%':>8} {'p95 Δ%':>8} {'status≠':>8}"
+        self.stdout.write(header)
+        for row in report:
+            line = f"{row['route'][:48]:<48} {row.get(names[0], {}).get('count', 0):>6}"
+            for name in names:
+                stats = row.get(name, {})
+                line += f" {stats.get('p50', 0):>12.1f} {stats.get('p95', 0):>12.1f}"
+            if len(names) == 2:
+                line += (
+                    f" {row.get('p50_change_pct', 0):>8.1f}"
+                    f" {row.get('p95_change_pct', 0):>8.1f}"
+                    f" {row['status_mismatches']:>8}"
+                )
+            self.stdout.write(line)
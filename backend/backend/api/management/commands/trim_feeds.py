@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from api import sharding
+from api.feed import trim_feeds
+
+
+class Command(BaseCommand):
+    help = (
+        "Cap every user's home feed entries and every tag's entries at "
+        "FEED['MAX_ENTRIES'] (on each shard). Meant to be run periodically "
+        "(e.g. hourly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-entries",
+            type=int,
+            default=None,
+            help="Entries kept per user and per tag (default: FEED['MAX_ENTRIES'])",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Rows deleted per query (default: FEED['BATCH_SIZE'])",
+        )
+
+    def handle(self, *args, **options):
+        deleted = {"feed_entries": 0, "tag_entries": 0}
+        for _ in sharding.each_shard():
+            trimmed = trim_feeds(
+                max_entries=options["max_entries"], batch_size=options["batch_size"]
+            )
+            for key, count in trimmed.items():
+                deleted[key] += count
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Trimmed {deleted['feed_entries']} feed entries and "
+                f"{deleted['tag_entries']} tag entries"
+            )
+        )
@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+
+from . import identity, traffic
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+LOAD_SHEDDING_DEFAULTS = {
+    "MAX_IN_FLIGHT": 200,
+    "MAX_PENDING_WRITES": 16,
+    "RETRY_AFTER": 2,
+}
+
+
+class LoadSheddingMiddleware:
+    """
+    Answer 503 with Retry-After instead of queueing work the worker cannot
+    keep up with.
+
+    Writes all serialize on the SQLite write lock, so once
+    LOAD_SHEDDING["MAX_PENDING_WRITES"] write requests are in flight further
+    writes are rejected straight away. Any request is rejected once
+    LOAD_SHEDDING["MAX_IN_FLIGHT"] requests are in flight. This keeps read
+    latency stable when a client floods the write endpoints.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+        conf = {**LOAD_SHEDDING_DEFAULTS, **getattr(settings, "LOAD_SHEDDING", {})}
+        self.max_in_flight = conf["MAX_IN_FLIGHT"]
+        self.max_pending_writes = conf["MAX_PENDING_WRITES"]
+        self.retry_after = conf["RETRY_AFTER"]
+
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.writes_in_flight = 0
+
+    def _admit(self, is_write):
+        with self.lock:
+            if self.in_flight >= self.max_in_flight:
+                return False
+            if is_write and self.writes_in_flight >= self.max_pending_writes:
+                return False
+            self.in_flight += 1
+            if is_write:
+                self.writes_in_flight += 1
+            return True
+
+    def _release(self, is_write):
+        with self.lock:
+            self.in_flight -= 1
+            if is_write:
+                self.writes_in_flight -= 1
+
+    def _overloaded(self):
+        response = JsonResponse(
+            {"error": "Server is overloaded, please retry later"}, status=503
+        )
+        response["Retry-After"] = str(self.retry_after)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        is_write = request.method not in SAFE_METHODS
+        if not self._admit(is_write):
+            return self._overloaded()
+        try:
+            return self.get_response(request)
+        finally:
+            self._release(is_write)
+
+    async def __acall__(self, request):
+        is_write = request.method not in SAFE_METHODS
+        if not self._admit(is_write):
+            return self._overloaded()
+        try:
+            return await self.get_response(request)
+        finally:
+            self._release(is_write)
+
+
+class IdentityMapMiddleware:
+    """Give each request its own identity map (see api/identity.py)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = identity.activate()
+        try:
+            return self.get_response(request)
+        finally:
+            identity.deactivate(token)
+
+    async def __acall__(self, request):
+        token = identity.activate()
+        try:
+            return await self.get_response(request)
+        finally:
+            identity.deactivate(token)
+
+
+class TrafficCaptureMiddleware:
+    """
+    Record a sample of API requests for replay_traffic (see api/traffic.py).
+    Off unless TRAFFIC_CAPTURE["ENABLED"]; requests that are not sampled
+    pass straight through.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not traffic.get_capture_setting("ENABLED"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        self.sample_rate = traffic.get_capture_setting("SAMPLE_RATE")
+
+    def _start(self, request):
+        if random.random() >= self.sample_rate:
+            return None
+        return {
+            "t": round(time.time(), 3),
+            "m": request.method,
+            "p": request.path,
+            "q": traffic.query_string(request),
+            "b": traffic.request_body(request),
+            "s": traffic.auth_subject(request),
+        }
+
+    def _finish(self, request, entry, response, started):
+        match = getattr(request, "resolver_match", None)
+        if match is None or not match.route.startswith("api/"):
+            return
+        entry["r"] = match.route
+        entry["st"] = response.status_code
+        entry["ms"] = round((time.perf_counter() - started) * 1000, 2)
+        traffic.record(entry)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        entry = self._start(request)
+        if entry is None:
+            return self.get_response(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._finish(request, entry, response, started)
+        return response
+
+    async def __acall__(self, request):
+        entry = self._start(request)
+        if entry is None:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._finish(request, entry, response, started)
+        return response
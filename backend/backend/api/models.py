@@ -1,4 +1,10 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .compression import CompressedTextField
+from .sharding import ShardedModel
 
 # ----------------- UserDetail -----------------
 class UserDetail(models.Model):
@@ -6,7 +12,29 @@ class UserDetail(models.Model):
     user_email = models.EmailField(unique=True)
     user_password = models.CharField(max_length=255)
     is_user_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
     reputation = models.IntegerField(default=0)
+    date_joined = models.DateTimeField(default=timezone.now)
+
+    # Denormalized activity counters (see api/activity.py)
+    question_count = models.PositiveIntegerField(default=0)
+    answer_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    upvotes_received = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Exact lookups when resolving @mentions
+            models.Index(fields=["username"], name="userdetail_username_idx"),
+            # Case-insensitive prefix search (see api/utils.py prefix_q)
+            models.Index(Lower("username"), name="userdetail_username_lower_idx"),
+            models.Index(Lower("user_email"), name="userdetail_email_lower_idx"),
+            # Ranking and keyset pagination of search results
+            models.Index(
+                fields=["is_user_deleted", "-reputation", "id"],
+                name="userdetail_reputation_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.username
@@ -52,58 +80,407 @@ class Admin(models.Model):
         return self.admin_email
 
 # ----------------- Question -----------------
-class Question(models.Model):
-    user = models.ForeignKey(UserDetail, on_delete=models.CASCADE)
+class Question(ShardedModel):
+    user = models.ForeignKey(UserDetail, on_delete=models.CASCADE, db_constraint=False)
     question_title = models.CharField(max_length=255)
     question_description = models.TextField()
     question_tag = models.CharField(max_length=255)
     question_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized activity counters and ranking keys (see api/ranking.py)
+    upvote_count = models.PositiveIntegerField(default=0)
+    answer_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    hot_score = models.FloatField(default=0)
+    last_activity = models.DateTimeField(default=timezone.now)
+    # Written behind in batches (see api/view_counts.py)
+    view_count = models.PositiveIntegerField(default=0)
+    # Number of QuestionFollow rows (see api/follows.py)
+    follower_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["question_deleted", "-hot_score", "-id"],
+                name="question_hot_idx",
+            ),
+            models.Index(
+                fields=["question_deleted", "-last_activity", "-id"],
+                name="question_active_idx",
+            ),
+            models.Index(
+                fields=["question_deleted", "-view_count", "-id"],
+                name="question_views_idx",
+            ),
+            # A user's recent questions (see api/activity.py)
+            models.Index(fields=["user", "-id"], name="question_user_recent_idx"),
+        ]
+
     def __str__(self):
         return self.question_title
 
 # ----------------- Answer -----------------
-class Answer(models.Model):
-    user = models.ForeignKey(UserDetail, on_delete=models.CASCADE)
+class Answer(ShardedModel):
+    user = models.ForeignKey(UserDetail, on_delete=models.CASCADE, db_constraint=False)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
-    answer_description = models.TextField()
+    answer_description = CompressedTextField()
     answer_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized upvote count, the sort key of `answers_sort=votes`
+    vote_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["question", "-vote_count", "id"],
+                name="answer_votes_idx",
+            ),
+            models.Index(fields=["user", "-id"], name="answer_user_recent_idx"),
+        ]
+
     def __str__(self):
         return f"Answer by {self.user.username} on Q{self.question.id}"
 
+# ----------------- Similarity index -----------------
+class QuestionSignature(ShardedModel):
+    """Packed MinHash signatures of a question (see api/similarity.py)."""
+
+    question = models.OneToOneField(
+        Question, primary_key=True, related_name="signature", on_delete=models.CASCADE
+    )
+    title_minhash = models.BinaryField()
+    text_minhash = models.BinaryField()
+
+
+class QuestionBucket(ShardedModel):
+    """One LSH band bucket a question falls into."""
+
+    key = models.BigIntegerField()
+    question = models.ForeignKey(
+        Question, related_name="lsh_buckets", on_delete=models.CASCADE
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["key", "question"], name="question_bucket_key_idx"),
+        ]
+
 # ----------------- Upvote -----------------
-class Upvote(models.Model):
+class Upvote(ShardedModel):
     question = models.ForeignKey(Question, null=True, blank=True, on_delete=models.CASCADE)
     answer = models.ForeignKey(Answer, null=True, blank=True, on_delete=models.CASCADE)
     upvote_count = models.PositiveIntegerField(default=1)
-    by_user = models.ForeignKey(UserDetail, on_delete=models.CASCADE)
+    by_user = models.ForeignKey(UserDetail, on_delete=models.CASCADE, db_constraint=False)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Upvote by {self.by_user.username}"
 
 # ----------------- Notification -----------------
-class Notification(models.Model):
-    user = models.ForeignKey(UserDetail, related_name='notifications', on_delete=models.CASCADE)
+class Notification(ShardedModel):
+    user = models.ForeignKey(
+        UserDetail, related_name='notifications', on_delete=models.CASCADE, db_constraint=False
+    )
     question = models.ForeignKey(Question, null=True, blank=True, on_delete=models.CASCADE)
     answer = models.ForeignKey(Answer, null=True, blank=True, on_delete=models.CASCADE)
-    mention_by = models.ForeignKey(UserDetail, related_name='mentions', on_delete=models.CASCADE)
+    mention_by = models.ForeignKey(
+        UserDetail, related_name='mentions', on_delete=models.CASCADE, db_constraint=False
+    )
     is_read = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Notifications collapsed into this one by compaction (see
+    # api/notifications.py); mention_by is then the latest actor
+    event_count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-id"], name="notification_feed_idx"),
+            models.Index(
+                fields=["user", "question", "is_read", "timestamp"],
+                name="notification_digest_idx",
+            ),
+            models.Index(fields=["is_read", "timestamp"], name="notification_read_age_idx"),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.username}"
 
+# ----------------- QuestionFollow -----------------
+class QuestionFollow(ShardedModel):
+    """A user following a question's new answers (see api/follows.py)."""
+
+    user = models.ForeignKey(
+        UserDetail, related_name='follows', on_delete=models.CASCADE, db_constraint=False
+    )
+    question = models.ForeignKey(Question, related_name='follows', on_delete=models.CASCADE)
+    # Last FollowEvent turned into notifications for this follower
+    synced_event_id = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["question", "user"], name="question_follow_unique"
+            )
+        ]
+        indexes = [models.Index(fields=["user", "-id"], name="question_follow_user_idx")]
+
+    def __str__(self):
+        return f"{self.user.username} follows {self.question_id}"
+
+# ----------------- FollowEvent -----------------
+class FollowEvent(ShardedModel):
+    """
+    An answer on a question with too many followers to notify each of them
+    when it is posted; followers get their notification when they next read
+    their feed (see api/follows.py).
+    """
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
+    actor = models.ForeignKey(UserDetail, on_delete=models.CASCADE, db_constraint=False)
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Answer {self.answer_id} on {self.question_id}"
+
+# ----------------- Tag follows and feeds -----------------
+class TagFollow(models.Model):
+    """A user following a question tag for their home feed (see api/feed.py)."""
+
+    user = models.ForeignKey(UserDetail, related_name='tag_follows', on_delete=models.CASCADE)
+    tag = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tag", "user"], name="tag_follow_unique")
+        ]
+        indexes = [models.Index(fields=["user", "tag"], name="tag_follow_user_idx")]
+
+    def __str__(self):
+        return f"{self.user.username} follows {self.tag}"
+
+class FollowedTag(models.Model):
+    """How a tag's questions reach feeds: fanned out on write or merged on read."""
+
+    tag = models.CharField(max_length=255, unique=True)
+    merge_on_read = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.tag} ({'merged on read' if self.merge_on_read else 'fanned out'})"
+
+class FeedEntry(ShardedModel):
+    """A question fanned out to a follower's home feed."""
+
+    user = models.ForeignKey(UserDetail, on_delete=models.CASCADE, db_constraint=False)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "question"], name="feed_entry_unique"
+            )
+        ]
+
+class TagFeedEntry(ShardedModel):
+    """A question under a tag, read by the feeds of the tag's followers."""
+
+    tag = models.CharField(max_length=255)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["tag", "question"], name="tag_feed_entry_unique")
+        ]
+
 # ----------------- Comment -----------------
-class Comment(models.Model):
+class Comment(ShardedModel):
     answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
-    user = models.ForeignKey(UserDetail, on_delete=models.CASCADE)
-    comment_content = models.TextField()
+    user = models.ForeignKey(UserDetail, on_delete=models.CASCADE, db_constraint=False)
+    comment_content = CompressedTextField()
     comment_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.user.username}: {self.comment_content[:30]}"
+
+# ----------------- Revision -----------------
+class Revision(ShardedModel):
+    """
+    An earlier version of an edited question, answer or comment, stored as a
+    diff against the version that replaced it or, every
+    REVISIONS["SNAPSHOT_INTERVAL"] revisions, in full (see api/revisions.py).
+    """
+
+    RECORD_TYPES = [
+        ("question", "Question"),
+        ("answer", "Answer"),
+        ("comment", "Comment"),
+    ]
+
+    record_type = models.CharField(max_length=20, choices=RECORD_TYPES)
+    object_id = models.BigIntegerField()
+    # Version number: 1 is the original, the live row is the latest number + 1
+    number = models.PositiveIntegerField()
+    is_snapshot = models.BooleanField(default=False)
+    # {field: text} for snapshots, else {field: diff} for the fields the edit changed
+    content = models.JSONField()
+    size = models.PositiveIntegerField(default=0)
+    # Who made the edit that replaced this version
+    edited_by = models.ForeignKey(
+        UserDetail, null=True, blank=True, on_delete=models.SET_NULL, db_constraint=False
+    )
+    edited_by_admin = models.ForeignKey(
+        Admin, null=True, blank=True, on_delete=models.SET_NULL, db_constraint=False
+    )
+    edited_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["record_type", "object_id", "number"],
+                name="revision_unique_number",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.record_type} {self.object_id} v{self.number}"
+
+# ----------------- Sharding -----------------
+class ShardSequence(ShardedModel):
+    """Next id value of a sharded model on one shard (see api/sharding.py)."""
+
+    name = models.CharField(max_length=100, primary_key=True)
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+class QuestionPlacement(models.Model):
+    """
+    The shard of a question that is not on the shard its id was created on
+    (moved by rebalance_shards, or created before sharding).
+    """
+
+    question_id = models.BigIntegerField(primary_key=True)
+    shard = models.CharField(max_length=100)
+    placed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Question {self.question_id} on {self.shard}"
+
+# ----------------- ArchivedRecord -----------------
+class ArchivedRecord(models.Model):
+    """
+    A soft-deleted user, question, answer or comment moved out of the hot
+    tables, together with its dependent rows (see api/archive.py). Stored in
+    the ARCHIVE["DATABASE"] database.
+    """
+
+    RECORD_TYPES = [
+        ("user", "User"),
+        ("question", "Question"),
+        ("answer", "Answer"),
+        ("comment", "Comment"),
+    ]
+
+    record_type = models.CharField(max_length=20, choices=RECORD_TYPES)
+    original_id = models.BigIntegerField()
+    summary = models.CharField(max_length=255, blank=True)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["record_type", "original_id"],
+                name="archived_record_unique_original",
+            )
+        ]
+
+    def __str__(self):
+        return f"Archived {self.record_type} {self.original_id}"
+
+# ----------------- ImportJob -----------------
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    source = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="running")
+    # Input rows committed so far; an interrupted import resumes after them
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    # Recorded while running; see importer.expire_stale_imports
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Import {self.source} ({self.status})"
+
+# ----------------- Analytics -----------------
+class ActivityRollup(models.Model):
+    """
+    Number of rows of one metric created in one day or week, overall
+    (tag "") or for one question tag. Maintained by api/analytics.py.
+    """
+
+    PERIOD_CHOICES = [("day", "Day"), ("week", "Week")]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    metric = models.CharField(max_length=20)
+    tag = models.CharField(max_length=255, blank=True, default="")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "metric", "tag", "period_start"],
+                name="activity_rollup_unique_bucket",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.metric} {self.period} {self.period_start} {self.tag}: {self.count}"
+
+
+class RollupWatermark(models.Model):
+    """Highest source row id of a metric (on a shard) already counted in the rollups."""
+
+    metric = models.CharField(max_length=120, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.metric} up to id {self.last_id}"
+
+# ----------------- ImportedRecord -----------------
+class ImportedRecord(models.Model):
+    """Maps an id from an imported dump to the id of the row created for it."""
+
+    job = models.ForeignKey(ImportJob, on_delete=models.CASCADE)
+    record_type = models.CharField(max_length=20)
+    external_id = models.CharField(max_length=100)
+    local_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["job", "record_type", "external_id"],
+                name="imported_record_unique_external_id",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.record_type} {self.external_id} -> {self.local_id}"
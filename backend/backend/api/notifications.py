@@ -0,0 +1,189 @@
+"""
+Notification compaction.
+
+Every answer, comment and mention creates its own Notification row.
+compact_notifications() collapses bursts of them - notifications for the
+same user and question, with the same read state, each within
+NOTIFICATIONS["DIGEST_WINDOW_HOURS"] of the previous one - into their newest
+row, which keeps the latest actor, answer and timestamp and counts the
+collapsed events in event_count. Bursts are re-read inside the transaction
+that writes them, and skipped if they changed since (e.g. a notification was
+marked read), so no read state is lost. purge_read_notifications() deletes read
+notifications older than NOTIFICATIONS["READ_RETENTION_DAYS"]. Both work in
+batches of NOTIFICATIONS["BATCH_SIZE"] on the current shard and can be re-run
+at any time.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import sharding
+from .models import Notification, UserDetail
+
+DEFAULTS = {
+    "DIGEST_WINDOW_HOURS": 24,
+    "READ_RETENTION_DAYS": 90,
+    "BATCH_SIZE": 1000,
+}
+
+
+def get_notification_setting(name):
+    return getattr(settings, "NOTIFICATIONS", {}).get(name, DEFAULTS[name])
+
+
+def _bursts(rows, window):
+    """Split (user, question, is_read, timestamp)-ordered rows into bursts."""
+    burst = []
+    for row in rows:
+        if burst and (
+            (row["user_id"], row["question_id"], row["is_read"])
+            != (burst[-1]["user_id"], burst[-1]["question_id"], burst[-1]["is_read"])
+            or row["timestamp"] - burst[-1]["timestamp"] > window
+        ):
+            yield burst
+            burst = []
+        burst.append(row)
+    if burst:
+        yield burst
+
+
+def _keyset_rows(queryset, batch_size):
+    """Yield the rows of a (timestamp, id)-ordered queryset, batch_size per query."""
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(
+                Q(timestamp__gt=last["timestamp"])
+                | Q(timestamp=last["timestamp"], id__gt=last["id"])
+            )
+        page = list(page[:batch_size])
+        if not page:
+            return
+        yield from page
+        last = page[-1]
+
+
+def _write_digests(bursts):
+    """
+    Fold each burst into its newest row. The rows are re-selected (locked
+    where the database supports it) in the same transaction, and bursts with
+    a row deleted, marked read or folded into since they were read are left
+    for the next run.
+
+    :return: number of rows removed
+    """
+    fields = ("id", "is_read", "event_count")
+    ids = [row["id"] for burst in bursts for row in burst]
+    with sharding.atomic():
+        current = {
+            row["id"]: row
+            for row in Notification.objects.select_for_update()
+            .filter(id__in=ids)
+            .values(*fields)
+        }
+        digests, collapsed = [], []
+        for burst in bursts:
+            if any(
+                current.get(row["id"]) != {field: row[field] for field in fields}
+                for row in burst
+            ):
+                continue
+            digests.append(
+                Notification(id=burst[-1]["id"], event_count=sum(r["event_count"] for r in burst))
+            )
+            collapsed.extend(row["id"] for row in burst[:-1])
+        Notification.objects.bulk_update(digests, ["event_count"])
+        Notification.objects.filter(id__in=collapsed).delete()
+    return len(collapsed)
+
+
+def _compact_users(user_ids, window, batch_size):
+    """
+    Compact the notifications of a batch of users; returns rows removed.
+    Rows are read one (user, question, read state) group at a time, a page
+    at a time, and written back every batch_size collapsed rows.
+    """
+    groups = (
+        Notification.objects.filter(user_id__in=user_ids, question__isnull=False)
+        .values("user_id", "question_id", "is_read")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .order_by("user_id", "question_id", "is_read")
+    )
+
+    removed = 0
+    bursts = []
+    pending = 0
+    for group in list(groups):
+        rows = (
+            Notification.objects.filter(
+                user_id=group["user_id"],
+                question_id=group["question_id"],
+                is_read=group["is_read"],
+            )
+            .order_by("timestamp", "id")
+            .values("id", "user_id", "question_id", "is_read", "timestamp", "event_count")
+        )
+        for burst in _bursts(_keyset_rows(rows, batch_size), window):
+            if len(burst) < 2:
+                continue
+            bursts.append(burst)
+            pending += len(burst) - 1
+            if pending >= batch_size:
+                removed += _write_digests(bursts)
+                bursts, pending = [], 0
+
+    if bursts:
+        removed += _write_digests(bursts)
+    return removed
+
+
+def compact_notifications(window_hours=None, batch_size=None):
+    """
+    Collapse bursts of notifications into digests.
+
+    :return: number of notification rows removed
+    """
+    window = datetime.timedelta(
+        hours=window_hours or get_notification_setting("DIGEST_WINDOW_HOURS")
+    )
+    batch_size = batch_size or get_notification_setting("BATCH_SIZE")
+
+    removed = 0
+    last_id = 0
+    while True:
+        user_ids = list(
+            UserDetail.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not user_ids:
+            return removed
+        removed += _compact_users(user_ids, window, batch_size)
+        last_id = user_ids[-1]
+
+
+def purge_read_notifications(retention_days=None, batch_size=None):
+    """
+    Delete read notifications older than the retention window.
+
+    :return: number of notifications deleted
+    """
+    retention_days = retention_days or get_notification_setting("READ_RETENTION_DAYS")
+    batch_size = batch_size or get_notification_setting("BATCH_SIZE")
+    cutoff = timezone.now() - datetime.timedelta(days=retention_days)
+
+    deleted = 0
+    while True:
+        ids = list(
+            Notification.objects.filter(is_read=True, timestamp__lt=cutoff).values_list(
+                "id", flat=True
+            )[:batch_size]
+        )
+        if not ids:
+            return deleted
+        Notification.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
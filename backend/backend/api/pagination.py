@@ -0,0 +1,165 @@
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Comments embedded per answer; the rest are served by the comments endpoint
+COMMENT_PREVIEW_SIZE = 3
+
+# `answers_sort` value -> answer ordering. "votes" is served by the
+# (question, -vote_count, id) index on Answer.
+ANSWER_SORTS = {
+    "votes": ("-vote_count", "id"),
+    "newest": ("-id",),
+    "oldest": ("id",),
+}
+DEFAULT_ANSWER_SORT = "votes"
+
+
+class AnswerCursorPagination(CursorPagination):
+    """
+    Pages of a question's live answers, ordered by `answers_sort` (votes,
+    newest or oldest; unknown values fall back to the default). Also used for
+    the first page of answers embedded in question_detail, so its query
+    parameters are namespaced.
+
+    Unlike DRF's CursorPagination, which positions on the first ordering
+    field and skips ties with an offset, the cursor holds every ordering
+    value of the row it stops at, e.g. (vote_count, id), and the next page
+    starts strictly after that tuple. Deep pages stay index range scans, and
+    a vote cast between two fetches cannot make answers repeat or be
+    skipped. The ordering fields must be integers.
+    """
+
+    page_size = 20
+    page_size_query_param = "answers_page_size"
+    max_page_size = 100
+    cursor_query_param = "answers_cursor"
+    sort_query_param = "answers_sort"
+    ordering = ANSWER_SORTS[DEFAULT_ANSWER_SORT]
+
+    def get_ordering(self, request, queryset, view):
+        sort = request.query_params.get(self.sort_query_param)
+        return ANSWER_SORTS.get(sort, self.ordering)
+
+    def _after(self, ordering, position):
+        """Rows strictly after position in ordering: a OR of per-field comparisons."""
+        condition, equal = Q(pk__in=[]), {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(f[1:] if f.startswith("-") else f"-{f}" for f in ordering)
+        if self.cursor and self.cursor.position is not None:
+            try:
+                position = [int(value) for value in self.cursor.position.split("_")]
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if len(position) != len(ordering):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(self._after(ordering, position))
+
+        rows = list(queryset.order_by(*ordering)[: self.page_size + 1])
+        has_following = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = bool(self.cursor and self.cursor.position is not None)
+        return self.page
+
+    def _link(self, row, reverse):
+        position = "_".join(str(getattr(row, field.lstrip("-"))) for field in self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=reverse, position=position))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+
+class ReputationKeysetPagination:
+    """
+    Keyset pagination of users by (-reputation, id). The `after` parameter
+    holds "<reputation>_<id>" of the last user of the previous page, so a page
+    deep into the results costs the same as the first one.
+    """
+
+    default_limit = 10
+    max_limit = 50
+    after_query_param = "after"
+    limit_query_param = "limit"
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        try:
+            limit = int(request.query_params.get(self.limit_query_param, self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = min(max(limit, 1), self.max_limit)
+
+        after = request.query_params.get(self.after_query_param)
+        if after:
+            try:
+                reputation, last_id = (int(part) for part in after.rsplit("_", 1))
+            except ValueError:
+                raise NotFound("Invalid cursor")
+            queryset = queryset.filter(
+                Q(reputation__lt=reputation) | Q(reputation=reputation, id__gt=last_id)
+            )
+
+        rows = list(queryset.order_by("-reputation", "id")[: limit + 1])
+        self.last = rows[limit - 1] if len(rows) > limit else None
+        return rows[:limit]
+
+    def get_next_link(self):
+        if self.last is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.after_query_param,
+            f"{self.last.reputation}_{self.last.id}",
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+
+class CommentCursorPagination(CursorPagination):
+    """Pages of an answer's live comments, oldest first."""
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = "id"
+
+
+class NotificationCursorPagination(CursorPagination):
+    """A user's notification feed, newest first."""
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = "-id"
@@ -0,0 +1,209 @@
+"""
+Hot-score ranking for questions and vote counts for answers.
+
+A question's hot score is a time-decayed function of its upvotes, answers and
+comments. The score is stored on the Question row together with the counters
+it is computed from, so `?ordering=hot` and `?ordering=active` are plain index
+scans instead of per-request aggregates. Likewise each answer keeps its
+upvote count, so `answers_sort=votes` reads the answer vote index.
+"""
+import math
+
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Answer, Comment, Question, Upvote
+
+# Weight of each kind of activity in a question's points
+UPVOTE_WEIGHT = 1.0
+ANSWER_WEIGHT = 2.0
+COMMENT_WEIGHT = 0.5
+
+# score = points / (age_hours + AGE_OFFSET_HOURS) ** GRAVITY
+GRAVITY = 1.5
+AGE_OFFSET_HOURS = 2.0
+
+# Scores below this are flattened to 0 by the decay pass and skipped afterwards
+HOT_SCORE_FLOOR = 1e-4
+
+
+def compute_hot_score(upvotes, answers, comments, created, now=None):
+    """
+    Return the hot score for the given activity counts and creation time.
+    """
+    now = now or timezone.now()
+    age_hours = max((now - created).total_seconds(), 0) / 3600
+    points = (
+        1
+        + UPVOTE_WEIGHT * upvotes
+        + ANSWER_WEIGHT * answers
+        + COMMENT_WEIGHT * comments
+    )
+    return points / math.pow(age_hours + AGE_OFFSET_HOURS, GRAVITY)
+
+
+def record_question_activity(question, upvotes=0, answers=0, comments=0, touch=True):
+    """
+    Apply counter deltas to a question, bump its last activity and refresh its
+    hot score. Called with no deltas it just (re)initializes the ranking keys.
+
+    :param question: Question instance
+    :param upvotes: change in question upvotes (+1 / -1)
+    :param answers: change in live answers (+1 / -1)
+    :param comments: change in live comments on its answers (+1 / -1)
+    :param touch: bump last_activity. Only posts and edits are activity;
+        votes and deletes pass False so they don't reorder "active".
+    """
+    now = timezone.now()
+    changes = {}
+    if touch:
+        changes["last_activity"] = now
+    Question.objects.filter(id=question.id).update(
+        upvote_count=Greatest(F("upvote_count") + upvotes, 0),
+        answer_count=Greatest(F("answer_count") + answers, 0),
+        comment_count=Greatest(F("comment_count") + comments, 0),
+        **changes,
+    )
+    question.refresh_from_db(
+        fields=["upvote_count", "answer_count", "comment_count", "last_activity"]
+    )
+
+    question.hot_score = compute_hot_score(
+        question.upvote_count,
+        question.answer_count,
+        question.comment_count,
+        question.timestamp,
+        now=now,
+    )
+    Question.objects.filter(id=question.id).update(hot_score=question.hot_score)
+
+
+def record_answer_vote(answer, vote):
+    """
+    Apply an upvote (+1) or upvote removal (-1) to an answer's vote count.
+    """
+    Answer.objects.filter(id=answer.id).update(
+        vote_count=Greatest(F("vote_count") + vote, 0)
+    )
+    answer.refresh_from_db(fields=["vote_count"])
+
+
+def _iter_batches(queryset, batch_size):
+    """Yield lists of rows from queryset using keyset pagination on id."""
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by("id")[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def decay_hot_scores(batch_size=500):
+    """
+    Recompute hot scores of live questions in batches so that scores decay
+    with age even without new activity. Questions that already sank to the
+    floor are skipped.
+
+    :return: number of questions updated
+    """
+    now = timezone.now()
+    queryset = Question.objects.filter(question_deleted=False, hot_score__gt=0).only(
+        "id", "timestamp", "upvote_count", "answer_count", "comment_count"
+    )
+
+    updated = 0
+    for batch in _iter_batches(queryset, batch_size):
+        for question in batch:
+            score = compute_hot_score(
+                question.upvote_count,
+                question.answer_count,
+                question.comment_count,
+                question.timestamp,
+                now=now,
+            )
+            question.hot_score = score if score >= HOT_SCORE_FLOOR else 0
+        Question.objects.bulk_update(batch, ["hot_score"])
+        updated += len(batch)
+    return updated
+
+
+def rebuild_question_counters(batch_size=500, ids=None):
+    """
+    Recount upvotes, live answers and live comments of every question (or
+    only of the given ids) from the source tables and recompute hot scores.
+    Used to backfill the counters or repair drift caused by bulk soft deletes.
+
+    :return: number of questions updated
+    """
+    now = timezone.now()
+    queryset = Question.objects.only("id", "timestamp")
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+
+    updated = 0
+    for batch in _iter_batches(queryset, batch_size):
+        ids = [question.id for question in batch]
+        upvotes = dict(
+            Upvote.objects.filter(question_id__in=ids)
+            .values_list("question_id")
+            .annotate(n=Count("id"))
+        )
+        answers = dict(
+            Answer.objects.filter(question_id__in=ids, answer_deleted=False)
+            .values_list("question_id")
+            .annotate(n=Count("id"))
+        )
+        comments = dict(
+            Comment.objects.filter(
+                answer__question_id__in=ids,
+                answer__answer_deleted=False,
+                comment_deleted=False,
+            )
+            .values_list("answer__question_id")
+            .annotate(n=Count("id"))
+        )
+
+        for question in batch:
+            question.upvote_count = upvotes.get(question.id, 0)
+            question.answer_count = answers.get(question.id, 0)
+            question.comment_count = comments.get(question.id, 0)
+            score = compute_hot_score(
+                question.upvote_count,
+                question.answer_count,
+                question.comment_count,
+                question.timestamp,
+                now=now,
+            )
+            question.hot_score = score if score >= HOT_SCORE_FLOOR else 0
+        Question.objects.bulk_update(
+            batch, ["upvote_count", "answer_count", "comment_count", "hot_score"]
+        )
+        updated += len(batch)
+    return updated
+
+
+def rebuild_answer_vote_counts(batch_size=500, ids=None):
+    """
+    Recount the upvotes of every answer (or only of the given ids) from the
+    Upvote table.
+
+    :return: number of answers updated
+    """
+    queryset = Answer.objects.only("id", "vote_count")
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+
+    updated = 0
+    for batch in _iter_batches(queryset, batch_size):
+        votes = dict(
+            Upvote.objects.filter(answer_id__in=[answer.id for answer in batch])
+            .values_list("answer_id")
+            .annotate(n=Count("id"))
+        )
+        for answer in batch:
+            answer.vote_count = votes.get(answer.id, 0)
+        Answer.objects.bulk_update(batch, ["vote_count"])
+        updated += len(batch)
+    return updated
@@ -0,0 +1,353 @@
+"""
+"Related questions" recommendations.
+
+Every question is embedded as an L2-normalized TF-IDF vector over hashed
+features of its title, description and tag, so the cosine similarity of two
+questions is a sparse dot product. build_index() computes, with batched sparse
+matrix products, the TOP_K most similar questions of every question and writes
+them - together with the vectors and document frequencies an incremental
+refresh needs - as .npy files into a new version directory under
+RELATED_QUESTIONS["INDEX_DIR"]. The CURRENT file names the live version and
+is replaced atomically, so all web workers memory-map the same files and
+switch to a new version on their next lookup. Serving a request is a binary
+search over the indexed ids plus one row read; the corpus is never scanned.
+
+Incremental refreshes only index questions newer than the last run, using the
+document frequencies of the whole corpus so far; older vectors keep their
+weights (and edits are not picked up) until the next full rebuild.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from . import sharding
+from .models import Question
+
+DEFAULTS = {
+    "INDEX_DIR": None,
+    "N_FEATURES": 2**18,
+    "TOP_K": 10,
+}
+
+# Relative weight of a token depending on the field it appears in
+TITLE_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+TAG_WEIGHT = 3
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Questions whose neighbours are computed per sparse matrix product
+DEFAULT_BATCH_SIZE = 500
+# Index versions kept on disk (the live one and its predecessor, which
+# workers may still have mapped)
+KEEP_VERSIONS = 2
+
+_ARRAYS = ("ids", "indptr", "indices", "data", "df", "neighbors", "scores")
+
+
+def get_related_setting(name):
+    value = getattr(settings, "RELATED_QUESTIONS", {}).get(name, DEFAULTS[name])
+    if name == "INDEX_DIR":
+        value = Path(value or Path(settings.BASE_DIR) / "related_index")
+    return value
+
+
+# ----------------- Vectorizing -----------------
+
+
+def _features(title, description, tag, n_features):
+    """Return {feature: weighted count} for one question."""
+    counts = Counter()
+    for text, prefix, weight in (
+        (title, "", TITLE_WEIGHT),
+        (description, "", DESCRIPTION_WEIGHT),
+        (tag, "tag:", TAG_WEIGHT),
+    ):
+        for token in TOKEN_PATTERN.findall((text or "").lower()):
+            counts[zlib.crc32(f"{prefix}{token}".encode("utf-8")) % n_features] += weight
+    return counts
+
+
+def _count_matrix(rows, n_features):
+    """
+    Build the sparse feature-count matrix of (id, title, description, tag)
+    rows. Returns (ids, matrix).
+    """
+    ids = []
+    indptr = [0]
+    indices = []
+    data = []
+    for question_id, title, description, tag in rows:
+        counts = _features(title, description, tag, n_features)
+        ids.append(question_id)
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (
+            np.asarray(data, dtype=np.float32),
+            np.asarray(indices, dtype=np.int32),
+            np.asarray(indptr, dtype=np.int64),
+        ),
+        shape=(len(ids), n_features),
+    )
+    matrix.sort_indices()
+    return np.asarray(ids, dtype=np.int64), matrix
+
+
+def _tfidf(counts, df, n_docs):
+    """Weight a count matrix by sublinear TF and smoothed IDF, L2-normalized."""
+    matrix = counts.copy()
+    idf = np.log((1 + n_docs) / (1 + df)) + 1
+    matrix.data = ((1 + np.log(matrix.data)) * idf[matrix.indices]).astype(np.float32)
+
+    row_of = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    norms = np.sqrt(
+        np.bincount(row_of, weights=matrix.data**2, minlength=matrix.shape[0])
+    )
+    norms[norms == 0] = 1
+    matrix.data /= norms[row_of].astype(np.float32)
+    return matrix
+
+
+# ----------------- Neighbours -----------------
+
+
+def _top_k(ids, scores, k):
+    """Return the k highest-scoring (ids, scores), best first."""
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k)[:k]
+        ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))
+    return ids[order], scores[order]
+
+
+def _set_row(neighbors, scores, row, row_ids, row_scores):
+    neighbors[row] = -1
+    scores[row] = 0
+    neighbors[row, : len(row_ids)] = row_ids
+    scores[row, : len(row_scores)] = row_scores
+
+
+def _update_neighbors(matrix, ids, first_new, neighbors, scores, batch_size):
+    """
+    Compute the neighbours of rows first_new.. against every row, and merge
+    those rows into the neighbours of the older rows.
+    """
+    k = neighbors.shape[1]
+    transposed = matrix.T.tocsr()
+
+    for start in range(first_new, len(ids), batch_size):
+        end = min(start + batch_size, len(ids))
+        similarities = (matrix[start:end] @ transposed).tocsr()
+
+        for offset in range(end - start):
+            row = start + offset
+            begin, stop = similarities.indptr[offset], similarities.indptr[offset + 1]
+            columns = similarities.indices[begin:stop]
+            values = similarities.data[begin:stop]
+            keep = (columns != row) & (values > 0)
+            _set_row(neighbors, scores, row, *_top_k(ids[columns[keep]], values[keep], k))
+
+        # The new rows are also candidates for the older rows
+        if first_new:
+            older = similarities[:, :first_new].T.tocsr()
+            for row in np.flatnonzero(np.diff(older.indptr)):
+                begin, stop = older.indptr[row], older.indptr[row + 1]
+                current = neighbors[row] >= 0
+                _set_row(
+                    neighbors,
+                    scores,
+                    row,
+                    *_top_k(
+                        np.concatenate(
+                            [neighbors[row][current], ids[start:end][older.indices[begin:stop]]]
+                        ),
+                        np.concatenate([scores[row][current], older.data[begin:stop]]),
+                        k,
+                    ),
+                )
+
+
+# ----------------- Versioned storage -----------------
+
+
+def _current_version(index_dir):
+    try:
+        return (index_dir / "CURRENT").read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _load_state(index_dir, version, n_features):
+    """Load the arrays of a stored version, or None if it cannot be extended."""
+    path = index_dir / version
+    meta = json.loads((path / "meta.json").read_text())
+    if meta["n_features"] != n_features:
+        return None
+    arrays = {name: np.load(path / f"{name}.npy") for name in _ARRAYS}
+    return meta, arrays
+
+
+def _write_version(index_dir, meta, arrays):
+    version = f"v{time.time_ns()}"
+    staging = index_dir / f"{version}.tmp"
+    staging.mkdir(parents=True)
+    for name in _ARRAYS:
+        np.save(staging / f"{name}.npy", arrays[name])
+    (staging / "meta.json").write_text(json.dumps(meta))
+    staging.rename(index_dir / version)
+
+    pointer = index_dir / "CURRENT.tmp"
+    pointer.write_text(version)
+    os.replace(pointer, index_dir / "CURRENT")
+
+    versions = sorted(p for p in index_dir.iterdir() if p.is_dir() and p.name.startswith("v"))
+    for stale in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(stale, ignore_errors=True)
+    return version
+
+
+def build_index(full=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Refresh the related-questions index with questions created since the
+    last run (or rebuild it from scratch with full=True).
+
+    :return: dict with the number of questions indexed, the index size and
+        the new version (None when there was nothing to do)
+    """
+    index_dir = get_related_setting("INDEX_DIR")
+    n_features = get_related_setting("N_FEATURES")
+    k = get_related_setting("TOP_K")
+
+    version = None if full else _current_version(index_dir)
+    state = _load_state(index_dir, version, n_features) if version else None
+    if state is not None and state[1]["neighbors"].shape[1] != k:
+        state = None
+
+    if state is None:
+        meta = {"n_features": n_features, "n_docs": 0, "last_id": 0}
+        old_ids = np.zeros(0, dtype=np.int64)
+        old_matrix = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        df = np.zeros(n_features, dtype=np.float64)
+        old_neighbors = np.zeros((0, k), dtype=np.int64)
+        old_scores = np.zeros((0, k), dtype=np.float32)
+    else:
+        meta, arrays = state
+        old_ids = arrays["ids"]
+        old_matrix = sparse.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=(len(old_ids), n_features),
+        )
+        df = arrays["df"]
+        old_neighbors = arrays["neighbors"]
+        old_scores = arrays["scores"]
+
+    rows = (
+        sharding.scatter(
+            Question.objects.filter(id__gt=meta["last_id"], question_deleted=False).order_by("id")
+        )
+        .values_list("id", "question_title", "question_description", "question_tag")
+        .iterator(chunk_size=2000)
+    )
+    new_ids, counts = _count_matrix(rows, n_features)
+    if not len(new_ids):
+        return {"indexed": 0, "total": len(old_ids), "version": None}
+
+    df = df + np.bincount(counts.indices, minlength=n_features)
+    n_docs = meta["n_docs"] + len(new_ids)
+
+    ids = np.concatenate([old_ids, new_ids])
+    matrix = sparse.vstack([old_matrix, _tfidf(counts, df, n_docs)], format="csr")
+    neighbors = np.vstack([old_neighbors, np.full((len(new_ids), k), -1, dtype=np.int64)])
+    scores = np.vstack([old_scores, np.zeros((len(new_ids), k), dtype=np.float32)])
+    _update_neighbors(matrix, ids, len(old_ids), neighbors, scores, batch_size)
+
+    meta = {"n_features": n_features, "n_docs": n_docs, "last_id": int(ids[-1])}
+    version = _write_version(
+        index_dir,
+        meta,
+        {
+            "ids": ids,
+            "indptr": matrix.indptr.astype(np.int64),
+            "indices": matrix.indices.astype(np.int32),
+            "data": matrix.data.astype(np.float32),
+            "df": df,
+            "neighbors": neighbors,
+            "scores": scores,
+        },
+    )
+    return {"indexed": len(new_ids), "total": len(ids), "version": version}
+
+
+# ----------------- Lookup -----------------
+
+_loaded = {"version": None, "index": None}
+_load_lock = threading.Lock()
+
+
+def _live_index():
+    """Return the memory-mapped arrays of the current version, or None."""
+    index_dir = get_related_setting("INDEX_DIR")
+    version = _current_version(index_dir)
+    if version is None:
+        return None
+    if version != _loaded["version"]:
+        with _load_lock:
+            if version != _loaded["version"]:
+                try:
+                    index = {
+                        name: np.load(index_dir / version / f"{name}.npy", mmap_mode="r")
+                        for name in ("ids", "neighbors", "scores")
+                    }
+                except FileNotFoundError:
+                    # Replaced while loading; keep serving the previous one
+                    return _loaded["index"]
+                _loaded.update(version=version, index=index)
+    return _loaded["index"]
+
+
+def related_questions(question_id, limit=None):
+    """
+    Return live questions related to question_id, most related first, as
+    dicts with id, question_title, question_tag and score. Questions not
+    indexed yet have no related questions.
+    """
+    index = _live_index()
+    if index is None:
+        return []
+    ids = index["ids"]
+    row = int(np.searchsorted(ids, question_id))
+    if row >= len(ids) or ids[row] != question_id:
+        return []
+
+    pairs = [
+        (int(neighbor), float(score))
+        for neighbor, score in zip(index["neighbors"][row], index["scores"][row])
+        if neighbor >= 0
+    ]
+    questions = {
+        question["id"]: question
+        for question in sharding.scatter(
+            Question.objects.filter(
+                id__in=[neighbor for neighbor, _ in pairs], question_deleted=False
+            )
+        ).values("id", "question_title", "question_tag")
+    }
+    results = [
+        {**questions[neighbor], "score": round(score, 3)}
+        for neighbor, score in pairs
+        if neighbor in questions
+    ]
+    return results[:limit] if limit else results
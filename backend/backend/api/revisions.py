@@ -0,0 +1,218 @@
+"""
+Revision history of edited questions, answers and comments.
+
+The live row is always the latest version. Each edit stores the version it
+replaced as a Revision: normally a diff that turns the new text back into
+the old one, holding only the changed fields and the changed spans of text,
+so history grows with the size of the edits rather than the size of the
+content. Every REVISIONS["SNAPSHOT_INTERVAL"]-th revision stores its version
+in full instead, so rebuilding any version reads the live row or the next
+snapshot above it and applies at most SNAPSHOT_INTERVAL - 1 diffs.
+
+A diff is a list of operations applied to the newer text: a positive int
+copies that many characters, a negative int skips that many, a string is
+inserted.
+
+Revisions are kept when their record is archived, so a restored record
+keeps its history.
+"""
+import difflib
+import json
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import Max
+
+from . import sharding
+from .models import Admin, Answer, Comment, Question, Revision
+
+DEFAULTS = {
+    "SNAPSHOT_INTERVAL": 10,
+}
+
+# record type -> (model, versioned fields)
+TRACKED = {
+    "question": (Question, ("question_title", "question_description", "question_tag")),
+    "answer": (Answer, ("answer_description",)),
+    "comment": (Comment, ("comment_content",)),
+}
+
+_TOKEN = re.compile(r"\w+|\s+|[^\w\s]")
+
+
+def get_revision_setting(name):
+    return getattr(settings, "REVISIONS", {}).get(name, DEFAULTS[name])
+
+
+def record_type_of(instance):
+    for record_type, (model, _) in TRACKED.items():
+        if isinstance(instance, model):
+            return record_type
+    raise TypeError(f"{type(instance).__name__} has no revision history")
+
+
+def content_of(instance):
+    _, fields = TRACKED[record_type_of(instance)]
+    return {field: getattr(instance, field) for field in fields}
+
+
+# ----------------- Diffs -----------------
+
+
+def diff(new, old):
+    """Return the operations that turn new into old (word-level matching)."""
+    new_tokens, old_tokens = _TOKEN.findall(new), _TOKEN.findall(old)
+    ops = []
+
+    def emit(op):
+        if ops and type(op) is type(ops[-1]) and (isinstance(op, str) or (op > 0) == (ops[-1] > 0)):
+            ops[-1] += op
+        else:
+            ops.append(op)
+
+    matcher = difflib.SequenceMatcher(None, new_tokens, old_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        length = sum(len(token) for token in new_tokens[i1:i2])
+        if tag == "equal":
+            emit(length)
+            continue
+        if length:
+            emit(-length)
+        if j2 > j1:
+            emit("".join(old_tokens[j1:j2]))
+    return ops
+
+
+def patch(new, ops):
+    """Apply diff() operations to new."""
+    parts, position = [], 0
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.append(new[position : position + op])
+            position += op
+        else:
+            position -= op
+    return "".join(parts)
+
+
+# ----------------- Recording -----------------
+
+
+def _editor_fields(editor):
+    if isinstance(editor, Admin):
+        return {"edited_by_admin": editor}
+    return {"edited_by": editor}
+
+
+def record_edit(instance, before, editor):
+    """
+    Store the version `before` ({field: value}) that an edit of instance just
+    replaced. Does nothing if the edit changed none of the versioned fields.
+
+    :return: the new Revision, or None
+    """
+    record_type = record_type_of(instance)
+    after = content_of(instance)
+    changed = [field for field, value in before.items() if after[field] != value]
+    if not changed:
+        return None
+
+    latest = Revision.objects.filter(
+        record_type=record_type, object_id=instance.id
+    ).aggregate(latest=Max("number"))["latest"]
+    number = (latest or 0) + 1
+    is_snapshot = number % get_revision_setting("SNAPSHOT_INTERVAL") == 0
+    if is_snapshot:
+        content = dict(before)
+    else:
+        content = {field: diff(after[field] or "", before[field] or "") for field in changed}
+    return Revision.objects.create(
+        record_type=record_type,
+        object_id=instance.id,
+        number=number,
+        is_snapshot=is_snapshot,
+        content=content,
+        size=len(json.dumps(content, separators=(",", ":"))),
+        **_editor_fields(editor),
+    )
+
+
+@contextmanager
+def tracking(instance, editor):
+    """
+    Record the version an edit replaces:
+
+        with revisions.tracking(question, request.user):
+            serializer.save()
+    """
+    before = content_of(instance)
+    with sharding.atomic():
+        yield
+        record_edit(instance, before, editor)
+
+
+# ----------------- Reading -----------------
+
+
+def latest_number(record_type, object_id):
+    """The live version's number (1 if the record was never edited)."""
+    latest = Revision.objects.filter(record_type=record_type, object_id=object_id).aggregate(
+        latest=Max("number")
+    )["latest"]
+    return (latest or 0) + 1
+
+
+def version(instance, number):
+    """
+    Rebuild version `number` of instance ({field: value}).
+
+    :raises Revision.DoesNotExist: no such version
+    """
+    record_type = record_type_of(instance)
+    revisions = Revision.objects.filter(record_type=record_type, object_id=instance.id)
+    current = latest_number(record_type, instance.id)
+    if number == current:
+        return content_of(instance)
+    if not 1 <= number < current:
+        raise Revision.DoesNotExist(f"{record_type} {instance.id} has no version {number}")
+
+    snapshot = (
+        revisions.filter(number__gte=number, is_snapshot=True).order_by("number").first()
+    )
+    if snapshot is not None:
+        content, top = dict(snapshot.content), snapshot.number
+    else:
+        content, top = content_of(instance), current
+    for revision in revisions.filter(number__gte=number, number__lt=top).order_by("-number"):
+        for field, ops in revision.content.items():
+            content[field] = patch(content[field] or "", ops)
+    return content
+
+
+def history(record_type, object_id):
+    """Earlier versions of a record, newest first (without their content)."""
+    return (
+        Revision.objects.filter(record_type=record_type, object_id=object_id)
+        .select_related("edited_by", "edited_by_admin")
+        .order_by("-number")
+    )
+
+
+def revert(instance, number, editor):
+    """
+    Make version `number` the live version again. The revert is an edit like
+    any other, so the version it replaces stays in the history.
+
+    :raises Revision.DoesNotExist: no such version
+    :return: the new Revision, or None if the live version already matched
+    """
+    content = version(instance, number)
+    before = content_of(instance)
+    with sharding.atomic():
+        for field, value in content.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(content))
+        return record_edit(instance, before, editor)
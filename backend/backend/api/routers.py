@@ -0,0 +1,72 @@
+from django.apps import apps
+from django.conf import settings
+
+from . import sharding
+
+
+def archive_database():
+    return getattr(settings, "ARCHIVE", {}).get("DATABASE", "default")
+
+
+class ArchiveRouter:
+    """Keep ArchivedRecord in the ARCHIVE["DATABASE"] database."""
+
+    def _is_archive(self, model):
+        return model._meta.app_label == "api" and model._meta.model_name == "archivedrecord"
+
+    def db_for_read(self, model, **hints):
+        if self._is_archive(model):
+            return archive_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if self._is_archive(model):
+            return archive_database()
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if archive_database() == "default":
+            return None
+        if app_label == "api" and model_name == "archivedrecord":
+            return db == archive_database()
+        if db == archive_database():
+            return False
+        return None
+
+
+class ShardRouter:
+    """
+    Route sharded models (see api/sharding.py) to the shard of the instance
+    they are reached from, else the current shard, and every other api model
+    to SHARDING["GLOBAL_DATABASE"]. Does nothing while sharding is off.
+    """
+
+    def _db_for(self, model, hints):
+        if not sharding.enabled() or model._meta.app_label != "api":
+            return None
+        if not sharding.is_sharded(model):
+            return sharding.global_database()
+        instance = hints.get("instance")
+        if instance is not None and sharding.is_sharded(type(instance)) and instance._state.db:
+            return instance._state.db
+        return sharding.current_shard()
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding.enabled() and obj1._meta.app_label == obj2._meta.app_label == "api":
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not sharding.enabled() or app_label != "api" or model_name is None:
+            return None
+        model = apps.get_model(app_label, model_name)
+        # The global database has every table, so deleting a user can cascade there
+        if db == sharding.global_database():
+            return True
+        return db in sharding.shards() and sharding.is_sharded(model)
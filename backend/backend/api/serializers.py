@@ -1,7 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.db.models import Count, Manager, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.password_validation import validate_password
 from .models import *
+from . import sharding
+from .identity import prime
+from .hashing import check_password, make_password
+from .pagination import (
+    ANSWER_SORTS,
+    COMMENT_PREVIEW_SIZE,
+    DEFAULT_ANSWER_SORT,
+    AnswerCursorPagination,
+)
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -20,8 +31,6 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data.pop("password2")
         # Hash the password before saving
-        from django.contrib.auth.hashers import make_password
-
         validated_data["user_password"] = make_password(validated_data["password"])
         validated_data.pop("password")
 
@@ -49,8 +58,6 @@ class AdminRegistrationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data.pop("password2")
         # Hash the password before saving
-        from django.contrib.auth.hashers import make_password
-
         validated_data["admin_password"] = make_password(validated_data["password"])
         validated_data.pop("password")
 
@@ -79,10 +86,12 @@ class UserLoginSerializer(serializers.Serializer):
                 if user.is_user_deleted:
                     raise serializers.ValidationError("Account has been deleted")
 
-                # Check password
-                from django.contrib.auth.hashers import check_password
+                # Check password, upgrading the stored hash if it is outdated
+                def rehash(raw_password):
+                    user.user_password = make_password(raw_password)
+                    user.save(update_fields=["user_password"])
 
-                if check_password(password, user.user_password):
+                if check_password(password, user.user_password, setter=rehash):
                     attrs["user"] = user
                     return attrs
                 else:
@@ -110,10 +119,12 @@ class AdminLoginSerializer(serializers.Serializer):
                 if admin.is_admin_deleted:
                     raise serializers.ValidationError("Account has been deleted")
 
-                # Check password
-                from django.contrib.auth.hashers import check_password
+                # Check password, upgrading the stored hash if it is outdated
+                def rehash(raw_password):
+                    admin.admin_password = make_password(raw_password)
+                    admin.save(update_fields=["admin_password"])
 
-                if check_password(password, admin.admin_password):
+                if check_password(password, admin.admin_password, setter=rehash):
                     attrs["admin"] = admin
                     return attrs
                 else:
@@ -124,7 +135,33 @@ class AdminLoginSerializer(serializers.Serializer):
             raise serializers.ValidationError("Must include email and password")
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class EditedFieldsMixin:
+    """
+    Save only the edited columns on update, so counters written meanwhile
+    (views, votes, answers, reputation) are not overwritten with stale values.
+    """
+
+    def update(self, instance, validated_data):
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class PrimedListSerializer(serializers.ListSerializer):
+    """
+    Loads the foreign keys named in the child's Meta.prime_related for the
+    whole list at once (through the request's identity map) instead of one
+    query per row; keys already loaded with select_related cost nothing.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, Manager) else data)
+        prime(items, *self.child.Meta.prime_related)
+        return super().to_representation(items)
+
+
+class UserProfileSerializer(EditedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = UserDetail
         fields = ["id", "username", "user_email"]
@@ -153,14 +190,70 @@ class QuestionListSerializer(serializers.ModelSerializer):
             "user",
             "upvotes",
             "answer_count",
+            "view_count",
             "timestamp",
         ]
+        list_serializer_class = PrimedListSerializer
+        prime_related = ["user"]
 
     def get_upvotes(self, obj):
-        return Upvote.objects.filter(question=obj).count()
+        counts = self.context.get("upvote_counts")
+        if counts is not None:
+            return counts.get(obj.id, 0)
+        return obj.upvote_set.count()
 
     def get_answer_count(self, obj):
-        return Answer.objects.filter(question=obj).count()
+        counts = self.context.get("answer_counts")
+        if counts is not None:
+            return counts.get(obj.id, 0)
+        return obj.answer_set.count()
+
+
+class FeedQuestionSerializer(serializers.ModelSerializer):
+    """Home feed entry, rendered from the denormalized counters only"""
+
+    user = serializers.CharField(source="user.username", read_only=True)
+
+    class Meta:
+        model = Question
+        fields = [
+            "id",
+            "question_title",
+            "question_tag",
+            "user",
+            "upvote_count",
+            "answer_count",
+            "view_count",
+            "timestamp",
+        ]
+
+
+def question_list_count_queries(questions):
+    """
+    Grouped (question_id, count) querysets for the upvote and answer counts
+    of a page of questions: one query each (per shard) instead of two per row.
+    """
+    ids = [question.id for question in questions]
+    return {
+        "upvote_counts": sharding.scatter(
+            Upvote.objects.filter(question_id__in=ids)
+            .values_list("question_id")
+            .annotate(n=Count("id"))
+        ),
+        "answer_counts": sharding.scatter(
+            Answer.objects.filter(question_id__in=ids)
+            .values_list("question_id")
+            .annotate(n=Count("id"))
+        ),
+    }
+
+
+def question_list_counts(questions):
+    """Serializer context for QuestionListSerializer over a page of questions."""
+    return {
+        key: dict(queryset)
+        for key, queryset in question_list_count_queries(questions).items()
+    }
 
 
 class UserMiniSerializer(serializers.ModelSerializer):
@@ -169,25 +262,71 @@ class UserMiniSerializer(serializers.ModelSerializer):
         fields = ["id", "username", "user_email", "reputation"]
 
 
+class SideLoadedUserSerializer(UserMiniSerializer):
+    """
+    UserMiniSerializer that, in compact responses (context["users"] set, see
+    compact_context), renders only the user id and side-loads the user once
+    into context["users"].
+    """
+
+    def to_representation(self, instance):
+        users = self.context.get("users")
+        if users is None:
+            return super().to_representation(instance)
+        if instance.id not in users:
+            users[instance.id] = UserSearchSerializer(instance).data
+        return instance.id
+
+
+def compact_context(request):
+    """
+    Serializer context for ?compact=true: nested users are rendered as ids
+    and listed once in the top-level "users" map (see add_side_loaded_users).
+    """
+    if request.GET.get("compact", "").lower() in ("1", "true"):
+        return {"users": {}}
+    return {}
+
+
+def add_side_loaded_users(data, context):
+    """Add the users collected while serializing a compact response."""
+    if "users" in context:
+        data["users"] = context["users"]
+    return data
+
+
+class UserSearchSerializer(serializers.ModelSerializer):
+    """Public user search results (mention autocomplete), without emails"""
+
+    class Meta:
+        model = UserDetail
+        fields = ["id", "username", "reputation"]
+
+
 class CommentSerializer(serializers.ModelSerializer):
-    user = UserMiniSerializer(read_only=True)
+    user = SideLoadedUserSerializer(read_only=True)
 
     class Meta:
         model = Comment
         fields = ["id", "user", "comment_content", "timestamp"]
+        list_serializer_class = PrimedListSerializer
+        prime_related = ["user"]
 
 
 class AnswerUpvoteSerializer(serializers.ModelSerializer):
-    by_user = UserMiniSerializer(read_only=True)
+    by_user = SideLoadedUserSerializer(read_only=True)
 
     class Meta:
         model = Upvote
         fields = ["id", "upvote_count", "by_user"]
+        list_serializer_class = PrimedListSerializer
+        prime_related = ["by_user"]
 
 
 class AnswerSerializer(serializers.ModelSerializer):
-    user = UserMiniSerializer(read_only=True)
+    user = SideLoadedUserSerializer(read_only=True)
     comments = serializers.SerializerMethodField()
+    comment_count = serializers.SerializerMethodField()
     upvotes = serializers.SerializerMethodField()
 
     class Meta:
@@ -197,29 +336,48 @@ class AnswerSerializer(serializers.ModelSerializer):
             "user",
             "answer_description",
             "comments",
+            "comment_count",
+            "vote_count",
             "upvotes",
             "timestamp",
         ]
+        list_serializer_class = PrimedListSerializer
+        prime_related = ["user"]
 
     def get_comments(self, obj):
-        comments = Comment.objects.filter(answer=obj, comment_deleted=False)
-        return CommentSerializer(comments, many=True).data
+        """First few comments only; the rest come from the comments endpoint."""
+        comments = getattr(obj, "live_comments", None)
+        if comments is None:
+            comments = obj.comment_set.filter(comment_deleted=False).order_by("id")[
+                :COMMENT_PREVIEW_SIZE
+            ]
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+    def get_comment_count(self, obj):
+        count = getattr(obj, "live_comment_count", None)
+        if count is None:
+            count = obj.comment_set.filter(comment_deleted=False).count()
+        return count
 
     def get_upvotes(self, obj):
-        upvotes = Upvote.objects.filter(answer=obj)
-        return AnswerUpvoteSerializer(upvotes, many=True).data
+        upvotes = getattr(obj, "prefetched_upvotes", None)
+        if upvotes is None:
+            upvotes = obj.upvote_set.all()
+        return AnswerUpvoteSerializer(upvotes, many=True, context=self.context).data
 
 
 class QuestionUpvoteSerializer(serializers.ModelSerializer):
-    by_user = UserMiniSerializer(read_only=True)
+    by_user = SideLoadedUserSerializer(read_only=True)
 
     class Meta:
         model = Upvote
         fields = ["id", "upvote_count", "by_user"]
+        list_serializer_class = PrimedListSerializer
+        prime_related = ["by_user"]
 
 
 class QuestionDetailSerializer(serializers.ModelSerializer):
-    user = UserMiniSerializer(read_only=True)
+    user = SideLoadedUserSerializer(read_only=True)
     answers = serializers.SerializerMethodField()
     upvotes = serializers.SerializerMethodField()
 
@@ -231,20 +389,85 @@ class QuestionDetailSerializer(serializers.ModelSerializer):
             "question_title",
             "question_description",
             "question_tag",
+            "answer_count",
+            "view_count",
             "answers",
             "upvotes",
         ]
 
     def get_answers(self, obj):
-        answers = Answer.objects.filter(question=obj, answer_deleted=False)
-        return AnswerSerializer(answers, many=True).data
+        """
+        One page of answers: the page passed in context["answers"] by the
+        view, or the first page.
+        """
+        answers = self.context.get("answers")
+        if answers is None:
+            answers = question_answers(obj)[: AnswerCursorPagination.page_size]
+        return AnswerSerializer(answers, many=True, context=self.context).data
 
     def get_upvotes(self, obj):
-        upvotes = Upvote.objects.filter(question=obj)
-        return QuestionUpvoteSerializer(upvotes, many=True).data
+        upvotes = getattr(obj, "prefetched_upvotes", None)
+        if upvotes is None:
+            upvotes = obj.upvote_set.all()
+        return QuestionUpvoteSerializer(upvotes, many=True, context=self.context).data
+
+
+def with_answer_details(queryset):
+    """
+    Prefetch everything AnswerSerializer renders, so serializing the
+    answers runs without further queries (and is safe in async views).
+    """
+    # A correlated count, not Count("comment"): a GROUP BY on the page query
+    # would stop it from reading answers in index order
+    live_comment_count = (
+        Comment.objects.filter(answer=OuterRef("pk"), comment_deleted=False)
+        .order_by()
+        .values("answer")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    return (
+        queryset.select_related("user")
+        .annotate(live_comment_count=Coalesce(Subquery(live_comment_count), 0))
+        .prefetch_related(
+            Prefetch(
+                "comment_set",
+                queryset=Comment.objects.filter(comment_deleted=False)
+                .select_related("user")
+                .order_by("id")[:COMMENT_PREVIEW_SIZE],
+                to_attr="live_comments",
+            ),
+            Prefetch(
+                "upvote_set",
+                queryset=Upvote.objects.select_related("by_user"),
+                to_attr="prefetched_upvotes",
+            ),
+        )
+    )
+
 
+def question_answers(question):
+    """Live answers of a question, ready to be paginated and serialized."""
+    return with_answer_details(
+        question.answer_set.filter(answer_deleted=False)
+    ).order_by(*ANSWER_SORTS[DEFAULT_ANSWER_SORT])
 
-class QuestionCreateSerializer(serializers.ModelSerializer):
+
+def with_question_details(queryset):
+    """
+    Prefetch what QuestionDetailSerializer renders besides the answers,
+    which are paginated separately (see question_answers).
+    """
+    return queryset.select_related("user").prefetch_related(
+        Prefetch(
+            "upvote_set",
+            queryset=Upvote.objects.select_related("by_user"),
+            to_attr="prefetched_upvotes",
+        ),
+    )
+
+
+class QuestionCreateSerializer(EditedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = ["question_title", "question_description", "question_tag"]
@@ -260,7 +483,7 @@ class AnswerCreateSerializer(serializers.ModelSerializer):
         return Answer.objects.create(**validated_data)
 
 
-class AnswerUpdateSerializer(serializers.ModelSerializer):
+class AnswerUpdateSerializer(EditedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Answer
         fields = ["answer_description"]
@@ -287,9 +510,56 @@ class NotificationSerializer(serializers.ModelSerializer):
         ]
 
 
+class NotificationFeedSerializer(serializers.ModelSerializer):
+    """
+    Notification feed entry. event_count > 1 marks a digest of several
+    notifications about the same question, mention_by being the latest actor.
+    """
+
+    question_title = serializers.CharField(source="question.question_title", default=None)
+    mention_by = UserSearchSerializer(read_only=True)
+    is_digest = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = [
+            "id",
+            "question",
+            "question_title",
+            "answer",
+            "mention_by",
+            "event_count",
+            "is_digest",
+            "is_read",
+            "timestamp",
+        ]
+        list_serializer_class = PrimedListSerializer
+        prime_related = ["question", "mention_by"]
+
+    def get_is_digest(self, obj):
+        return obj.event_count > 1
+
+
 class NotificationUpdateSerializer(serializers.ModelSerializer):
     """Serializer for updating notification read status"""
 
     class Meta:
         model = Notification
         fields = ["is_read"]
+
+
+class RevisionSerializer(serializers.ModelSerializer):
+    """An entry of a record's revision history, without its content"""
+
+    edited_by = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Revision
+        fields = ["number", "is_snapshot", "size", "edited_by", "edited_at"]
+
+    def get_edited_by(self, obj):
+        if obj.edited_by_admin_id:
+            return {"admin_id": obj.edited_by_admin_id, "username": obj.edited_by_admin.username}
+        if obj.edited_by_id:
+            return {"user_id": obj.edited_by_id, "username": obj.edited_by.username}
+        return None
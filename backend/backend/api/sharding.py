@@ -0,0 +1,676 @@
+"""
+Horizontal sharding of questions and the rows that hang off them.
+
+Users, admins, tag follows and the other account-level tables live in
+SHARDING["GLOBAL_DATABASE"]. A question lives on one of SHARDING["SHARDS"]
+together with everything that belongs to it: its answers, their comments,
+upvotes, the notifications about it, follows, feed entries, similarity
+buckets and revisions (the models deriving from ShardedModel). Sharding is on
+when more than one shard is configured; with a single one every query goes
+to the default database as before.
+
+Which shard
+-----------
+New rows get their id from a per-shard sequence (ShardSequence) instead of
+the database autoincrement. Ids are time ordered and unique across shards:
+
+    id = max(milliseconds since EPOCH, last value on the shard + 1) * SLOTS + slot
+
+where slot is the index of the shard in SHARDS. So SHARDS may only grow at
+the end, and an id names the shard its row was created on. New questions are
+placed on a random shard (of SHARDING["PLACEMENT_SHARDS"], if set) and their
+rows are created next to them. QuestionPlacement, in the global database,
+records the questions that are not on their id's shard: those moved by
+rebalance_shards and those created before sharding was turned on (see
+init_shards).
+
+Queries on sharded models go to the "current" shard, held in a context
+variable: @routed views select the shard of the question, answer or comment
+named in the request, each_shard() loops over all of them, and related rows
+are read from the shard of the instance they are reached from. A query on a
+sharded model with no shard selected raises ShardNotSelected rather than
+silently reading one shard.
+
+Across shards
+-------------
+scatter() runs a queryset on every shard and merges the rows in the
+queryset's ordering (ScatterGather), so lists, feeds and pages over all
+questions cost one query per shard, each limited to the rows the page needs.
+select_related() of a user or admin from a sharded model becomes a
+prefetch_related(), as a join cannot cross databases; foreign keys from
+sharded to global tables have no database constraint for the same reason.
+"""
+import functools
+import heapq
+import inspect
+import itertools
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, models, router, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+DEFAULTS = {
+    "SHARDS": [DEFAULT_DB_ALIAS],
+    "GLOBAL_DATABASE": DEFAULT_DB_ALIAS,
+    # Shards new questions are placed on (None: all of them). Leave a shard
+    # out before emptying it with `rebalance_shards --drain`.
+    "PLACEMENT_SHARDS": None,
+}
+
+# Ids encode the shard they were created on in their lowest 6 bits
+SLOTS = 64
+# 2024-01-01T00:00:00Z in milliseconds
+EPOCH_MS = 1704067200000
+
+_current = ContextVar("shard", default=None)
+
+
+class ShardNotSelected(Exception):
+    """Raised when a sharded model is queried without a current shard."""
+
+
+def get_sharding_setting(name):
+    return getattr(settings, "SHARDING", {}).get(name, DEFAULTS[name])
+
+
+def shards():
+    return list(get_sharding_setting("SHARDS"))
+
+
+def global_database():
+    if not enabled():
+        return DEFAULT_DB_ALIAS
+    return get_sharding_setting("GLOBAL_DATABASE")
+
+
+def enabled():
+    return len(get_sharding_setting("SHARDS")) > 1
+
+
+def is_sharded(model):
+    return issubclass(model, ShardedModel)
+
+
+# ----------------- Current shard -----------------
+
+
+@contextmanager
+def use_shard(alias):
+    """Send queries on sharded models to alias inside this block."""
+    token = _current.set(alias)
+    try:
+        yield alias
+    finally:
+        _current.reset(token)
+
+
+def current_shard():
+    alias = _current.get()
+    if alias is None:
+        raise ShardNotSelected(
+            "No shard selected: run the query inside sharding.use_shard() or "
+            "each_shard(), or give it .using(alias)"
+        )
+    return alias
+
+
+def each_shard():
+    """Yield every shard alias, with it selected while the caller's loop body runs."""
+    for alias in shards():
+        with use_shard(alias):
+            yield alias
+
+
+def atomic():
+    """transaction.atomic() on the current shard (the default database when sharding is off)."""
+    return transaction.atomic(using=current_shard() if enabled() else DEFAULT_DB_ALIAS)
+
+
+def atomic_everywhere():
+    """One transaction per database (global and every shard), committed together."""
+    stack = ExitStack()
+    for alias in dict.fromkeys([global_database(), *shards()]):
+        stack.enter_context(transaction.atomic(using=alias))
+    return stack
+
+
+# ----------------- Ids -----------------
+
+
+def slot_shard(object_id):
+    """The shard a row with this id was created on (if it was created sharded)."""
+    aliases = shards()
+    slot = int(object_id) % SLOTS
+    return aliases[slot] if slot < len(aliases) else aliases[0]
+
+
+def _now_value():
+    return int(time.time() * 1000) - EPOCH_MS
+
+
+def _initial_value(model):
+    # Stay above ids written before sharding (autoincrement, any shard)
+    highest = max(
+        model._base_manager.using(alias).aggregate(highest=models.Max("pk"))["highest"] or 0
+        for alias in shards()
+    )
+    return max(_now_value(), highest // SLOTS + 1)
+
+
+def allocate_ids(model, alias, count=1):
+    """Reserve count new ids for rows of model on shard alias."""
+    from .models import ShardSequence
+
+    slot = shards().index(alias)
+    if slot >= SLOTS:
+        raise ImproperlyConfigured(f"At most {SLOTS} shards are supported")
+    name = model._meta.label_lower
+    sequences = ShardSequence.objects.using(alias).filter(name=name)
+    with transaction.atomic(using=alias):
+        # Write first, so the row (on SQLite the database) stays locked until commit
+        if not sequences.update(next_value=Greatest(F("next_value"), _now_value()) + count):
+            try:
+                with transaction.atomic(using=alias):
+                    ShardSequence.objects.using(alias).create(
+                        name=name, next_value=_initial_value(model) + count
+                    )
+            except IntegrityError:
+                # Created concurrently
+                sequences.update(next_value=Greatest(F("next_value"), _now_value()) + count)
+        end = sequences.values_list("next_value", flat=True).get()
+    return [value * SLOTS + slot for value in range(end - count, end)]
+
+
+class ShardedQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        new = [obj for obj in objs if obj.pk is None]
+        if new and enabled():
+            for obj, pk in zip(new, allocate_ids(self.model, self.db, len(new))):
+                obj.pk = pk
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def select_related(self, *fields):
+        if not enabled() or not fields or fields == (None,):
+            return super().select_related(*fields)
+        joined, prefetched = [], []
+        for path in fields:
+            local = _local_prefix(self.model, path)
+            if local:
+                joined.append(local)
+            if local != path:
+                prefetched.append(path)
+        queryset = super().select_related(*joined) if joined else self._chain()
+        return queryset.prefetch_related(*prefetched) if prefetched else queryset
+
+
+def _local_prefix(model, path):
+    """The part of a select_related path that stays on the shard."""
+    local = []
+    for name in path.split("__"):
+        model = model._meta.get_field(name).related_model
+        if not is_sharded(model):
+            break
+        local.append(name)
+    return "__".join(local)
+
+
+class ShardedModel(models.Model):
+    """A model stored on the shard of the question it belongs to."""
+
+    objects = models.Manager.from_queryset(ShardedQuerySet)()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.pk is None and enabled():
+            using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+            self.pk = allocate_ids(type(self), using)[0]
+            kwargs.update(using=using, force_insert=True)
+        super().save(*args, **kwargs)
+
+
+# ----------------- Placement -----------------
+
+
+def place_question():
+    """The shard a new question goes to (None when sharding is off)."""
+    if not enabled():
+        return None
+    return random.choice(get_sharding_setting("PLACEMENT_SHARDS") or shards())
+
+
+def question_shards(question_ids):
+    """{question id: shard} for the given ids, in one query."""
+    from .models import QuestionPlacement
+
+    question_ids = {int(i) for i in question_ids}
+    placed = dict(
+        QuestionPlacement.objects.filter(question_id__in=question_ids).values_list(
+            "question_id", "shard"
+        )
+    )
+    return {i: placed.get(i) or slot_shard(i) for i in question_ids}
+
+
+def question_shard(question_id):
+    return question_shards([question_id])[int(question_id)]
+
+
+def locate(model, object_id):
+    """
+    The shard holding row object_id of a sharded model, or None. The shard
+    the id was created on is tried first, so this is one query unless the
+    row's question was moved.
+    """
+    first = slot_shard(object_id)
+    for alias in [first] + [a for a in shards() if a != first]:
+        if model._base_manager.using(alias).filter(pk=object_id).exists():
+            return alias
+    return None
+
+
+def locate_many(model, object_ids):
+    """{id: shard} for the rows of model found (one query per shard)."""
+    if model._meta.label_lower == "api.question":
+        return question_shards(object_ids)
+    remaining = {int(i) for i in object_ids}
+    found = {}
+    for alias in shards():
+        if not remaining:
+            break
+        here = set(
+            model._base_manager.using(alias)
+            .filter(pk__in=remaining)
+            .values_list("pk", flat=True)
+        )
+        found.update(dict.fromkeys(here, alias))
+        remaining -= here
+    return found
+
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def request_shard(request, kwargs):
+    """
+    The shard a request is about: that of the question, answer or comment
+    named by its URL arguments, or else by question_id / answer_id in its
+    body. Unknown rows resolve to their id's shard (where the view will not
+    find them); requests naming none resolve to the first shard.
+    """
+    from .models import Answer, Comment, Question
+
+    models_by_type = {"question": Question, "answer": Answer, "comment": Comment}
+    named = [(Question, "question_id"), (Answer, "answer_id"), (Comment, "comment_id")]
+    data = getattr(request, "data", None)
+    if not hasattr(data, "get"):
+        data = {}
+    lookups = [(model, kwargs.get(name)) for model, name in named]
+    if kwargs.get("record_type") in models_by_type:
+        lookups.append((models_by_type[kwargs["record_type"]], kwargs.get("object_id")))
+    lookups += [(model, data.get(name)) for model, name in named]
+    for model, value in lookups:
+        object_id = _as_id(value)
+        if object_id is None:
+            continue
+        if model is Question:
+            return question_shard(object_id)
+        return locate(model, object_id) or slot_shard(object_id)
+    return shards()[0]
+
+
+def routed(view):
+    """Run a view (sync or async) on the shard its request is about."""
+    if inspect.iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not enabled():
+                return await view(request, *args, **kwargs)
+            alias = await sync_to_async(request_shard)(request, kwargs)
+            with use_shard(alias):
+                return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not enabled():
+            return view(request, *args, **kwargs)
+        with use_shard(request_shard(request, kwargs)):
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+# ----------------- Scatter-gather -----------------
+
+
+class _MergeKey:
+    """Sort key comparing column values in mixed ascending/descending order."""
+
+    __slots__ = ("values", "descending", "nulls_largest")
+
+    def __init__(self, values, descending, nulls_largest):
+        self.values = values
+        self.descending = descending
+        self.nulls_largest = nulls_largest
+
+    def __lt__(self, other):
+        for a, b, descending in zip(self.values, other.values, self.descending):
+            if a == b:
+                continue
+            if a is None or b is None:
+                smaller = (b is None) == self.nulls_largest
+            else:
+                smaller = a < b
+            return smaller != descending
+        return False
+
+
+class ScatterGather:
+    """
+    A queryset over a sharded model evaluated on every shard. Iterating it
+    merges the shards' rows in the queryset's ordering (each shard's query
+    is limited to the rows the slice needs), or chains them if it has none.
+    Supports what pagination and the views use: filtering and ordering
+    methods, slicing, len(), count(), exists(), iterator() and async
+    iteration. Orderings must be plain field names present in the rows.
+    """
+
+    CHAINABLE = {
+        "all",
+        "alias",
+        "annotate",
+        "defer",
+        "distinct",
+        "exclude",
+        "filter",
+        "only",
+        "order_by",
+        "prefetch_related",
+        "reverse",
+        "select_related",
+        "values",
+        "values_list",
+    }
+
+    def __init__(self, queryset, low=0, high=None):
+        self.queryset = queryset
+        self.low = low
+        self.high = high
+        self._result_cache = None
+
+    def __getattr__(self, name):
+        if name in self.CHAINABLE:
+            if self.low or self.high is not None:
+                raise TypeError("Cannot filter a query once a slice has been taken.")
+            method = getattr(self.queryset, name)
+
+            @functools.wraps(method)
+            def chained(*args, **kwargs):
+                return ScatterGather(method(*args, **kwargs))
+
+            return chained
+        value = getattr(self.queryset, name)
+        if callable(value):
+            raise AttributeError(f"{name}() is not supported across shards")
+        return value
+
+    def __repr__(self):
+        return f"<ScatterGather {self.queryset.query} [{self.low}:{self.high}]>"
+
+    # ----- Merging -----
+
+    def _ordering(self):
+        query = self.queryset.query
+        names = query.order_by or (
+            self.queryset.model._meta.ordering if query.default_ordering else ()
+        )
+        ordering = []
+        for name in names:
+            if not isinstance(name, str):
+                raise TypeError("Only field name orderings can be merged across shards")
+            descending = name.startswith("-")
+            name = name.lstrip("-+")
+            if name == "pk":
+                name = self.queryset.model._meta.pk.attname
+            ordering.append((name, descending))
+        return ordering
+
+    def _value(self, row, name):
+        if isinstance(row, dict):
+            return row[name]
+        if isinstance(row, tuple):
+            return row[self.queryset._fields.index(name)]
+        if isinstance(row, models.Model):
+            *path, last = name.split("__")
+            for part in path:
+                row = getattr(row, part)
+            try:
+                # Foreign keys sort by their id
+                last = getattr(row._meta.get_field(last), "attname", last)
+            except FieldDoesNotExist:
+                pass  # an annotation
+            return getattr(row, last)
+        return row  # values_list(flat=True)
+
+    def _merged(self, streams):
+        ordering = self._ordering()
+        if ordering:
+            names = [name for name, _ in ordering]
+            descending = [desc for _, desc in ordering]
+            nulls_largest = connections[shards()[0]].features.nulls_order_largest
+            rows = heapq.merge(
+                *streams,
+                key=lambda row: _MergeKey(
+                    [self._value(row, name) for name in names], descending, nulls_largest
+                ),
+            )
+        else:
+            rows = itertools.chain(*streams)
+        return itertools.islice(rows, self.low, self.high)
+
+    def _shard_queryset(self, alias):
+        queryset = self.queryset.using(alias)
+        return queryset[: self.high] if self.high is not None else queryset
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            self._result_cache = list(
+                self._merged([list(self._shard_queryset(alias)) for alias in shards()])
+            )
+        return self._result_cache
+
+    # ----- Evaluation -----
+
+    def __iter__(self):
+        return iter(self._fetch_all())
+
+    def __len__(self):
+        return len(self._fetch_all())
+
+    def __bool__(self):
+        return bool(self._fetch_all())
+
+    def __getitem__(self, k):
+        if isinstance(k, int):
+            if k < 0:
+                raise ValueError("Negative indexing is not supported.")
+            if self._result_cache is not None:
+                return self._result_cache[k]
+            return list(self[k : k + 1])[0]
+        if k.step is not None or (k.start or 0) < 0 or (k.stop is not None and k.stop < 0):
+            raise ValueError("Only positive slices without a step are supported.")
+        if self._result_cache is not None:
+            return self._result_cache[k]
+        low = self.low + (k.start or 0)
+        high = self.low + k.stop if k.stop is not None else None
+        if self.high is not None:
+            high = self.high if high is None else min(high, self.high)
+        return ScatterGather(self.queryset, low, max(low, high) if high is not None else None)
+
+    def iterator(self, chunk_size=None):
+        """Stream the merged rows, holding one cursor per shard."""
+        kwargs = {"chunk_size": chunk_size} if chunk_size else {}
+        return self._merged(
+            [self._shard_queryset(alias).iterator(**kwargs) for alias in shards()]
+        )
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        total = sum(self.queryset.using(alias).count() for alias in shards())
+        if self.high is not None:
+            total = min(total, self.high)
+        return max(0, total - self.low)
+
+    def exists(self):
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        if self.low or self.high is not None:
+            return bool(self)
+        return any(self.queryset.using(alias).exists() for alias in shards())
+
+    async def acount(self):
+        return await sync_to_async(self.count)()
+
+    def __aiter__(self):
+        async def rows():
+            for row in await sync_to_async(self._fetch_all)():
+                yield row
+
+        return rows()
+
+
+def scatter(queryset):
+    """queryset as a ScatterGather over every shard (unchanged when sharding is off
+    or the model is not sharded)."""
+    if not enabled() or not is_sharded(queryset.model):
+        return queryset
+    return ScatterGather(queryset)
+
+
+def by_shard(instances):
+    """Group sharded instances by the shard they were loaded from: [(alias, [instance])]."""
+    groups = {}
+    for instance in instances:
+        groups.setdefault(instance._state.db, []).append(instance)
+    return list(groups.items())
+
+
+# ----------------- Moving questions -----------------
+
+
+def question_rows(question_id, alias):
+    """
+    [(model, queryset)] of every row on shard alias that belongs to a
+    question, parents first.
+    """
+    from .models import (
+        Answer,
+        Comment,
+        FeedEntry,
+        FollowEvent,
+        Notification,
+        Question,
+        QuestionBucket,
+        QuestionFollow,
+        QuestionSignature,
+        Revision,
+        TagFeedEntry,
+        Upvote,
+    )
+
+    answer_ids = list(
+        Answer.objects.using(alias).filter(question_id=question_id).values_list("id", flat=True)
+    )
+    comment_ids = list(
+        Comment.objects.using(alias).filter(answer_id__in=answer_ids).values_list("id", flat=True)
+    )
+    on_question = Q(question_id=question_id) | Q(answer_id__in=answer_ids)
+    return [
+        (model, model.objects.using(alias).filter(lookup))
+        for model, lookup in (
+            (Question, Q(id=question_id)),
+            (Answer, Q(id__in=answer_ids)),
+            (Comment, Q(id__in=comment_ids)),
+            (Upvote, on_question),
+            (Notification, on_question),
+            (QuestionSignature, Q(question_id=question_id)),
+            (QuestionBucket, Q(question_id=question_id)),
+            (QuestionFollow, Q(question_id=question_id)),
+            (FollowEvent, Q(question_id=question_id)),
+            (FeedEntry, Q(question_id=question_id)),
+            (TagFeedEntry, Q(question_id=question_id)),
+            (
+                Revision,
+                Q(record_type="question", object_id=question_id)
+                | Q(record_type="answer", object_id__in=answer_ids)
+                | Q(record_type="comment", object_id__in=comment_ids),
+            ),
+        )
+    ]
+
+
+def _delete_rows(question_id, alias):
+    for model, queryset in reversed(question_rows(question_id, alias)):
+        queryset._raw_delete(queryset.db)
+
+
+def move_question(question_id, target, batch_size=500):
+    """
+    Move a question and every row belonging to it to shard target, keeping
+    their ids. Rows are copied, the question's placement is switched, then
+    the originals are deleted; an interrupted move is completed by moving
+    again. Writes to the question while it is being moved may be lost, and
+    lists may show it twice until the originals are gone.
+
+    :return: number of rows moved
+    """
+    from .models import QuestionPlacement
+
+    source = question_shard(question_id)
+    if source == target:
+        return 0
+    rows = [(model, list(queryset)) for model, queryset in question_rows(question_id, source)]
+    if not rows[0][1]:
+        raise LookupError(f"Question {question_id} is not on {source}")
+
+    with transaction.atomic(using=target):
+        # Leftovers of an interrupted move
+        _delete_rows(question_id, target)
+        for model, objects in rows:
+            timestamps = {
+                field.attname: [getattr(obj, field.attname) for obj in objects]
+                for field in model._meta.concrete_fields
+                if getattr(field, "auto_now_add", False)
+            }
+            model.objects.using(target).bulk_create(objects, batch_size=batch_size)
+            if timestamps and objects:
+                # auto_now_add overwrote them on insert
+                for name, values in timestamps.items():
+                    for obj, value in zip(objects, values):
+                        setattr(obj, name, value)
+                model.objects.using(target).bulk_update(
+                    objects, list(timestamps), batch_size=batch_size
+                )
+    QuestionPlacement.objects.update_or_create(
+        question_id=question_id, defaults={"shard": target}
+    )
+    with transaction.atomic(using=source):
+        _delete_rows(question_id, source)
+    return sum(len(objects) for _, objects in rows)
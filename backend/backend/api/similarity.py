@@ -0,0 +1,235 @@
+"""
+Near-duplicate question detection with MinHash and locality-sensitive hashing.
+
+Each question is reduced to the set of word bigrams ("shingles") of its text
+and summarized by a MinHash signature of NUM_PERMUTATIONS 32-bit values; the
+fraction of equal values between two signatures estimates the Jaccard
+similarity of their shingle sets. Signatures are split into BANDS bands and
+every band is hashed to a bucket key stored in QuestionBucket, so candidates
+for a new text are the questions sharing at least one bucket with it - an
+indexed IN lookup rather than a table scan. Candidates are then ranked by
+their estimated similarity from the stored signatures.
+
+Two signatures are kept per question: one over the title alone, used when only
+a title is being checked, and one over title and description.
+"""
+import hashlib
+import random
+import re
+import struct
+
+from . import sharding
+from .models import Question, QuestionBucket, QuestionSignature
+
+NUM_PERMUTATIONS = 60
+# 20 bands of 3 rows: pairs above ~0.4 similarity very likely share a bucket
+BANDS = 20
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 2
+
+SIMILARITY_THRESHOLD = 0.4
+MAX_RESULTS = 5
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(0x51A1)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+_PACK_FORMAT = f"<{NUM_PERMUTATIONS}I"
+
+# Signature kinds, also mixed into bucket keys so their buckets never collide
+TITLE = b"t"
+TEXT = b"x"
+
+
+def shingles(text):
+    """Return the set of word SHINGLE_SIZE-grams of text (lower-cased)."""
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) < SHINGLE_SIZE:
+        return {" ".join(tokens)} if tokens else set()
+    return {
+        " ".join(tokens[i : i + SHINGLE_SIZE])
+        for i in range(len(tokens) - SHINGLE_SIZE + 1)
+    }
+
+
+def _hash64(value):
+    return int.from_bytes(
+        hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+def minhash(text):
+    """Return the MinHash signature (list of ints) of text, or None if empty."""
+    hashes = [_hash64(shingle) for shingle in shingles(text)]
+    if not hashes:
+        return None
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def pack(signature):
+    return struct.pack(_PACK_FORMAT, *signature)
+
+
+def unpack(data):
+    return struct.unpack(_PACK_FORMAT, bytes(data))
+
+
+def estimate_similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERMUTATIONS
+
+
+def bucket_keys(kind, signature):
+    """Return the signed 64-bit bucket key of every band of a signature."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS : (band + 1) * ROWS]
+        digest = hashlib.blake2b(
+            kind + bytes([band]) + struct.pack(f"<{ROWS}I", *rows), digest_size=8
+        ).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def _question_text(title, description):
+    return f"{title} {description}"
+
+
+# ----------------- Index maintenance -----------------
+
+
+def _build_entries(question):
+    """Return (QuestionSignature, [QuestionBucket]) for a question, or None."""
+    title_signature = minhash(question.question_title)
+    text_signature = minhash(
+        _question_text(question.question_title, question.question_description)
+    )
+    if title_signature is None or text_signature is None:
+        return None
+    buckets = [
+        QuestionBucket(key=key, question_id=question.id)
+        for kind, signature in ((TITLE, title_signature), (TEXT, text_signature))
+        for key in bucket_keys(kind, signature)
+    ]
+    signature = QuestionSignature(
+        question_id=question.id,
+        title_minhash=pack(title_signature),
+        text_minhash=pack(text_signature),
+    )
+    return signature, buckets
+
+
+def index_questions(questions, batch_size=1000):
+    """
+    (Re)index questions in bulk. Deleted questions are removed from the
+    index instead.
+    """
+    signatures = []
+    buckets = []
+    for question in questions:
+        entries = None if question.question_deleted else _build_entries(question)
+        if entries is not None:
+            signatures.append(entries[0])
+            buckets.extend(entries[1])
+
+    ids = [question.id for question in questions]
+    with sharding.atomic():
+        QuestionBucket.objects.filter(question_id__in=ids).delete()
+        QuestionSignature.objects.filter(question_id__in=ids).delete()
+        QuestionSignature.objects.bulk_create(signatures, batch_size=batch_size)
+        QuestionBucket.objects.bulk_create(buckets, batch_size=batch_size)
+    return len(signatures)
+
+
+def index_question(question):
+    """(Re)index a single question after it was created or edited."""
+    index_questions([question])
+
+
+def remove_question(question_id):
+    """Drop a question from the index."""
+    with sharding.atomic():
+        QuestionBucket.objects.filter(question_id=question_id).delete()
+        QuestionSignature.objects.filter(question_id=question_id).delete()
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Index every live question (on the current shard) and drop entries of
+    deleted ones.
+
+    :return: number of questions indexed
+    """
+    QuestionSignature.objects.filter(question__question_deleted=True).delete()
+    QuestionBucket.objects.filter(question__question_deleted=True).delete()
+
+    queryset = Question.objects.filter(question_deleted=False).only(
+        "id", "question_title", "question_description", "question_deleted"
+    )
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by("id")[:batch_size])
+        if not batch:
+            return indexed
+        indexed += index_questions(batch, batch_size=batch_size)
+        last_id = batch[-1].id
+
+
+# ----------------- Lookup -----------------
+
+
+def find_similar(
+    title,
+    description=None,
+    exclude_id=None,
+    threshold=SIMILARITY_THRESHOLD,
+    limit=MAX_RESULTS,
+):
+    """
+    Return live questions similar to the given title (and description, if
+    given), most similar first, as dicts with id, question_title and
+    similarity.
+    """
+    if description:
+        kind, field = TEXT, "text_minhash"
+        signature = minhash(_question_text(title, description))
+    else:
+        kind, field = TITLE, "title_minhash"
+        signature = minhash(title)
+    if signature is None:
+        return []
+
+    candidates = QuestionBucket.objects.filter(
+        key__in=bucket_keys(kind, signature)
+    ).values("question_id")
+    # Questions soft-deleted in bulk (e.g. with their author) may still have
+    # buckets until the next rebuild, so liveness is checked here
+    rows = sharding.scatter(
+        QuestionSignature.objects.filter(
+            question_id__in=candidates, question__question_deleted=False
+        )
+    ).values_list("question_id", "question__question_title", field)
+
+    results = []
+    for question_id, question_title, packed in rows:
+        if question_id == exclude_id:
+            continue
+        similarity = estimate_similarity(signature, unpack(packed))
+        if similarity >= threshold:
+            results.append(
+                {
+                    "id": question_id,
+                    "question_title": question_title,
+                    "similarity": round(similarity, 2),
+                }
+            )
+    results.sort(key=lambda result: (-result["similarity"], result["id"]))
+    return results[:limit]
@@ -0,0 +1,126 @@
+"""Shared fixtures for the api tests."""
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import related, typeahead, view_counts
+from api.hashing import make_password
+from api.models import Admin, Answer, Question, UserDetail
+
+PASSWORD = "Sup3rSecret!!"
+
+
+def create_user(username, **fields):
+    fields = {"user_email": f"{username}@example.com", **fields}
+    return UserDetail.objects.create(
+        username=username, user_password=make_password(PASSWORD), **fields
+    )
+
+
+def create_admin(username):
+    return Admin.objects.create(
+        username=username,
+        admin_email=f"{username}@example.com",
+        admin_password=make_password(PASSWORD),
+    )
+
+
+def access_token(account):
+    """An access token like the ones the login views issue."""
+    refresh = RefreshToken()
+    refresh["user_id"] = account.id
+    if isinstance(account, Admin):
+        refresh["user_type"] = "admin"
+        refresh["email"] = account.admin_email
+    else:
+        refresh["user_type"] = "user"
+        refresh["email"] = account.user_email
+    return str(refresh.access_token)
+
+
+def client_for(account=None):
+    """An APIClient authenticated as account (anonymous without one)."""
+    client = APIClient()
+    if account is not None:
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token(account)}")
+    return client
+
+
+class IsolatedAPIMixin:
+    """
+    Keeps file-based indexes, uploads and throttle buckets in a temporary
+    directory, hashes passwords inline and cheaply, and starts every test
+    with empty per-worker state.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        overrides = override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "throttle": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": "test-throttle",
+                },
+            },
+            PASSWORD_HASHING={**settings.PASSWORD_HASHING, "WORKERS": 0, "PBKDF2_ITERATIONS": 1000},
+            REST_FRAMEWORK={
+                **settings.REST_FRAMEWORK,
+                "DEFAULT_THROTTLE_RATES": {"auth": "1000/s", "vote": "1000/s", "write": "1000/s"},
+            },
+            RELATED_QUESTIONS={**settings.RELATED_QUESTIONS, "INDEX_DIR": self.tmp_dir / "related"},
+            TYPEAHEAD={**settings.TYPEAHEAD, "INDEX_DIR": self.tmp_dir / "typeahead"},
+            IMPORTS={"UPLOAD_DIR": self.tmp_dir / "imports"},
+            TRAFFIC_CAPTURE={**settings.TRAFFIC_CAPTURE, "LOG_DIR": self.tmp_dir / "traffic"},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        typeahead._state.update(
+            index=typeahead.TypeaheadIndex(), snapshot=None, journal=None, offset=0
+        )
+        related._loaded.update(version=None, index=None)
+        view_counts._pending.clear()
+        view_counts._recent.clear()
+        # Views left pending would be flushed at exit, after the test database is gone
+        self.addCleanup(view_counts._pending.clear)
+        # Tests flush explicitly rather than from a background thread
+        flusher = mock.patch.object(view_counts, "_ensure_flusher")
+        flusher.start()
+        self.addCleanup(flusher.stop)
+
+    def ask(self, client, title, description="A question body long enough to index", tag="python"):
+        """Post a question through the API and return it."""
+        response = client.post(
+            "/api/questions/ask/",
+            {"question_title": title, "question_description": description, "question_tag": tag},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Question.objects.get(id=response.data["question_id"])
+
+    def answer(self, client, question, text="An answer"):
+        """Post an answer through the API and return it."""
+        response = client.post(
+            f"/api/questions/{question.id}/answers/",
+            {"answer_description": text},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Answer.objects.get(id=response.data["answer"]["id"])
+
+
+class APITestCase(IsolatedAPIMixin, TestCase):
+    """Base class for api tests; each runs in a rolled back transaction."""
+
+
+class APITransactionTestCase(IsolatedAPIMixin, TransactionTestCase):
+    """For code that alters the schema (SQLite can't inside a transaction)."""
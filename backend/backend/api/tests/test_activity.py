@@ -0,0 +1,93 @@
+from django.test import RequestFactory
+
+from api.activity import rebuild_user_counters, record_user_activity, user_activity
+from api.models import UserDetail
+from api.serializers import UserProfileSerializer
+from api.utils import update_reputation_for_upvote
+
+from .base import APITestCase, client_for, create_admin, create_user
+
+
+class ActivityCounterTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = create_user("alice"), create_user("bob")
+        self.client = client_for(self.alice)
+        self.question = self.ask(self.client, "How do I reverse a list")
+        reply = self.answer(client_for(self.bob), self.question)
+        self.client.post(
+            "/api/comment/add/",
+            {"answer_id": reply.id, "comment_content": "Thanks"},
+            format="json",
+        )
+        client_for(self.bob).post(
+            "/api/upvote/", {"question_id": self.question.id, "vote": 1}, format="json"
+        )
+
+    def counters(self, user):
+        return UserDetail.objects.filter(id=user.id).values_list(
+            "question_count", "answer_count", "comment_count", "upvotes_received", "reputation"
+        )[0]
+
+    def test_writes_update_the_counters(self):
+        self.assertEqual(self.counters(self.alice), (1, 0, 1, 1, 1))
+        self.assertEqual(self.counters(self.bob), (0, 1, 0, 0, 0))
+
+        record_user_activity(self.bob.id, answers=-5)
+        self.assertEqual(self.counters(self.bob)[1], 0)
+
+    def test_rebuild_repairs_drift(self):
+        UserDetail.objects.update(question_count=9, answer_count=9, comment_count=9, upvotes_received=9)
+        self.assertEqual(rebuild_user_counters(batch_size=1), 2)
+        self.assertEqual(self.counters(self.alice)[:4], (1, 0, 1, 1))
+        self.assertEqual(self.counters(self.bob)[:4], (0, 1, 0, 0))
+
+    def test_profile_edit_keeps_concurrent_counters(self):
+        stale = UserDetail.objects.get(id=self.alice.id)
+        record_user_activity(self.alice.id, questions=1)
+        update_reputation_for_upvote(question=self.question, vote=1)
+
+        serializer = UserProfileSerializer(stale, data={"username": "alice2"}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertEqual(self.counters(self.alice), (2, 0, 1, 1, 2))
+
+        response = self.client.put(
+            "/api/auth/user/profile/update/", {"username": "alice3"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counters(self.alice), (2, 0, 1, 1, 2))
+
+
+class ActivitySummaryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = create_user("alice")
+        self.client = client_for(self.alice)
+        self.questions = [self.ask(self.client, f"Question number {n}") for n in range(3)]
+
+    def test_recent_posts_are_keyset_paginated(self):
+        data = self.client.get("/api/auth/user/activity/?limit=2").data
+        self.assertEqual(data["counts"]["questions"], 3)
+        page = data["recent_questions"]
+        self.assertEqual([q["id"] for q in page["results"]], [self.questions[2].id, self.questions[1].id])
+        self.assertIn(f"questions_before={self.questions[1].id}", page["next"])
+
+        page = self.client.get(page["next"]).data["recent_questions"]
+        self.assertEqual([q["id"] for q in page["results"]], [self.questions[0].id])
+        self.assertIsNone(page["next"])
+
+    def test_summary_takes_two_queries(self):
+        request = RequestFactory().get("/api/auth/user/activity/")
+        user = UserDetail.objects.get(id=self.alice.id)
+        with self.assertNumQueries(2):
+            user_activity(user, request)
+
+    def test_profiles_include_the_activity(self):
+        data = self.client.get("/api/auth/user/profile/").data
+        self.assertEqual(data["activity"]["counts"]["questions"], 3)
+
+        admin = client_for(create_admin("root"))
+        data = admin.get(f"/api/auth/admin/user/{self.alice.id}/activity/").data
+        self.assertEqual(len(data["recent_questions"]["results"]), 3)
+        self.assertEqual(admin.get("/api/auth/admin/user/999999/activity/").status_code, 404)
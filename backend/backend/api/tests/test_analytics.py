@@ -0,0 +1,88 @@
+import datetime
+import io
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from api.analytics import period_start, rebuild_rollups, refresh_rollups
+from api.models import ActivityRollup, Question
+
+from .base import APITestCase, client_for, create_admin, create_user
+
+
+def counts(metric, period="day", tag=""):
+    return sum(
+        ActivityRollup.objects.filter(metric=metric, period=period, tag=tag).values_list(
+            "count", flat=True
+        )
+    )
+
+
+class RollupTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(create_user("alice"))
+        self.question = self.ask(self.client, "How do I reverse a list", tag="Python, Lists")
+        self.answer(self.client, self.question)
+
+    def test_period_start(self):
+        wednesday = datetime.date(2024, 5, 15)
+        self.assertEqual(period_start(wednesday, "week"), datetime.date(2024, 5, 13))
+        self.assertEqual(period_start(wednesday, "day"), wednesday)
+
+    def test_refresh_is_idempotent(self):
+        self.assertEqual(refresh_rollups(batch_size=1)["questions"], 1)
+        self.assertEqual(set(refresh_rollups().values()), {0})
+        self.assertEqual((counts("questions"), counts("answers"), counts("users")), (1, 1, 1))
+
+        self.ask(self.client, "How do I sort a list", tag="python")
+        self.assertEqual(refresh_rollups()["questions"], 1)
+        self.assertEqual(counts("questions"), 2)
+        self.assertEqual(counts("questions", period="week"), 2)
+
+    def test_tags_are_split_and_lower_cased(self):
+        refresh_rollups()
+        self.assertEqual(counts("questions", tag="python"), 1)
+        self.assertEqual(counts("answers", tag="lists"), 1)
+        self.assertFalse(ActivityRollup.objects.filter(tag="Python, Lists").exists())
+
+    def test_rows_land_in_their_own_period(self):
+        old = timezone.now() - datetime.timedelta(days=40)
+        Question.objects.filter(id=self.question.id).update(timestamp=old)
+        refresh_rollups()
+        row = ActivityRollup.objects.get(metric="questions", period="day", tag="")
+        self.assertEqual(row.period_start, timezone.localtime(old).date())
+
+    def test_rebuild_counts_everything_again(self):
+        refresh_rollups()
+        ActivityRollup.objects.update(count=100)
+        rebuild_rollups()
+        self.assertEqual(counts("questions"), 1)
+
+        call_command("refresh_analytics", "--rebuild", stdout=io.StringIO())
+        self.assertEqual(counts("questions"), 1)
+
+
+class AnalyticsEndpointTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = client_for(create_admin("root"))
+        self.ask(client_for(create_user("alice")), "How do I reverse a list", tag="Python")
+
+    def test_series_and_top_tags(self):
+        self.assertIsNone(self.admin.get("/api/admin/analytics/").data["updated_at"])
+        refresh_rollups()
+
+        data = self.admin.get("/api/admin/analytics/?metrics=questions").data
+        self.assertIsNotNone(data["updated_at"])
+        self.assertEqual([point["count"] for point in data["series"]["questions"]], [1])
+        self.assertEqual(data["top_tags"][0]["tag"], "python")
+
+        data = self.admin.get("/api/admin/analytics/?period=week&tag=PYTHON").data
+        self.assertEqual(data["tag"], "python")
+        self.assertEqual(data["series"]["questions"][0]["count"], 1)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.admin.get("/api/admin/analytics/?period=year").status_code, 400)
+        self.assertEqual(self.admin.get("/api/admin/analytics/?metrics=views").status_code, 400)
+        self.assertEqual(self.admin.get("/api/admin/analytics/?since=soon").status_code, 400)
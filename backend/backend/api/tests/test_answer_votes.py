@@ -0,0 +1,73 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Answer
+from api.ranking import rebuild_answer_vote_counts
+from api.serializers import AnswerUpdateSerializer, question_answers
+
+from .base import APITestCase, client_for, create_user
+
+
+class AnswerVoteTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = create_user("alice"), create_user("bob")
+        self.question = self.ask(client_for(self.alice), "How do I reverse a list")
+        client = client_for(self.bob)
+        self.first = self.answer(client, self.question, "reversed()")
+        self.second = self.answer(client, self.question, "Slicing")
+
+    def vote(self, user, answer, vote):
+        return client_for(user).post(
+            "/api/upvote/", {"answer_id": answer.id, "vote": vote}, format="json"
+        )
+
+    def answer_ids(self, query=""):
+        data = client_for().get(f"/api/questions/{self.question.id}/{query}").data
+        return [answer["id"] for answer in data["answers"]]
+
+    def test_votes_are_counted_and_sort_the_answers(self):
+        self.assertEqual(self.answer_ids(), [self.first.id, self.second.id])
+
+        self.assertEqual(self.vote(self.alice, self.second, 1).status_code, 201)
+        self.vote(self.alice, self.second, 1)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.vote_count, 1)
+        self.assertEqual(self.answer_ids(), [self.second.id, self.first.id])
+        self.assertEqual(self.answer_ids("?answers_sort=oldest"), [self.first.id, self.second.id])
+
+        self.vote(self.alice, self.second, -1)
+        self.vote(self.alice, self.second, -1)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.vote_count, 0)
+
+    def test_rebuild_fixes_drifted_counts(self):
+        self.vote(self.alice, self.first, 1)
+        Answer.objects.update(vote_count=7)
+        self.assertEqual(rebuild_answer_vote_counts(batch_size=1), 2)
+        self.assertEqual(
+            dict(Answer.objects.values_list("id", "vote_count")),
+            {self.first.id: 1, self.second.id: 0},
+        )
+
+    def test_vote_sort_reads_the_index(self):
+        queryset = question_answers(self.question)[:20]
+        plan = queryset.explain()
+        self.assertIn("answer_votes_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_editing_keeps_concurrent_votes(self):
+        stale = Answer.objects.get(id=self.first.id)
+        self.vote(self.alice, self.first, 1)
+
+        serializer = AnswerUpdateSerializer(
+            stale, data={"answer_description": "reversed() or [::-1]"}, partial=True
+        )
+        self.assertTrue(serializer.is_valid())
+        with CaptureQueriesContext(connection) as queries:
+            serializer.save()
+        self.assertNotIn("vote_count", queries[-1]["sql"])
+
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.vote_count, 1)
+        self.assertEqual(self.first.answer_description, "reversed() or [::-1]")
@@ -0,0 +1,123 @@
+import datetime
+
+from django.utils import timezone
+
+from api.archive import RestoreError, archive_deleted, restore
+from api.models import Answer, ArchivedRecord, Comment, Question, Upvote, UserDetail
+from api.similarity import find_similar
+
+from .base import APITestCase, client_for, create_admin, create_user
+
+LONG_AGO = timezone.now() - datetime.timedelta(days=90)
+
+
+class ArchiveTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = create_user("alice"), create_user("bob")
+        alice, bob = client_for(self.alice), client_for(self.bob)
+        self.question = self.ask(alice, "How do I reverse a list in Python")
+        self.reply = self.answer(bob, self.question, "Use reversed()")
+        alice.post(
+            "/api/comment/add/",
+            {"answer_id": self.reply.id, "comment_content": "Thanks"},
+            format="json",
+        )
+        bob.post("/api/upvote/", {"question_id": self.question.id, "vote": 1}, format="json")
+        alice.post("/api/upvote/", {"answer_id": self.reply.id, "vote": 1}, format="json")
+
+    def soft_delete(self, model, flag, ids, deleted_at=LONG_AGO):
+        model.objects.filter(id__in=ids).update(**{flag: True, "deleted_at": deleted_at})
+
+    def test_question_round_trip(self):
+        timestamp = Question.objects.get(id=self.question.id).timestamp
+        self.soft_delete(Question, "question_deleted", [self.question.id])
+
+        archived = archive_deleted(batch_size=1)
+        self.assertEqual(archived, {"comments": 0, "answers": 0, "questions": 1, "users": 0})
+        self.assertFalse(Question.objects.exists())
+        self.assertFalse(Answer.objects.exists() or Comment.objects.exists())
+        self.assertFalse(Upvote.objects.exists())
+        self.assertEqual(UserDetail.objects.get(id=self.alice.id).upvotes_received, 0)
+
+        restore("question", self.question.id)
+        question = Question.objects.get(id=self.question.id)
+        self.assertFalse(question.question_deleted)
+        self.assertEqual(question.timestamp, timestamp)
+        self.assertEqual((question.answer_count, question.upvote_count), (1, 1))
+        self.assertEqual(Answer.objects.get().id, self.reply.id)
+        self.assertEqual(Answer.objects.get().vote_count, 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(UserDetail.objects.get(id=self.alice.id).upvotes_received, 1)
+        self.assertEqual(find_similar("How do I reverse a list in Python")[0]["id"], question.id)
+        self.assertFalse(ArchivedRecord.objects.exists())
+
+    def test_retention_window(self):
+        self.soft_delete(Question, "question_deleted", [self.question.id], timezone.now())
+        self.assertEqual(archive_deleted()["questions"], 0)
+        self.assertEqual(archive_deleted(retention_days=0)["questions"], 1)
+
+    def test_restore_needs_its_parents(self):
+        self.soft_delete(Answer, "answer_deleted", [self.reply.id])
+        self.soft_delete(Question, "question_deleted", [self.question.id])
+        archived = archive_deleted()
+        self.assertEqual((archived["answers"], archived["questions"]), (1, 1))
+
+        with self.assertRaisesMessage(RestoreError, "Restore these archived questions first"):
+            restore("answer", self.reply.id)
+        restore("question", self.question.id)
+        restore("answer", self.reply.id)
+        self.assertFalse(Answer.objects.get().answer_deleted)
+        with self.assertRaises(ArchivedRecord.DoesNotExist):
+            restore("answer", self.reply.id)
+
+    def test_users_wait_for_their_posts(self):
+        self.soft_delete(UserDetail, "is_user_deleted", [self.bob.id])
+        self.assertEqual(archive_deleted()["users"], 0)
+
+        self.soft_delete(Answer, "answer_deleted", [self.reply.id])
+        archived = archive_deleted()
+        self.assertEqual((archived["answers"], archived["users"]), (1, 1))
+        # The upvote bob cast went with him
+        self.assertFalse(Upvote.objects.filter(by_user_id=self.bob.id).exists())
+
+        with self.assertRaisesMessage(RestoreError, "Restore these archived users first"):
+            restore("answer", self.reply.id)
+        restore("user", self.bob.id)
+        restore("answer", self.reply.id)
+        self.assertEqual(Question.objects.get().upvote_count, 1)
+
+
+class ArchiveEndpointTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = client_for(create_admin("root"))
+        self.question = self.ask(client_for(create_user("alice")), "How do I reverse a list")
+        Question.objects.update(question_deleted=True, deleted_at=LONG_AGO)
+        archive_deleted()
+
+    def post_restore(self, data):
+        return self.admin.post("/api/admin/archive/restore/", data, format="json")
+
+    def test_list_and_restore(self):
+        data = self.admin.get("/api/admin/archive/?type=question").data
+        self.assertEqual([r["original_id"] for r in data["results"]], [self.question.id])
+
+        response = self.post_restore({"record_type": "question", "original_id": self.question.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Question.objects.filter(id=self.question.id).exists())
+        response = self.post_restore({"record_type": "question", "original_id": self.question.id})
+        self.assertEqual(response.status_code, 404)
+
+    def test_bad_input(self):
+        self.assertEqual(self.post_restore({"record_type": "question"}).status_code, 400)
+        self.assertEqual(self.post_restore({"record_type": "vote", "original_id": 1}).status_code, 400)
+        self.assertEqual(
+            self.post_restore({"record_type": "question", "original_id": "x"}).status_code, 400
+        )
+        self.assertEqual(self.admin.get("/api/admin/archive/?limit=x").status_code, 400)
+
+    def test_taken_ids_conflict(self):
+        Question.objects.create(id=self.question.id, user=create_user("bob"), question_title="t")
+        response = self.post_restore({"record_type": "question", "original_id": self.question.id})
+        self.assertEqual(response.status_code, 409)
@@ -0,0 +1,65 @@
+from asgiref.sync import sync_to_async
+from django.test import override_settings
+from django.test.client import AsyncClient
+
+from api import view_counts
+
+from .base import APITestCase, access_token, client_for, create_admin, create_user
+
+
+class AsyncViewParityTests(APITestCase):
+    """The async read views answer like their sync counterparts."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+        self.admin = create_admin("root")
+        client = client_for(self.user)
+        self.question = self.ask(client, "How do I reverse a list")
+        self.ask(client, "How do I sort a tuple", tag="tuples")
+        answer = self.answer(client, self.question, "Use reversed()")
+        self.answer_id = answer.id
+        client.post(
+            "/api/comment/add/",
+            {"answer_id": answer.id, "comment_content": "Or slicing"},
+            format="json",
+        )
+
+    async def _get_sync(self, path, account=None):
+        return await sync_to_async(client_for(account).get)(path)
+
+    async def _get_async(self, path, account=None):
+        headers = {"Authorization": f"Bearer {access_token(account)}"} if account else {}
+        with override_settings(ROOT_URLCONF="backend.asgi_urls"):
+            return await AsyncClient().get(path, headers=headers)
+
+    async def assertSameResponse(self, path, account=None):
+        sync_response = await self._get_sync(path, account)
+        async_response = await self._get_async(path, account)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_question_list(self):
+        await self.assertSameResponse("/api/questions/")
+        await self.assertSameResponse("/api/questions/?question_tag=tuples")
+        await self.assertSameResponse("/api/questions/?ordering=hot&page_size=1&page=2")
+        await self.assertSameResponse("/api/questions/?page=9")
+
+    async def test_question_and_answer_detail(self):
+        await self.assertSameResponse(f"/api/questions/{self.question.id}/")
+        await self.assertSameResponse(f"/api/questions/{self.question.id}/?compact=1")
+        await self.assertSameResponse(f"/api/answers/{self.answer_id}/")
+        await self.assertSameResponse("/api/questions/999999/")
+
+    async def test_profiles_require_the_right_account(self):
+        await self.assertSameResponse("/api/auth/user/profile/", self.user)
+        await self.assertSameResponse("/api/auth/user/profile/")
+        await self.assertSameResponse("/api/auth/admin/profile/", self.admin)
+        await self.assertSameResponse("/api/auth/admin/profile/", self.user)
+
+    async def test_question_views_are_deduplicated_by_user(self):
+        path = f"/api/questions/{self.question.id}/"
+        await self._get_async(path, self.user)
+        await self._get_async(path, self.user)
+        self.assertEqual(view_counts._pending[self.question.id], 1)
+        self.assertIn((f"user:{self.user.id}", self.question.id), view_counts._recent)
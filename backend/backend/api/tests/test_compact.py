@@ -0,0 +1,53 @@
+import json
+
+from api.models import Upvote
+
+from .base import APITestCase, client_for, create_user
+
+
+class CompactResponseTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = create_user("alice"), create_user("bob")
+        self.client = client_for(self.alice)
+        self.question = self.ask(self.client, "How do I reverse a list")
+        self.reply = self.answer(client_for(self.bob), self.question, "reversed()")
+        for n in range(3):
+            self.client.post(
+                "/api/comment/add/",
+                {"answer_id": self.reply.id, "comment_content": f"Comment {n}"},
+                format="json",
+            )
+        self.voters = [create_user(f"voter{n}") for n in range(5)]
+        Upvote.objects.bulk_create(Upvote(question=self.question, by_user=v) for v in self.voters)
+        Upvote.objects.bulk_create(Upvote(answer=self.reply, by_user=v) for v in self.voters)
+        self.url = f"/api/questions/{self.question.id}/"
+
+    def test_users_are_side_loaded_once(self):
+        data = self.client.get(self.url + "?compact=1").data
+        self.assertEqual(data["user"], self.alice.id)
+        answer = data["answers"][0]
+        self.assertEqual(answer["user"], self.bob.id)
+        self.assertEqual({c["user"] for c in answer["comments"]}, {self.alice.id})
+        self.assertEqual(len(data["users"]), 7)
+        self.assertEqual(
+            data["users"][self.bob.id], {"id": self.bob.id, "username": "bob", "reputation": 0}
+        )
+        self.assertNotIn("user_email", json.dumps(data["users"]))
+
+    def test_compact_responses_are_smaller(self):
+        full = self.client.get(self.url).content
+        compact = self.client.get(self.url + "?compact=true").content
+        self.assertLess(len(compact), len(full))
+        self.assertNotIn("users", json.loads(full))
+        self.assertIn("user_email", json.loads(full)["user"])
+
+    def test_answer_and_comment_endpoints(self):
+        data = self.client.get(f"/api/answers/{self.reply.id}/?compact=1").data
+        self.assertEqual(data["user"], self.bob.id)
+        self.assertEqual(
+            set(data["users"]), {self.alice.id, self.bob.id} | {v.id for v in self.voters}
+        )
+
+        data = self.client.get(f"/api/answers/{self.reply.id}/comments/?compact=1").data
+        self.assertEqual(list(data["users"]), [self.alice.id])
@@ -0,0 +1,124 @@
+import io
+import unittest
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+
+from api import compression
+from api.export import iter_records
+from api.models import Answer
+
+from .base import APITestCase, client_for, create_user
+
+LONG_TEXT = ("Use reversed() or slicing to reverse a list in place. " * 40).strip()
+
+
+def stored_type(answer):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT TYPEOF(answer_description) FROM api_answer WHERE id = %s", [answer.id]
+        )
+        return cursor.fetchone()[0]
+
+
+class CodecTests(APITestCase):
+    def test_zlib_round_trip(self):
+        with override_settings(COMPRESSION={"CODEC": "zlib"}):
+            value = compression.compress(LONG_TEXT + "héllo")
+        self.assertEqual(value[:1], compression.ZLIB)
+        self.assertLess(len(value), len(LONG_TEXT) // 10)
+        self.assertEqual(compression.decompress(memoryview(value)), LONG_TEXT + "héllo")
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_zstd_round_trip(self):
+        value = compression.compress(LONG_TEXT)
+        self.assertEqual(value[:1], compression.ZSTD)
+        self.assertEqual(compression.decompress(value), LONG_TEXT)
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_retrained_dictionaries_stay_readable(self):
+        samples = [
+            f"How do I {verb} a {noun} in python {n}"
+            for n in range(300)
+            for verb, noun in [("reverse", "list"), ("sort", "dict")]
+        ]
+        paths = []
+        for n in range(2):
+            paths.append(self.tmp_dir / f"dictionary-{n}")
+            paths[-1].write_bytes(compression.train_dictionary(samples[n::2], size=4096))
+
+        with override_settings(COMPRESSION={"ZSTD_DICTIONARY": paths[0]}):
+            old = compression.compress(LONG_TEXT)
+        self.assertEqual(old[:1], compression.ZSTD_DICT)
+        retrained = {"ZSTD_DICTIONARY": paths[1], "ZSTD_PREVIOUS_DICTIONARIES": [paths[0]]}
+        with override_settings(COMPRESSION=retrained):
+            self.assertEqual(compression.decompress(old), LONG_TEXT)
+        with override_settings(COMPRESSION={"ZSTD_DICTIONARY": paths[1]}):
+            with self.assertRaises(LookupError):
+                compression.decompress(old)
+
+    def test_unknown_header(self):
+        with self.assertRaises(ValueError):
+            compression.decompress(b"\x09data")
+        with mock.patch.object(compression, "zstandard", None):
+            with self.assertRaises(RuntimeError):
+                compression.decompress(compression.ZSTD_DICT + b"\x00\x00\x00\x01data")
+
+
+@override_settings(COMPRESSION={"THRESHOLD": 100, "CODEC": "zlib"})
+class CompressedFieldTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(create_user("alice"))
+        self.question = self.ask(self.client, "How do I reverse a list")
+
+    def test_long_values_are_stored_compressed(self):
+        long = self.answer(self.client, self.question, LONG_TEXT)
+        short = self.answer(self.client, self.question, "reversed()")
+        self.assertEqual((stored_type(long), stored_type(short)), ("blob", "text"))
+        self.assertEqual(Answer.objects.get(id=long.id).answer_description, LONG_TEXT)
+
+        data = self.client.get(f"/api/answers/{long.id}/").data
+        self.assertEqual(data["answer_description"], LONG_TEXT)
+
+    def test_values_are_decompressed_on_first_access(self):
+        answer = self.answer(self.client, self.question, LONG_TEXT)
+        with mock.patch.object(
+            compression, "decompress", wraps=compression.decompress
+        ) as decompress:
+            (loaded,) = Answer.objects.filter(id=answer.id)
+            decompress.assert_not_called()
+            self.assertEqual(loaded.answer_description, LONG_TEXT)
+            self.assertEqual(loaded.answer_description, LONG_TEXT)
+            self.assertEqual(decompress.call_count, 1)
+
+        (raw,) = Answer.objects.filter(id=answer.id).values_list("answer_description", flat=True)
+        self.assertIsInstance(raw, compression.CompressedText)
+        self.assertEqual(compression.text(raw), LONG_TEXT)
+        records = iter_records(types=["answer"])
+        self.assertEqual(next(records)["answer_description"], LONG_TEXT)
+
+    def test_disabled_stores_plain_text(self):
+        with compression.disabled():
+            answer = self.answer(self.client, self.question, LONG_TEXT)
+        self.assertEqual(stored_type(answer), "text")
+        with override_settings(COMPRESSION={"ENABLED": False}):
+            answer = self.answer(self.client, self.question, LONG_TEXT)
+        self.assertEqual(stored_type(answer), "text")
+
+    def test_command_converts_existing_rows(self):
+        with compression.disabled():
+            answers = [self.answer(self.client, self.question, LONG_TEXT) for _ in range(3)]
+        short = self.answer(self.client, self.question, "reversed()")
+
+        out = io.StringIO()
+        call_command("compress_text_columns", "--batch-size", "2", stdout=out)
+        self.assertIn("Answer.answer_description: compressed 3 rows", out.getvalue())
+        self.assertEqual({stored_type(a) for a in answers}, {"blob"})
+        self.assertEqual(stored_type(short), "text")
+
+        call_command("compress_text_columns", "--decompress", stdout=out)
+        self.assertEqual({stored_type(a) for a in answers}, {"text"})
+        self.assertEqual(Answer.objects.get(id=answers[0].id).answer_description, LONG_TEXT)
@@ -0,0 +1,97 @@
+import datetime
+import gzip
+import io
+import json
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from api.export import (
+    gzip_stream,
+    iter_ndjson,
+    iter_records,
+    parse_since,
+    parse_since_ids,
+    parse_types,
+)
+from api.models import UserDetail
+
+from .base import APITestCase, client_for, create_admin, create_user
+
+
+class ExportParsingTests(APITestCase):
+    def test_parse_types_keeps_dependency_order(self):
+        self.assertEqual(parse_types("answer, user"), ["user", "answer"])
+        self.assertEqual(parse_types(""), ["user", "question", "answer", "comment", "upvote"])
+        with self.assertRaises(ValueError):
+            parse_types("user,vote")
+
+    def test_parse_since_ids(self):
+        self.assertEqual(parse_since_ids("5")["comment"], 5)
+        self.assertEqual(parse_since_ids("question:3,answer:4"), {"question": 3, "answer": 4})
+        with self.assertRaises(ValueError):
+            parse_since_ids("question:x")
+
+    def test_parse_since(self):
+        self.assertIsNone(parse_since(""))
+        since = parse_since("2024-03-01")
+        self.assertEqual((since.year, since.month, since.day, since.hour), (2024, 3, 1, 0))
+        self.assertTrue(timezone.is_aware(since))
+        with self.assertRaises(ValueError):
+            parse_since("yesterday")
+
+    def test_gzip_stream_round_trip(self):
+        chunks = iter_ndjson([{"type": "user", "id": i} for i in range(3)])
+        data = gzip.decompress(b"".join(gzip_stream(chunks)))
+        self.assertEqual([json.loads(line)["id"] for line in data.splitlines()], [0, 1, 2])
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+        client = client_for(self.user)
+        self.question = self.ask(client, "How do I reverse a list")
+        self.answer(client, self.question)
+
+    def test_records_end_with_a_cursor(self):
+        records = list(iter_records(chunk_size=1))
+        self.assertEqual([r["type"] for r in records], ["user", "question", "answer", "cursor"])
+        self.assertNotIn("user_password", records[0])
+        self.assertEqual(records[-1]["last_ids"]["question"], self.question.id)
+
+    def test_since_id_exports_only_newer_rows(self):
+        cursor = list(iter_records())[-1]["last_ids"]
+        client = client_for(self.user)
+        newer = self.ask(client, "How do I reverse a string")
+
+        records = list(iter_records(since_ids=cursor))
+        self.assertEqual([(r["type"], r.get("id")) for r in records[:-1]], [("question", newer.id)])
+
+    def test_since_filters_users_by_date_joined(self):
+        UserDetail.objects.filter(id=self.user.id).update(
+            date_joined=timezone.now() - datetime.timedelta(days=10)
+        )
+        create_user("bob")
+        since = timezone.now() - datetime.timedelta(days=1)
+        users = [r["username"] for r in iter_records(types=["user"], since=since) if r["type"] == "user"]
+        self.assertEqual(users, ["bob"])
+
+    def test_endpoint_streams_gzip(self):
+        response = client_for(create_admin("root")).get("/api/admin/export/?types=user,question")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        lines = gzip.decompress(b"".join(response.streaming_content)).splitlines()
+        self.assertEqual([json.loads(line)["type"] for line in lines], ["user", "question", "cursor"])
+
+    def test_endpoint_rejects_bad_parameters(self):
+        admin = client_for(create_admin("root"))
+        self.assertEqual(admin.get("/api/admin/export/?types=nope").status_code, 400)
+        self.assertEqual(client_for(self.user).get("/api/admin/export/").status_code, 403)
+
+    def test_command_writes_a_file(self):
+        path = self.tmp_dir / "corpus.ndjson.gz"
+        call_command("export_corpus", "--output", str(path), stderr=io.StringIO())
+        lines = gzip.decompress(path.read_bytes()).splitlines()
+        self.assertEqual(json.loads(lines[-1])["type"], "cursor")
+        self.assertEqual(len(lines), 4)
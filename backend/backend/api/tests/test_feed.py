@@ -0,0 +1,100 @@
+from django.test import override_settings
+
+from api.feed import feed_queryset, follow_tag, normalize_tag, trim_feeds
+from api.models import FeedEntry, Question, TagFeedEntry
+
+from .base import APITestCase, client_for, create_user
+
+
+class FeedTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.reader = create_user("reader")
+        self.client = client_for(self.reader)
+        self.author = client_for(create_user("author"))
+
+    def feed_ids(self, url="/api/feed/"):
+        ids = []
+        while url:
+            data = self.client.get(url).data
+            ids += [question["id"] for question in data["results"]]
+            url = data["next"]
+        return ids
+
+    def test_normalize_tag(self):
+        self.assertEqual(normalize_tag(" Python "), "python")
+        self.assertIsNone(normalize_tag("python, django"))
+        self.assertIsNone(normalize_tag(""))
+
+    def test_follow_endpoints(self):
+        self.assertEqual(self.client.post("/api/tags/Python/follow/").status_code, 201)
+        self.assertEqual(self.client.post("/api/tags/python/follow/").status_code, 200)
+        self.assertEqual(self.client.get("/api/tags/following/").data["tags"], ["python"])
+        self.assertEqual(self.client.delete("/api/tags/python/follow/").status_code, 200)
+        self.assertEqual(self.client.delete("/api/tags/python/follow/").status_code, 404)
+        self.assertEqual(self.client.post("/api/tags/a,b/follow/").status_code, 400)
+
+    def test_small_tags_fan_out_on_write(self):
+        follow_tag(self.reader, "python")
+        first = self.ask(self.author, "How do I reverse a list", tag="Python, lists")
+        self.ask(self.author, "Configure nginx", tag="nginx")
+        second = self.ask(self.author, "How do I sort a list", tag="python")
+
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.feed_ids("/api/feed/?limit=1"), [second.id, first.id])
+
+        Question.objects.filter(id=second.id).update(question_deleted=True)
+        self.assertEqual(self.feed_ids(), [first.id])
+
+    @override_settings(FEED={"FANOUT_MAX_FOLLOWERS": 1})
+    def test_popular_tags_merge_on_read(self):
+        follow_tag(self.reader, "python")
+        follow_tag(create_user("other"), "python")
+        question = self.ask(self.author, "How do I reverse a list", tag="python")
+
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed_ids(), [question.id])
+
+    @override_settings(FEED={"FANOUT_MAX_FOLLOWERS": 1})
+    def test_merged_tags_stay_merged_as_followers_leave(self):
+        other = create_user("other")
+        follow_tag(self.reader, "python")
+        follow_tag(other, "python")
+        first = self.ask(self.author, "How do I reverse a list", tag="python")
+        other.delete()
+        second = self.ask(self.author, "How do I sort a list", tag="python")
+
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed_ids(), [second.id, first.id])
+
+    def test_new_followers_get_the_tags_questions(self):
+        question = self.ask(self.author, "How do I reverse a list", tag="python")
+        self.assertEqual(self.feed_ids(), [])
+        self.assertEqual(self.client.post("/api/tags/python/follow/").status_code, 201)
+        self.assertEqual(self.feed_ids(), [question.id])
+
+    @override_settings(FEED={"FANOUT_MAX_FOLLOWERS": 1})
+    def test_follower_counts_ignore_deleted_follows(self):
+        other = create_user("other")
+        follow_tag(other, "python")
+        other.delete()
+        follow_tag(self.reader, "python")
+        self.ask(self.author, "How do I reverse a list", tag="python")
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 1)
+
+    def test_a_page_is_one_query(self):
+        follow_tag(self.reader, "python")
+        self.ask(self.author, "How do I reverse a list", tag="python")
+        queryset = feed_queryset(self.reader)
+        with self.assertNumQueries(1):
+            list(queryset[:20])
+
+    def test_trim_keeps_the_newest_entries(self):
+        follow_tag(self.reader, "python")
+        questions = [self.ask(self.author, f"Question number {n}", tag="python") for n in range(4)]
+        self.assertEqual(
+            trim_feeds(max_entries=2, batch_size=1), {"feed_entries": 2, "tag_entries": 2}
+        )
+        self.assertEqual(self.feed_ids(), [questions[3].id, questions[2].id])
+        self.assertEqual(TagFeedEntry.objects.count(), 2)
+        self.assertEqual(self.client.get("/api/feed/?before=x").status_code, 400)
@@ -0,0 +1,76 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.follows import fan_out_answer, follow_question, sync_follow_events
+from api.models import Answer, FollowEvent, Notification, Question
+
+from .base import APITestCase, client_for, create_user
+
+
+class FollowTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = create_user("author")
+        self.question = self.ask(client_for(self.author), "How do I reverse a list")
+        self.followers = [create_user(f"follower{n}") for n in range(4)]
+        for follower in self.followers:
+            follow_question(follower, self.question)
+        self.question.refresh_from_db()
+
+    def notified(self):
+        return set(Notification.objects.values_list("user_id", flat=True))
+
+    def test_follow_endpoints(self):
+        client = client_for(create_user("alice"))
+        url = f"/api/questions/{self.question.id}/follow/"
+        self.assertEqual(client.post(url).status_code, 201)
+        self.assertEqual(client.post(url).status_code, 200)
+        self.assertEqual(Question.objects.get(id=self.question.id).follower_count, 5)
+        self.assertEqual(client.delete(url).status_code, 200)
+        self.assertEqual(client.delete(url).status_code, 404)
+        self.assertEqual(Question.objects.get(id=self.question.id).follower_count, 4)
+        self.assertEqual(client.post("/api/questions/999999/follow/").status_code, 404)
+
+    def test_small_followings_are_notified_on_write(self):
+        answerer = self.followers[0]
+        self.answer(client_for(answerer), self.question)
+        self.assertEqual(
+            self.notified(), {self.author.id} | {f.id for f in self.followers[1:]}
+        )
+        self.assertFalse(FollowEvent.objects.exists())
+
+    def test_fan_out_queries_grow_per_chunk_not_per_follower(self):
+        answerer = create_user("answerer")
+
+        def fan_out_queries():
+            answer = Answer.objects.create(
+                question=self.question, user=answerer, answer_description="x"
+            )
+            with CaptureQueriesContext(connection) as queries:
+                fan_out_answer(answer)
+            return len(queries)
+
+        with override_settings(FOLLOWS={"BATCH_SIZE": 10}):
+            few = fan_out_queries()
+            for n in range(4, 9):
+                follow_question(create_user(f"follower{n}"), self.question)
+            self.question.refresh_from_db()
+            self.assertEqual(fan_out_queries(), few)
+
+    @override_settings(FOLLOWS={"FANOUT_MAX_FOLLOWERS": 2})
+    def test_large_followings_are_notified_on_read(self):
+        late = create_user("late")
+        self.answer(client_for(create_user("answerer")), self.question)
+        follow_question(late, self.question)
+
+        self.assertEqual(FollowEvent.objects.count(), 1)
+        self.assertEqual(self.notified(), {self.author.id})
+
+        follower = self.followers[0]
+        data = client_for(follower).get("/api/notifications/").data
+        self.assertEqual(len(data["results"]), 1)
+        self.assertEqual(sync_follow_events(follower), 0)
+        self.assertEqual(Notification.objects.filter(user=follower).count(), 1)
+        # Followed after the answer was posted
+        self.assertEqual(sync_follow_events(late), 0)
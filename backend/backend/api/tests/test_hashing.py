@@ -0,0 +1,61 @@
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.test import override_settings
+
+from api import hashing
+
+from .base import PASSWORD, APITestCase, create_user
+
+
+def hashing_settings(**values):
+    return override_settings(PASSWORD_HASHING={**settings.PASSWORD_HASHING, **values})
+
+
+class PasswordHashingTests(APITestCase):
+    def test_iterations_follow_the_setting(self):
+        encoded = hashing.make_password(PASSWORD)
+        self.assertTrue(encoded.startswith("pbkdf2_sha256$1000$"))
+        self.assertTrue(hashing.check_password(PASSWORD, encoded))
+        self.assertFalse(hashing.check_password("wrong", encoded))
+
+    def test_outdated_hash_is_rehashed_on_login(self):
+        user = create_user("alice")
+        with hashing_settings(WORKERS=0, PBKDF2_ITERATIONS=1500):
+            response = self.client.post(
+                "/api/auth/user/login/",
+                {"email": user.user_email, "password": PASSWORD},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.user_password.startswith("pbkdf2_sha256$1500$"))
+
+    def test_wrong_password_is_not_rehashed(self):
+        user = create_user("alice")
+        setter = mock.Mock()
+        with hashing_settings(WORKERS=0, PBKDF2_ITERATIONS=1500):
+            self.assertFalse(hashing.check_password("wrong", user.user_password, setter))
+        setter.assert_not_called()
+
+    def test_full_queue_answers_503(self):
+        create_user("alice")
+        busy = threading.BoundedSemaphore(1)
+        busy.acquire()
+        with hashing_settings(WORKERS=1, QUEUE_TIMEOUT=0), mock.patch.object(
+            hashing, "_get_pool", return_value=(None, busy)
+        ):
+            response = self.client.post(
+                "/api/auth/user/login/",
+                {"email": "alice@example.com", "password": PASSWORD},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 503)
+
+    def test_pool_hashes_in_a_worker_process(self):
+        self.addCleanup(hashing._reset_pool)
+        with hashing_settings(WORKERS=1):
+            encoded = hashing.make_password(PASSWORD)
+            self.assertTrue(hashing.check_password(PASSWORD, encoded))
+        self.assertTrue(encoded.startswith("pbkdf2_sha256$"))
@@ -0,0 +1,76 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import identity
+from api.models import Answer, Comment, UserDetail
+
+from .base import APITestCase, client_for, create_user
+
+
+class IdentityMapTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = create_user("alice"), create_user("bob")
+        self.question = self.ask(client_for(self.alice), "How do I reverse a list")
+        self.answers = [
+            Answer.objects.create(
+                question=self.question, user=user, answer_description="An answer"
+            )
+            for user in (self.alice, self.bob, self.alice, self.bob)
+        ]
+
+    def activate(self):
+        token = identity.activate()
+        self.addCleanup(identity.deactivate, token)
+
+    def test_nothing_is_cached_outside_a_request(self):
+        with self.assertNumQueries(2):
+            first = identity.get(UserDetail, self.alice.id)
+            second = identity.get(UserDetail, self.alice.id)
+        self.assertIsNot(first, second)
+
+    def test_get_loads_each_row_once(self):
+        self.activate()
+        with self.assertNumQueries(1):
+            user = identity.get(UserDetail, self.alice.id)
+            self.assertIs(identity.get(UserDetail, self.alice.id, is_user_deleted=False), user)
+        with self.assertRaises(UserDetail.DoesNotExist):
+            identity.get(UserDetail, self.alice.id, is_user_deleted=True)
+
+    async def test_aget_shares_the_map(self):
+        token = identity.activate()
+        try:
+            user = await identity.aget(UserDetail, self.alice.id)
+            self.assertIs(identity.remember(UserDetail(id=self.alice.id)), user)
+        finally:
+            identity.deactivate(token)
+
+    def test_prime_batches_foreign_keys(self):
+        self.activate()
+        user = identity.get(UserDetail, self.alice.id)
+        answers = list(Answer.objects.filter(question=self.question).order_by("id"))
+        with self.assertNumQueries(1):
+            identity.prime(answers, "user")
+        self.assertIs(answers[0].user, user)
+        self.assertIs(answers[1].user, answers[3].user)
+
+    def test_prime_follows_paths(self):
+        comments = [
+            Comment.objects.create(answer=answer, user=self.bob, comment_content="c")
+            for answer in self.answers
+        ]
+        comments = list(Comment.objects.filter(id__in=[c.id for c in comments]))
+        with self.assertNumQueries(2):
+            identity.prime(comments, "answer__user")
+        self.assertEqual({c.answer.user.username for c in comments}, {"alice", "bob"})
+
+    def test_detail_queries_do_not_grow_with_authors(self):
+        client = client_for(self.alice)
+        url = f"/api/questions/{self.question.id}/"
+        with CaptureQueriesContext(connection) as few:
+            client.get(url)
+        for _ in range(6):
+            Answer.objects.create(question=self.question, user=self.bob, answer_description="x")
+        with CaptureQueriesContext(connection) as many:
+            client.get(url)
+        self.assertEqual(len(many), len(few))
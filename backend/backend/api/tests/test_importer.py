@@ -0,0 +1,196 @@
+import gzip
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.utils import timezone
+
+from api import importer
+from api.importer import BulkImporter, BulkImportError, read_csv, read_dump, read_ndjson
+from api.models import Answer, ImportJob, Notification, Question, Upvote, UserDetail
+
+from .base import APITransactionTestCase, client_for, create_admin, create_user
+
+DUMP = [
+    {"type": "user", "id": "u1", "username": "dave", "user_email": "dave@old.io", "reputation": 5},
+    {"type": "user", "id": "u2", "username": "erin", "user_email": "erin@old.io"},
+    # Same person as u1: mapped onto the same account
+    {"type": "user", "id": "u3", "username": "dave2", "user_email": "dave@old.io"},
+    {
+        "type": "question",
+        "id": "q1",
+        "user_id": "u1",
+        "question_title": "Old question",
+        "question_description": "body",
+        "question_tag": "py",
+        "timestamp": "2015-01-02T03:04:05Z",
+    },
+    {"type": "answer", "id": "a1", "question_id": "q1", "user_id": "u2", "answer_description": "ans"},
+    {"type": "upvote", "id": "v1", "question_id": "q1", "by_user_id": "u2"},
+    {"type": "upvote", "id": "v2", "answer_id": "a1", "by_user_id": "u1"},
+    # Its question is not in the dump
+    {"type": "answer", "id": "a2", "question_id": "qX", "user_id": "u2", "answer_description": "x"},
+]
+
+
+def interrupted(records, after):
+    for position, record in enumerate(records):
+        if position == after:
+            raise RuntimeError("interrupted")
+        yield record
+
+
+class ReaderTests(APITransactionTestCase):
+    def test_malformed_ndjson_lines_become_untyped_records(self):
+        stream = io.StringIO('{"type": "user"}\n{broken\n\n{"type": "answer"}\n')
+        self.assertEqual(list(read_ndjson(stream)), [{"type": "user"}, {}, {"type": "answer"}])
+
+    def test_csv_drops_empty_cells(self):
+        stream = io.StringIO("type,id,user_id\nuser,1,\n")
+        self.assertEqual(list(read_csv(stream)), [{"type": "user", "id": "1"}])
+
+    def test_read_dump_gunzips(self):
+        path = self.tmp_dir / "dump.ndjson.gz"
+        path.write_bytes(gzip.compress(b'{"type": "user", "id": 1}\n'))
+        self.assertEqual(list(read_dump(path)), [{"type": "user", "id": 1}])
+
+    def test_read_dump_rejects_bad_gzip_and_utf8(self):
+        bad_gzip = self.tmp_dir / "dump.ndjson.gz"
+        bad_gzip.write_bytes(b"not gzip")
+        bad_text = self.tmp_dir / "dump.csv"
+        bad_text.write_bytes(b"\xff\xfe{")
+        for path in (bad_gzip, bad_text):
+            with self.assertRaises(BulkImportError):
+                list(read_dump(path))
+
+
+class BulkImporterTests(APITransactionTestCase):
+    def test_import_maps_ids_and_skips_orphans(self):
+        stats = BulkImporter("legacy", batch_size=3).run(iter(DUMP))
+
+        self.assertEqual(stats["users"], 3)
+        self.assertEqual(UserDetail.objects.count(), 2)
+        self.assertEqual(stats["skipped"], 1)
+        question = Question.objects.get()
+        self.assertEqual(question.timestamp.year, 2015)
+        self.assertEqual((question.answer_count, question.upvote_count), (1, 1))
+        self.assertEqual(Answer.objects.get().vote_count, 1)
+        self.assertEqual(Upvote.objects.count(), 2)
+        # The question's author is told about the answer
+        self.assertTrue(Notification.objects.filter(user=question.user).exists())
+
+    def test_interrupted_import_resumes(self):
+        with self.assertRaises(RuntimeError):
+            BulkImporter("legacy", batch_size=3).run(interrupted(DUMP, 4))
+        job = ImportJob.objects.get()
+        self.assertEqual((job.status, job.rows_processed), ("failed", 3))
+
+        stats = BulkImporter("legacy", batch_size=3).run(iter(DUMP))
+        self.assertEqual(stats["resumed_after"], 3)
+        self.assertEqual(Question.objects.count(), 1)
+        self.assertEqual(UserDetail.objects.count(), 2)
+        # The deferred indexes are back
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, "api_question")
+        self.assertIn("question_hot_idx", constraints)
+
+        with self.assertRaises(BulkImportError):
+            BulkImporter("legacy")
+
+    def test_imports_that_stop_reporting_are_failed(self):
+        ImportJob.objects.create(source="legacy", heartbeat_at=timezone.now())
+        with self.assertRaises(BulkImportError):
+            BulkImporter("legacy")
+
+        # The process running it died a while ago
+        ImportJob.objects.update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        stats = BulkImporter("legacy", batch_size=3).run(iter(DUMP))
+        self.assertEqual(stats["rows"], len(DUMP))
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, "done")
+        self.assertIsNotNone(job.heartbeat_at)
+
+    def test_malformed_values_skip_the_row(self):
+        records = [
+            {"type": "user", "id": "u1", "user_email": "a@old.io", "reputation": "lots"},
+            {"type": "user", "id": "u2", "user_email": "b@old.io", "date_joined": "2020-13-45"},
+            {},
+        ]
+        stats = BulkImporter("messy").run(iter(records))
+        self.assertEqual(stats["skipped"], 2)
+        self.assertEqual(list(UserDetail.objects.values_list("user_email", flat=True)), ["b@old.io"])
+
+    def test_command_reports_unreadable_files(self):
+        path = self.tmp_dir / "dump.ndjson.gz"
+        path.write_bytes(b"not gzip")
+        with self.assertRaises(CommandError):
+            call_command("import_corpus", str(path), stdout=io.StringIO())
+
+
+class InlineThread:
+    """Stands in for threading.Thread, running the target on start()."""
+
+    def __init__(self, target, args=(), **kwargs):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
+
+
+class ImportEndpointTests(APITransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = client_for(create_admin("root"))
+
+    def upload(self, name, data, **fields):
+        return self.admin.post(
+            "/api/admin/import/",
+            {"file": SimpleUploadedFile(name, data), **fields},
+            format="multipart",
+        )
+
+    def test_upload_is_imported_outside_the_request(self):
+        dump = "\n".join(json.dumps(record) for record in DUMP).encode()
+        with mock.patch.object(importer.threading, "Thread") as thread:
+            response = self.upload("dump.ndjson.gz", gzip.compress(dump), source="legacy")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["job"]["source"], "legacy")
+        # Nothing was imported by the request itself
+        self.assertFalse(Question.objects.exists())
+        thread.return_value.start.assert_called_once()
+        # Stand in for the thread that never ran
+        thread.call_args.kwargs["args"][1].unlink()
+        importer._running.discard("legacy")
+        with mock.patch.object(importer.threading, "Thread", InlineThread):
+            response = self.upload("dump.ndjson.gz", gzip.compress(dump), source="legacy")
+        self.assertEqual(response.status_code, 202)
+        status = self.admin.get(f"/api/admin/import/{response.data['job']['id']}/").data
+        self.assertEqual((status["status"], status["rows_processed"]), ("done", len(DUMP)))
+        self.assertEqual(Question.objects.count(), 1)
+        # Completed uploads are removed
+        self.assertEqual(list((self.tmp_dir / "imports").iterdir()), [])
+
+        response = self.upload("dump.ndjson", dump, source="legacy")
+        self.assertEqual(response.status_code, 409)
+
+    def test_status_fails_jobs_without_a_heartbeat(self):
+        job = ImportJob.objects.create(
+            source="legacy", heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+        status = self.admin.get(f"/api/admin/import/{job.id}/").data
+        self.assertEqual(status["status"], "failed")
+        self.assertEqual(ImportJob.objects.get().status, "failed")
+
+    def test_unreadable_uploads_are_rejected(self):
+        self.assertEqual(self.upload("dump.ndjson.gz", b"not gzip").status_code, 400)
+        self.assertEqual(self.upload("dump.csv", b"\xff\xfe{").status_code, 400)
+        self.assertEqual(self.upload("dump.txt", b"{}", format="xml").status_code, 400)
+        self.assertFalse(ImportJob.objects.exists())
+
+    def test_users_cannot_import(self):
+        response = client_for(create_user("alice")).post("/api/admin/import/", {})
+        self.assertEqual(response.status_code, 403)
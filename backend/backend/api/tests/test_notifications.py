@@ -0,0 +1,111 @@
+import datetime
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from api import notifications
+from api.models import Notification
+from api.notifications import _bursts, compact_notifications, purge_read_notifications
+
+from .base import APITestCase, client_for, create_user
+
+START = timezone.now() - datetime.timedelta(days=30)
+HOUR = datetime.timedelta(hours=1)
+
+
+def row(hours, user_id=1, question_id=1, is_read=False):
+    return {
+        "user_id": user_id,
+        "question_id": question_id,
+        "is_read": is_read,
+        "timestamp": START + hours * HOUR,
+    }
+
+
+class BurstTests(APITestCase):
+    def test_bursts_split_on_gaps_and_groups(self):
+        rows = [row(0), row(1), row(30), row(31, is_read=True), row(32, question_id=2)]
+        self.assertEqual([len(burst) for burst in _bursts(rows, 24 * HOUR)], [2, 1, 1, 1])
+        self.assertEqual(list(_bursts([], HOUR)), [])
+
+
+class CompactionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = create_user("alice")
+        self.actors = [create_user(f"user{n}") for n in range(3)]
+        self.question = self.ask(client_for(self.alice), "How do I reverse a list")
+
+    def notify(self, hours, actor=None, is_read=False):
+        notification = Notification.objects.create(
+            user=self.alice,
+            question=self.question,
+            mention_by=actor or self.actors[0],
+            is_read=is_read,
+        )
+        Notification.objects.filter(id=notification.id).update(timestamp=START + hours * HOUR)
+        return notification
+
+    def test_bursts_collapse_into_their_newest_row(self):
+        for hours in (0, 1, 2, 3, 50, 51, 100, 101, 102):
+            self.notify(hours)
+        newest = self.notify(103, actor=self.actors[2])
+
+        self.assertEqual(compact_notifications(batch_size=2), 7)
+        self.assertEqual(
+            list(Notification.objects.order_by("timestamp").values_list("event_count", flat=True)),
+            [4, 2, 4],
+        )
+        digest = Notification.objects.get(id=newest.id)
+        self.assertEqual((digest.event_count, digest.mention_by_id), (4, self.actors[2].id))
+        self.assertEqual(compact_notifications(), 0)
+
+        # Later events fold into the existing digest
+        self.notify(104)
+        self.assertEqual(compact_notifications(), 1)
+        self.assertEqual(Notification.objects.order_by("-timestamp")[0].event_count, 5)
+
+    def test_read_state_is_kept_apart(self):
+        self.notify(0, is_read=True)
+        self.notify(1)
+        self.assertEqual(compact_notifications(), 0)
+
+    def test_notifications_read_during_compaction_keep_their_state(self):
+        first = self.notify(0)
+        for hours in (1, 2):
+            self.notify(hours)
+        keyset_rows = notifications._keyset_rows
+
+        def read_while_compacting(rows, batch_size):
+            yield from keyset_rows(rows, batch_size)
+            Notification.objects.filter(id=first.id).update(is_read=True)
+
+        with mock.patch.object(notifications, "_keyset_rows", read_while_compacting):
+            self.assertEqual(compact_notifications(), 0)
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertTrue(Notification.objects.get(id=first.id).is_read)
+
+        # The next run compacts what is left unread
+        self.assertEqual(compact_notifications(), 1)
+
+    def test_purge_only_old_read_notifications(self):
+        self.notify(0, is_read=True)
+        self.notify(1, is_read=True)
+        unread = self.notify(2)
+        recent = self.notify(24 * 29, is_read=True)
+        self.assertEqual(purge_read_notifications(retention_days=7, batch_size=1), 2)
+        self.assertCountEqual(
+            Notification.objects.values_list("id", flat=True), [unread.id, recent.id]
+        )
+
+    def test_feed_renders_digests(self):
+        for hours in (0, 1, 2):
+            self.notify(hours)
+        call_command("compact_notifications", "--no-purge", stdout=io.StringIO())
+
+        data = client_for(self.alice).get("/api/notifications/").data
+        entry = data["results"][0]
+        self.assertEqual((entry["event_count"], entry["is_digest"]), (3, True))
+        self.assertEqual(entry["question_title"], "How do I reverse a list")
@@ -0,0 +1,123 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Answer, Comment
+from api.pagination import COMMENT_PREVIEW_SIZE
+
+from .base import APITestCase, client_for, create_user
+
+
+class AnswerPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+        self.client = client_for(self.user)
+        self.question = self.ask(self.client, "How do I reverse a list")
+        self.answers = [
+            Answer.objects.create(
+                question=self.question,
+                user=self.user,
+                answer_description=f"Answer {n}",
+                vote_count=n % 3,
+            )
+            for n in range(5)
+        ]
+
+    def follow(self, url):
+        ids = []
+        while url:
+            data = self.client.get(url).data
+            ids += [answer["id"] for answer in data["results"]]
+            url = data["next"]
+        return ids
+
+    def test_detail_pages_through_answers(self):
+        url = f"/api/questions/{self.question.id}/?answers_page_size=2"
+        data = self.client.get(url).data
+        self.assertEqual(len(data["answers"]), 2)
+        self.assertIn("answers_cursor=", data["answers_next"])
+
+        ids = []
+        while url:
+            data = self.client.get(url).data
+            ids += [answer["id"] for answer in data["answers"]]
+            url = data["answers_next"]
+        self.assertCountEqual(ids, [answer.id for answer in self.answers])
+
+    def test_answers_endpoint_walks_every_sort(self):
+        base = f"/api/questions/{self.question.id}/answers/list/?answers_page_size=2"
+        by_votes = sorted(self.answers, key=lambda answer: (-answer.vote_count, answer.id))
+        self.assertEqual(self.follow(base), [answer.id for answer in by_votes])
+        newest = [answer.id for answer in reversed(self.answers)]
+        self.assertEqual(self.follow(base + "&answers_sort=newest"), newest)
+        self.assertEqual(self.follow(base + "&answers_sort=oldest"), newest[::-1])
+
+    def test_votes_between_pages_neither_repeat_nor_skip(self):
+        Answer.objects.filter(question=self.question).update(vote_count=0)
+        voter = client_for(create_user("bob"))
+        for answer in self.answers:
+            voter.post("/api/upvote/", {"answer_id": answer.id, "vote": 1}, format="json")
+        url = f"/api/questions/{self.question.id}/answers/list/?answers_page_size=2"
+        data = self.client.get(url).data
+        first_page = [answer["id"] for answer in data["results"]]
+        # The first answer shown drops out of the tie it was read in
+        voter.post("/api/upvote/", {"answer_id": first_page[0], "vote": -1}, format="json")
+
+        rest = self.follow(data["next"])
+        unchanged = [answer.id for answer in self.answers if answer.id != first_page[0]]
+        self.assertEqual(sorted(first_page[1:] + rest[:-1]), unchanged)
+        # Now last, so it is shown again where it moved to
+        self.assertEqual(rest[-1], first_page[0])
+
+    def test_deep_pages_use_the_keyset(self):
+        url = f"/api/questions/{self.question.id}/answers/list/?answers_page_size=2"
+        next_url = self.client.get(url).data["next"]
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(next_url).data
+        self.assertFalse(any("OFFSET" in query["sql"] for query in queries))
+
+        previous = self.client.get(data["previous"]).data
+        self.assertEqual(
+            [answer["id"] for answer in previous["results"]],
+            [answer["id"] for answer in self.client.get(url).data["results"]],
+        )
+        self.assertIsNone(previous["previous"])
+        self.assertEqual(self.client.get(url + "&answers_cursor=cD1h").status_code, 404)
+
+    def test_deleted_answers_and_questions_are_hidden(self):
+        Answer.objects.filter(id=self.answers[0].id).update(answer_deleted=True)
+        ids = self.follow(f"/api/questions/{self.question.id}/answers/list/")
+        self.assertNotIn(self.answers[0].id, ids)
+        self.assertEqual(self.client.get("/api/questions/999999/answers/list/").status_code, 404)
+
+
+class CommentPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+        self.client = client_for(self.user)
+        self.question = self.ask(self.client, "How do I reverse a list")
+        self.answer = self.answer(self.client, self.question)
+        self.comments = [
+            Comment.objects.create(answer=self.answer, user=self.user, comment_content=f"c{n}")
+            for n in range(COMMENT_PREVIEW_SIZE + 2)
+        ]
+
+    def test_detail_embeds_a_preview_and_the_count(self):
+        Comment.objects.filter(id=self.comments[0].id).update(comment_deleted=True)
+        answer = self.client.get(f"/api/questions/{self.question.id}/").data["answers"][0]
+        self.assertEqual(
+            [comment["id"] for comment in answer["comments"]],
+            [comment.id for comment in self.comments[1 : COMMENT_PREVIEW_SIZE + 1]],
+        )
+        self.assertEqual(answer["comment_count"], len(self.comments) - 1)
+
+    def test_comments_endpoint_pages_oldest_first(self):
+        url = f"/api/answers/{self.answer.id}/comments/?page_size=2"
+        ids = []
+        while url:
+            data = self.client.get(url).data
+            ids += [comment["id"] for comment in data["results"]]
+            url = data["next"]
+        self.assertEqual(ids, [comment.id for comment in self.comments])
+        self.assertEqual(self.client.get("/api/answers/999999/comments/").status_code, 404)
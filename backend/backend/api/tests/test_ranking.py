@@ -0,0 +1,119 @@
+import datetime
+
+from django.utils import timezone
+
+from api.models import Question
+from api.ranking import (
+    HOT_SCORE_FLOOR,
+    compute_hot_score,
+    decay_hot_scores,
+    rebuild_question_counters,
+    record_question_activity,
+)
+
+from .base import APITestCase, client_for, create_user
+
+
+class ComputeHotScoreTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+
+    def test_activity_raises_the_score(self):
+        quiet = compute_hot_score(0, 0, 0, self.now, now=self.now)
+        self.assertGreater(compute_hot_score(1, 0, 0, self.now, now=self.now), quiet)
+        self.assertGreater(compute_hot_score(0, 1, 0, self.now, now=self.now), quiet)
+        self.assertGreater(compute_hot_score(0, 0, 1, self.now, now=self.now), quiet)
+
+    def test_score_decays_with_age(self):
+        day_old = self.now - datetime.timedelta(days=1)
+        self.assertLess(
+            compute_hot_score(5, 2, 1, day_old, now=self.now),
+            compute_hot_score(5, 2, 1, self.now, now=self.now),
+        )
+
+    def test_future_timestamps_count_as_new(self):
+        later = self.now + datetime.timedelta(hours=3)
+        self.assertEqual(
+            compute_hot_score(1, 1, 1, later, now=self.now),
+            compute_hot_score(1, 1, 1, self.now, now=self.now),
+        )
+
+
+class HotRankingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice")
+        self.client = client_for(self.user)
+
+    def test_activity_updates_counters_without_lost_updates(self):
+        question = self.ask(self.client, "How do I merge two dicts")
+        # Two requests holding the same stale row
+        first = Question.objects.get(id=question.id)
+        second = Question.objects.get(id=question.id)
+        record_question_activity(first, upvotes=1)
+        record_question_activity(second, upvotes=1, answers=1)
+
+        question.refresh_from_db()
+        self.assertEqual(question.upvote_count, 2)
+        self.assertEqual(question.answer_count, 1)
+        self.assertGreater(question.hot_score, 0)
+
+    def test_counters_never_go_negative(self):
+        question = self.ask(self.client, "How do I merge two dicts")
+        record_question_activity(question, upvotes=-1)
+        question.refresh_from_db()
+        self.assertEqual(question.upvote_count, 0)
+
+    def test_only_posts_and_edits_are_activity(self):
+        question = self.ask(self.client, "How do I merge two dicts")
+        answer = self.answer(self.client, question)
+        long_ago = timezone.now() - datetime.timedelta(days=30)
+
+        def last_activity():
+            return Question.objects.get(id=question.id).last_activity
+
+        Question.objects.filter(id=question.id).update(last_activity=long_ago)
+        bob = client_for(create_user("bob"))
+        bob.post("/api/upvote/", {"question_id": question.id, "vote": 1}, format="json")
+        record_question_activity(question, answers=-1, touch=False)
+        self.assertEqual(last_activity(), long_ago)
+        self.assertEqual((question.upvote_count, question.answer_count), (1, 0))
+
+        for url, data in [
+            (f"/api/questions/{question.id}/update/", {"question_title": "How do I join two dicts"}),
+            (f"/api/answers/{answer.id}/update/", {"answer_description": "dict | dict"}),
+        ]:
+            Question.objects.filter(id=question.id).update(last_activity=long_ago)
+            self.assertEqual(self.client.put(url, data, format="json").status_code, 200)
+            self.assertGreater(last_activity(), long_ago)
+
+    def test_hot_ordering(self):
+        quiet = self.ask(self.client, "A quiet question about lists")
+        busy = self.ask(self.client, "A busy question about tuples")
+        record_question_activity(busy, upvotes=1, answers=1)
+
+        response = self.client.get("/api/questions/?ordering=hot")
+        ids = [row["id"] for row in response.data["results"]]
+        self.assertEqual(ids, [busy.id, quiet.id])
+
+    def test_decay_flattens_old_scores(self):
+        question = self.ask(self.client, "An old question about sets")
+        Question.objects.filter(id=question.id).update(
+            timestamp=timezone.now() - datetime.timedelta(days=3650)
+        )
+        self.assertEqual(decay_hot_scores(), 1)
+        question.refresh_from_db()
+        self.assertEqual(question.hot_score, 0)
+        # Questions at the floor are skipped by later passes
+        self.assertEqual(decay_hot_scores(), 0)
+        self.assertLess(question.hot_score, HOT_SCORE_FLOOR)
+
+    def test_rebuild_repairs_drifted_counters(self):
+        question = self.ask(self.client, "How do I sort a dict by value")
+        self.answer(self.client, question)
+        Question.objects.filter(id=question.id).update(answer_count=7, upvote_count=3)
+
+        rebuild_question_counters()
+        question.refresh_from_db()
+        self.assertEqual((question.answer_count, question.upvote_count), (1, 0))
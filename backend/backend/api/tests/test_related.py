@@ -0,0 +1,63 @@
+import numpy as np
+
+from api.models import Question
+from api.related import _top_k, build_index, related_questions
+
+from .base import APITestCase, client_for, create_user
+
+
+class TopKTests(APITestCase):
+    def test_keeps_the_best_scores_in_order(self):
+        ids = np.array([10, 11, 12, 13])
+        scores = np.array([0.2, 0.9, 0.5, 0.9], dtype=np.float32)
+        top_ids, top_scores = _top_k(ids, scores, 3)
+        # Ties are broken by id
+        self.assertEqual(top_ids.tolist(), [11, 13, 12])
+        self.assertEqual(top_scores.tolist(), sorted(top_scores.tolist(), reverse=True))
+        self.assertEqual(_top_k(ids, scores, 10)[0].tolist(), [11, 13, 12, 10])
+
+
+class RelatedQuestionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(create_user("alice"))
+        self.lists = self.ask(self.client, "Reverse a list in Python", "Items in the opposite order")
+        self.sort = self.ask(self.client, "Sort a list in Python", "Items in ascending order")
+        self.nginx = self.ask(self.client, "Configure nginx", "Serve static files", tag="nginx")
+
+    def related_ids(self, question):
+        return [result["id"] for result in related_questions(question.id)]
+
+    def test_nearest_questions_come_first(self):
+        stats = build_index(batch_size=2)
+        self.assertEqual((stats["indexed"], stats["total"]), (3, 3))
+        self.assertEqual(self.related_ids(self.lists)[0], self.sort.id)
+        self.assertNotIn(self.lists.id, self.related_ids(self.lists))
+        self.assertNotIn(self.lists.id, self.related_ids(self.nginx))
+
+    def test_refresh_indexes_only_new_questions(self):
+        build_index()
+        self.assertEqual(build_index()["version"], None)
+
+        newer = self.ask(self.client, "Configure nginx caching", "Serve static files", tag="nginx")
+        self.assertEqual(related_questions(newer.id), [])
+        stats = build_index()
+        self.assertEqual((stats["indexed"], stats["total"]), (1, 4))
+        # Older questions pick the new one up as a neighbour
+        self.assertEqual(self.related_ids(self.nginx), [newer.id])
+        self.assertEqual(self.related_ids(newer), [self.nginx.id])
+
+        versions = [p for p in (self.tmp_dir / "related").iterdir() if p.is_dir()]
+        self.assertEqual(len(versions), 2)
+
+    def test_deleted_questions_are_not_recommended(self):
+        build_index()
+        Question.objects.filter(id=self.sort.id).update(question_deleted=True)
+        self.assertNotIn(self.sort.id, self.related_ids(self.lists))
+
+    def test_endpoint(self):
+        build_index()
+        response = self.client.get(f"/api/questions/{self.lists.id}/related/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["id"], self.sort.id)
+        self.assertEqual(self.client.get("/api/questions/999999/related/").status_code, 404)
@@ -0,0 +1,97 @@
+from django.test import override_settings
+
+from api import revisions
+from api.models import Question, Revision
+
+from .base import APITestCase, client_for, create_admin, create_user
+
+LONG_TEXT = " ".join(f"word{n}" for n in range(200))
+
+
+class DiffTests(APITestCase):
+    def test_patch_inverts_diff(self):
+        cases = [
+            ("", "abc"),
+            ("abc", ""),
+            ("The quick brown fox", "The slow brown dog!"),
+            ("same text", "same text"),
+            ("héllo  wörld\n", "hello world"),
+        ]
+        for new, old in cases:
+            with self.subTest(new=new, old=old):
+                self.assertEqual(revisions.patch(new, revisions.diff(new, old)), old)
+
+    def test_diff_holds_only_the_changed_spans(self):
+        ops = revisions.diff(LONG_TEXT.replace("word100", "changed"), LONG_TEXT)
+        self.assertEqual(len(ops), 4)
+        self.assertIn("word100", ops)
+        self.assertLess(len(str(ops)), 50)
+
+
+@override_settings(REVISIONS={"SNAPSHOT_INTERVAL": 3})
+class RevisionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(create_user("alice"))
+        self.admin = client_for(create_admin("root"))
+        self.question = self.ask(self.client, "How do I reverse a list", description=LONG_TEXT)
+        self.url = f"/api/admin/revisions/question/{self.question.id}/"
+
+    def edit(self, **data):
+        response = self.client.put(
+            f"/api/questions/{self.question.id}/update/", data, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def make_versions(self, count):
+        for n in range(2, count + 1):
+            self.edit(question_description=LONG_TEXT.replace("word7 ", f"version{n} "))
+
+    def test_edits_store_diffs_and_periodic_snapshots(self):
+        self.edit(question_tag="python")
+        self.assertFalse(Revision.objects.exists())
+
+        self.make_versions(5)
+        stored = Revision.objects.order_by("number")
+        self.assertEqual([r.is_snapshot for r in stored], [False, False, True, False])
+        self.assertEqual(set(stored[0].content), {"question_description"})
+        self.assertLess(stored[0].size, len(LONG_TEXT) // 10)
+        self.assertGreater(stored[2].size, len(LONG_TEXT))
+
+    def test_every_version_is_rebuilt(self):
+        self.make_versions(8)
+        question = Question.objects.get(id=self.question.id)
+        self.assertEqual(revisions.version(question, 1)["question_description"], LONG_TEXT)
+        for n in range(2, 9):
+            content = revisions.version(question, n)
+            self.assertIn(f"version{n} ", content["question_description"])
+        with self.assertRaises(Revision.DoesNotExist):
+            revisions.version(question, 9)
+
+    def test_history_endpoints(self):
+        self.make_versions(4)
+        data = self.admin.get(self.url + "?limit=2").data
+        self.assertEqual(data["current_version"], 4)
+        self.assertEqual([r["number"] for r in data["results"]], [3, 2])
+        data = self.admin.get(self.url + f"?before={data['next']}").data
+        self.assertEqual([r["number"] for r in data["results"]], [1])
+
+        content = self.admin.get(self.url + "1/").data["content"]
+        self.assertEqual(content["question_description"], LONG_TEXT)
+        self.assertEqual(self.admin.get(self.url + "9/").status_code, 404)
+        self.assertEqual(self.admin.get(self.url + "?limit=x").status_code, 400)
+        self.assertEqual(self.admin.get("/api/admin/revisions/user/1/").status_code, 404)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_revert_is_an_edit(self):
+        self.make_versions(3)
+        response = self.admin.post(self.url + "1/revert/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["current_version"], 4)
+        question = Question.objects.get(id=self.question.id)
+        self.assertEqual(question.question_description, LONG_TEXT)
+        self.assertIn("version3 ", revisions.version(question, 3)["question_description"])
+
+        self.assertEqual(self.admin.post(self.url + "9/revert/").status_code, 404)
+        Question.objects.filter(id=question.id).update(question_deleted=True)
+        self.assertEqual(self.admin.post(self.url + "1/revert/").status_code, 409)
@@ -0,0 +1,129 @@
+import io
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+
+from api import sharding
+from api.models import Answer, Question, QuestionPlacement
+
+from .base import APITestCase, client_for, create_user
+
+SHARDING = {
+    "SHARDS": ["default", "shard1"],
+    "GLOBAL_DATABASE": "default",
+    "PLACEMENT_SHARDS": None,
+}
+
+
+@override_settings(SHARDING=SHARDING)
+class ShardingTests(APITestCase):
+    databases = {"default", "shard1"}
+
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(create_user("alice"))
+
+    def ask_on(self, alias, title):
+        """Post a question placed on shard alias and return its id."""
+        with mock.patch.object(sharding, "place_question", return_value=alias):
+            response = self.client.post(
+                "/api/questions/ask/",
+                {
+                    "question_title": title,
+                    "question_description": "A question body long enough to index",
+                    "question_tag": "python",
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["question_id"]
+
+    def test_ids_name_their_shard(self):
+        first = sharding.allocate_ids(Question, "shard1", 3)
+        self.assertEqual([sharding.slot_shard(i) for i in first], ["shard1"] * 3)
+        self.assertEqual(first, sorted(first))
+        self.assertGreater(sharding.allocate_ids(Question, "shard1")[0], first[-1])
+        (other,) = sharding.allocate_ids(Question, "default")
+        self.assertEqual(sharding.slot_shard(other), "default")
+
+    def test_queries_need_a_shard(self):
+        with self.assertRaises(sharding.ShardNotSelected):
+            Question.objects.count()
+        with sharding.use_shard("shard1"):
+            self.assertEqual(Question.objects.count(), 0)
+
+    def test_rows_are_created_next_to_their_question(self):
+        question_id = self.ask_on("shard1", "How do I reverse a list")
+        self.assertEqual(Question.objects.using("shard1").filter(id=question_id).count(), 1)
+        self.assertFalse(Question.objects.using("default").filter(id=question_id).exists())
+
+        response = self.client.post(
+            f"/api/questions/{question_id}/answers/",
+            {"answer_description": "reversed()"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        answer_id = response.data["answer"]["id"]
+        self.assertTrue(Answer.objects.using("shard1").filter(id=answer_id).exists())
+
+        data = self.client.get(f"/api/questions/{question_id}/").data
+        self.assertEqual(data["question_title"], "How do I reverse a list")
+        self.assertEqual(len(data["answers"]), 1)
+
+    def test_scatter_gather_merges_in_order(self):
+        placements = ["default", "shard1", "shard1", "default", "shard1"]
+        ids = [self.ask_on(alias, f"Question number {n}") for n, alias in enumerate(placements)]
+        rows = sharding.scatter(Question.objects.order_by("-id"))
+        self.assertEqual([q.id for q in rows], sorted(ids, reverse=True))
+        self.assertEqual([q.id for q in rows[1:3]], sorted(ids, reverse=True)[1:3])
+        self.assertEqual(rows.count(), 5)
+        titles = sharding.scatter(Question.objects.order_by("question_title")).values_list(
+            "question_title", flat=True
+        )
+        self.assertEqual(list(titles[:2]), ["Question number 0", "Question number 1"])
+
+        data = self.client.get("/api/questions/").data
+        self.assertEqual(data["count"], 5)
+
+    def test_move_question_keeps_ids(self):
+        question_id = self.ask_on("default", "How do I reverse a list")
+        self.client.post(
+            f"/api/questions/{question_id}/answers/",
+            {"answer_description": "reversed()"},
+            format="json",
+        )
+        self.assertGreaterEqual(sharding.move_question(question_id, "shard1"), 2)
+        self.assertEqual(sharding.move_question(question_id, "shard1"), 0)
+
+        self.assertEqual(sharding.question_shard(question_id), "shard1")
+        self.assertEqual(QuestionPlacement.objects.get(question_id=question_id).shard, "shard1")
+        self.assertFalse(Question.objects.using("default").filter(id=question_id).exists())
+        self.assertFalse(Answer.objects.using("default").exists())
+        data = self.client.get(f"/api/questions/{question_id}/").data
+        self.assertEqual([a["answer_description"] for a in data["answers"]], ["reversed()"])
+
+    def shard_counts(self):
+        return [Question.objects.using(alias).count() for alias in sharding.shards()]
+
+    def test_rebalance(self):
+        for n in range(5):
+            self.ask_on("default", f"Question number {n}")
+        out = io.StringIO()
+        call_command("rebalance_shards", "--dry-run", stdout=out)
+        self.assertIn("Would move 2 questions", out.getvalue())
+        self.assertEqual(self.shard_counts(), [5, 0])
+
+        call_command("rebalance_shards", stdout=out)
+        self.assertEqual(self.shard_counts(), [3, 2])
+        self.assertEqual(self.client.get("/api/questions/").data["count"], 5)
+
+        call_command("rebalance_shards", "--drain", "default", stdout=out)
+        self.assertEqual(self.shard_counts(), [0, 5])
+        with self.assertRaises(CommandError):
+            call_command("rebalance_shards", "--drain", "shard9", stdout=out)
+
+    @override_settings(SHARDING={"SHARDS": ["default"]})
+    def test_rebalance_needs_shards(self):
+        with self.assertRaises(CommandError):
+            call_command("rebalance_shards", stdout=io.StringIO())
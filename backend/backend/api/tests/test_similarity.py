@@ -0,0 +1,104 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Question, QuestionBucket, QuestionSignature
+from api.similarity import (
+    BANDS,
+    NUM_PERMUTATIONS,
+    estimate_similarity,
+    find_similar,
+    minhash,
+    pack,
+    rebuild_index,
+    remove_question,
+    shingles,
+    unpack,
+)
+
+from .base import APITestCase, client_for, create_user
+
+TITLE = "How do I reverse a list in Python"
+DESCRIPTION = "I have a list of numbers and want the items in the opposite order"
+
+
+class MinHashTests(APITestCase):
+    def test_shingles_are_lowercased_word_bigrams(self):
+        self.assertEqual(shingles("Reverse a LIST"), {"reverse a", "a list"})
+        self.assertEqual(shingles("Python"), {"python"})
+        self.assertEqual(shingles("  "), set())
+
+    def test_signatures_estimate_jaccard_similarity(self):
+        signature = minhash(TITLE)
+        self.assertEqual(len(signature), NUM_PERMUTATIONS)
+        self.assertEqual(minhash(TITLE.upper()), signature)
+        self.assertEqual(unpack(pack(signature)), tuple(signature))
+        self.assertIsNone(minhash("?!"))
+
+        self.assertEqual(estimate_similarity(signature, signature), 1.0)
+        close = estimate_similarity(signature, minhash(TITLE + " 3"))
+        far = estimate_similarity(signature, minhash("Configure nginx as a reverse proxy"))
+        self.assertGreater(close, 0.6)
+        self.assertLess(far, 0.2)
+
+
+class SimilarQuestionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(create_user("alice"))
+        self.question = self.ask(self.client, TITLE, DESCRIPTION)
+        self.other = self.ask(self.client, "Configure nginx as a reverse proxy", "For a Django app")
+
+    def test_questions_are_indexed_on_create(self):
+        self.assertEqual(QuestionSignature.objects.count(), 2)
+        # One bucket per band for the title signature and for the text signature
+        self.assertEqual(
+            QuestionBucket.objects.filter(question=self.question).count(), 2 * BANDS
+        )
+
+    def test_reasked_question_is_flagged(self):
+        response = self.client.post(
+            "/api/questions/ask/",
+            {
+                "question_title": TITLE + "?",
+                "question_description": DESCRIPTION,
+                "question_tag": "python",
+            },
+            format="json",
+        )
+        similar = response.data["similar_questions"]
+        self.assertEqual([result["id"] for result in similar], [self.question.id])
+        self.assertEqual(similar[0]["similarity"], 1.0)
+
+    def test_similar_endpoint_checks_titles(self):
+        response = self.client.get("/api/questions/similar/", {"title": "reverse a list in python"})
+        self.assertEqual([result["id"] for result in response.data["results"]], [self.question.id])
+        self.assertEqual(self.client.get("/api/questions/similar/").status_code, 400)
+
+    def test_lookup_does_not_scan_questions(self):
+        with CaptureQueriesContext(connection) as queries:
+            find_similar(TITLE)
+        self.assertEqual(len(queries), 1)
+        self.assertIn("api_questionbucket", queries[0]["sql"])
+
+    def test_index_follows_edits_and_removals(self):
+        response = self.client.put(
+            f"/api/questions/{self.question.id}/update/",
+            {"question_title": "Why is my Flask app slow"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(find_similar(TITLE), [])
+        self.assertEqual([r["id"] for r in find_similar("Why is my Flask app slow")], [self.question.id])
+
+        remove_question(self.other.id)
+        self.assertFalse(QuestionSignature.objects.filter(question=self.other).exists())
+        self.assertEqual(find_similar("Configure nginx as a reverse proxy"), [])
+
+    def test_rebuild_drops_deleted_questions(self):
+        Question.objects.filter(id=self.other.id).update(question_deleted=True)
+        QuestionSignature.objects.filter(question=self.question).delete()
+        self.assertEqual(rebuild_index(batch_size=1), 1)
+        self.assertEqual(
+            list(QuestionSignature.objects.values_list("question_id", flat=True)),
+            [self.question.id],
+        )
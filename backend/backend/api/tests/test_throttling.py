@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from api.middleware import LoadSheddingMiddleware
+from api.throttling import WriteThrottle, parse_rate
+
+from .base import PASSWORD, APITestCase, create_user
+
+
+def throttle_rates(**rates):
+    current = settings.REST_FRAMEWORK
+    return override_settings(
+        REST_FRAMEWORK={
+            **current,
+            "DEFAULT_THROTTLE_RATES": {**current["DEFAULT_THROTTLE_RATES"], **rates},
+        }
+    )
+
+
+class TokenBucketTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+
+    def request_as(self, user=None, ip="10.0.0.1"):
+        request = self.factory.post("/", REMOTE_ADDR=ip)
+        request.user = user
+        return request
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/min"), (10, 10 / 60))
+        self.assertEqual(parse_rate("3/s"), (3, 3))
+
+    def test_bucket_allows_a_burst_then_refills(self):
+        with throttle_rates(write="2/min"), mock.patch("api.throttling.time.time") as clock:
+            clock.return_value = 1000.0
+            throttle = WriteThrottle()
+            request = self.request_as()
+            self.assertTrue(throttle.allow_request(request, None))
+            self.assertTrue(throttle.allow_request(request, None))
+            self.assertFalse(throttle.allow_request(request, None))
+            self.assertAlmostEqual(throttle.wait(), 30)
+
+            # One token back after half a minute
+            clock.return_value = 1030.0
+            self.assertTrue(throttle.allow_request(request, None))
+            self.assertFalse(throttle.allow_request(request, None))
+
+    def test_clients_have_separate_buckets(self):
+        alice, bob = create_user("alice"), create_user("bob")
+        with throttle_rates(write="1/min"):
+            throttle = WriteThrottle()
+            self.assertTrue(throttle.allow_request(self.request_as(alice), None))
+            self.assertFalse(throttle.allow_request(self.request_as(alice, ip="10.0.0.2"), None))
+            self.assertTrue(throttle.allow_request(self.request_as(bob), None))
+            self.assertTrue(throttle.allow_request(self.request_as(ip="10.0.0.3"), None))
+            self.assertFalse(throttle.allow_request(self.request_as(ip="10.0.0.3"), None))
+
+    def test_login_is_throttled(self):
+        create_user("alice")
+        credentials = {"email": "alice@example.com", "password": PASSWORD}
+        with throttle_rates(auth="2/min"):
+            for _ in range(2):
+                response = self.client.post("/api/auth/user/login/", credentials, format="json")
+                self.assertEqual(response.status_code, 200)
+            response = self.client.post("/api/auth/user/login/", credentials, format="json")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+
+class LoadSheddingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        with override_settings(
+            LOAD_SHEDDING={"MAX_IN_FLIGHT": 3, "MAX_PENDING_WRITES": 1, "RETRY_AFTER": 7}
+        ):
+            self.middleware = LoadSheddingMiddleware(lambda request: HttpResponse("ok"))
+
+    def test_writes_are_shed_before_reads(self):
+        self.middleware.in_flight = self.middleware.writes_in_flight = 1
+
+        response = self.middleware(self.factory.post("/api/upvote/"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertEqual(self.middleware(self.factory.get("/api/questions/")).status_code, 200)
+
+    def test_everything_is_shed_past_the_in_flight_limit(self):
+        self.middleware.in_flight = 3
+        self.assertEqual(self.middleware(self.factory.get("/api/questions/")).status_code, 503)
+
+    def test_slots_are_released(self):
+        self.middleware(self.factory.post("/api/upvote/"))
+        self.middleware(self.factory.get("/api/questions/"))
+        self.assertEqual((self.middleware.in_flight, self.middleware.writes_in_flight), (0, 0))
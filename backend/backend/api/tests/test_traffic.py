@@ -0,0 +1,177 @@
+import io
+import json
+import os
+from unittest import mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, override_settings
+
+from api import traffic
+from api.middleware import TrafficCaptureMiddleware
+
+from .base import APITestCase, access_token, client_for, create_admin, create_user
+
+
+class AnonymizationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+
+    def test_anonymize_keeps_shape_and_sizes(self):
+        value = {"title": "abc", "tags": ["py", 3], "n": None, "ok": True}
+        self.assertEqual(
+            traffic.anonymize(value), {"title": "xxx", "tags": ["xx", 3], "n": None, "ok": True}
+        )
+
+    def test_query_string_hides_only_free_text(self):
+        request = self.factory.get(
+            "/api/questions/?search=secret%20words&ordering=-hot_score&page=2&compact=true&q="
+        )
+        self.assertEqual(
+            traffic.query_string(request),
+            "search=xxxxxxxxxxxx&ordering=-hot_score&page=2&compact=true&q=",
+        )
+
+    def test_request_body(self):
+        post = self.factory.post
+        request = post("/", {"email": "a@b.c", "id": 7}, content_type="application/json")
+        self.assertEqual(traffic.request_body(request), {"email": "xxxxx", "id": 7})
+        self.assertIsNone(traffic.request_body(post("/", "{oops", content_type="application/json")))
+        self.assertIsNone(traffic.request_body(post("/", {"email": "a@b.c"})))
+        big = json.dumps({"text": "x" * traffic.MAX_BODY_BYTES})
+        self.assertIsNone(traffic.request_body(post("/", big, content_type="application/json")))
+
+    def test_auth_subject_round_trip(self):
+        user, admin = create_user("alice"), create_admin("root")
+        for account, subject in ((user, f"user:{user.id}"), (admin, f"admin:{admin.id}")):
+            request = self.factory.get("/", HTTP_AUTHORIZATION=f"Bearer {access_token(account)}")
+            self.assertEqual(traffic.auth_subject(request), subject)
+        request = self.factory.get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {traffic.subject_token(f'user:{user.id}')}"
+        )
+        self.assertEqual(traffic.auth_subject(request), f"user:{user.id}")
+        request = self.factory.get("/", HTTP_AUTHORIZATION="Bearer x")
+        self.assertIsNone(traffic.auth_subject(request))
+
+
+class CaptureTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.log_dir = self.tmp_dir / "traffic"
+        self.addCleanup(traffic._writer.update, pid=None, logger=None)
+        traffic._writer.update(pid=None, logger=None)
+
+    def test_capture_is_off_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            TrafficCaptureMiddleware(lambda request: None)
+
+    def test_sampled_requests_are_logged(self):
+        user = create_user("alice")
+        question = self.ask(client_for(user), "How do I reverse a list")
+        capture = override_settings(
+            TRAFFIC_CAPTURE={"ENABLED": True, "SAMPLE_RATE": 1, "LOG_DIR": self.log_dir}
+        )
+        with capture:
+            client_for(user).get(f"/api/questions/{question.id}/", {"answers_sort": "votes"})
+            client_for().get("/not-api/")
+        for handler in traffic._writer["logger"].handlers:
+            handler.close()
+
+        (entry,) = traffic.read_log([self.log_dir / f"traffic-{os.getpid()}.ndjson"])
+        self.assertEqual(entry["r"], "api/questions/<int:question_id>/")
+        self.assertEqual(entry["p"], f"/api/questions/{question.id}/")
+        self.assertEqual(
+            (entry["q"], entry["s"], entry["st"]), ("answers_sort=votes", f"user:{user.id}", 200)
+        )
+
+    def test_replay_repeats_ordered_cursor_pages(self):
+        user = create_user("alice")
+        client = client_for(user)
+        question = self.ask(client, "How do I reverse a list")
+        for n in range(3):
+            self.answer(client, question, f"Answer {n}")
+        url = f"/api/questions/{question.id}/?answers_sort=votes&answers_page_size=1&compact=true"
+        with override_settings(
+            TRAFFIC_CAPTURE={"ENABLED": True, "SAMPLE_RATE": 1, "LOG_DIR": self.log_dir}
+        ):
+            # A fresh client loads the middleware with capture on
+            capturing = client_for(user)
+            next_url = capturing.get(url).data["answers_next"]
+            second = capturing.get(next_url)
+        for handler in traffic._writer["logger"].handlers:
+            handler.close()
+
+        urls = []
+
+        def request(session, method, url, **kwargs):
+            urls.append(url)
+            return mock.Mock(status_code=200)
+
+        with mock.patch("requests.Session.request", request):
+            call_command(
+                "replay_traffic", str(self.log_dir / f"traffic-{os.getpid()}.ndjson"),
+                "--target", "only=http://testserver", "--speed", "0", stdout=io.StringIO(),
+            )
+        self.assertEqual(urls[1], next_url)
+        replayed = client.get(urls[1].removeprefix("http://testserver"))
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(len(second.data["answers"]), 1)
+        self.assertEqual(replayed.data["answers"], second.data["answers"])
+
+
+def entry(t, method, route, q="", b=None, s=None):
+    return {"t": t, "m": method, "r": route, "p": f"/{route}", "q": q, "b": b, "s": s}
+
+
+class ReplayTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.log = self.tmp_dir / "traffic-1.ndjson"
+        entries = [
+            entry(2.0, "GET", "api/questions/"),
+            entry(1.0, "GET", "api/feed/", q="limit=5", s="user:1"),
+            entry(3.0, "POST", "api/upvote/", b={}, s="user:1"),
+        ]
+        self.log.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    def replay(self, *args, statuses=None):
+        calls = []
+
+        def request(session, method, url, **kwargs):
+            calls.append((method, url, kwargs["headers"]))
+            response = mock.Mock()
+            response.status_code = (statuses or {}).get(url.split("/")[2], 200)
+            return response
+
+        report = self.tmp_dir / "report.json"
+        with mock.patch("requests.Session.request", request):
+            call_command(
+                "replay_traffic", str(self.log), "--speed", "0", "--json", str(report),
+                *args, stdout=io.StringIO(),
+            )
+        return calls, json.loads(report.read_text())
+
+    def test_reads_are_replayed_against_both_targets(self):
+        calls, report = self.replay(
+            "--target", "before=http://old:1", "--target", "after=http://new:2",
+            statuses={"new:2": 500},
+        )
+        self.assertEqual(len(calls), 4)
+        self.assertNotIn("POST", {method for method, _, _ in calls})
+        self.assertIn("http://old:1/api/feed/?limit=5", {url for _, url, _ in calls})
+        feed_headers = [headers for _, url, headers in calls if "feed" in url]
+        self.assertTrue(all(h["Authorization"].startswith("Bearer ") for h in feed_headers))
+        self.assertEqual([row["route"] for row in report], ["api/feed/", "api/questions/"])
+        self.assertEqual(report[0]["status_mismatches"], 1)
+        self.assertEqual(report[0]["before"]["count"], 1)
+
+    def test_writes_are_opt_in(self):
+        calls, _ = self.replay("--target", "only=http://old:1", "--writes")
+        self.assertIn("POST", {method for method, _, _ in calls})
+
+    def test_bad_arguments(self):
+        with self.assertRaises(CommandError):
+            self.replay("--target", "nameless")
+        with self.assertRaises(CommandError):
+            self.replay("--target", "a=http://a", "--limit", "0")
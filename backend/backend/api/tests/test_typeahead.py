@@ -0,0 +1,110 @@
+import shutil
+
+from api import typeahead
+from api.typeahead import POINTER_NAME, SNAPSHOT_NAME, TypeaheadIndex
+
+from .base import APITestCase, client_for, create_user
+
+
+def forget_index():
+    """Start over like a freshly started worker."""
+    typeahead._state.update(index=TypeaheadIndex(), snapshot=None, journal=None, offset=0)
+
+
+def titles(result):
+    return [question["question_title"] for question in result["questions"]]
+
+
+class TypeaheadIndexTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.index = TypeaheadIndex(
+            [
+                (1, "How to reverse a list", "python", 1),
+                (2, "Reverse proxy with nginx", "nginx, ops", 5),
+                (3, "Sort a list of dicts", "python", 3),
+            ]
+        )
+
+    def test_titles_match_from_any_word(self):
+        questions, _ = self.index.suggest("REVERSE", 8)
+        # Most popular first
+        self.assertEqual([question["id"] for question in questions], [2, 1])
+        questions, _ = self.index.suggest("a list", 8)
+        self.assertEqual([question["id"] for question in questions], [3, 1])
+        self.assertEqual(self.index.suggest("lists", 8)[0], [])
+
+    def test_tags_are_counted(self):
+        _, tags = self.index.suggest("py", 8)
+        self.assertEqual(tags, [{"tag": "python", "count": 2}])
+        self.assertEqual(self.index.suggest("op", 8)[1], [{"tag": "ops", "count": 1}])
+
+    def test_edits_and_removals(self):
+        self.index.add(1, "How to flatten a list", "python", 1)
+        self.assertEqual(self.index.suggest("reverse", 8)[0][0]["id"], 2)
+        self.index.remove(3)
+        self.index.remove(1)
+        self.assertEqual(self.index.suggest("py", 8), ([], []))
+        self.assertEqual(self.index.title_keys, sorted(self.index.title_keys))
+
+
+class TypeaheadJournalTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.index_dir = self.tmp_dir / "typeahead"
+        self.client = client_for(create_user("alice"))
+
+    def test_first_write_starts_the_journal(self):
+        self.ask(self.client, "How to reverse a list")
+        self.assertTrue((self.index_dir / SNAPSHOT_NAME).exists())
+        journal = (self.index_dir / POINTER_NAME).read_text()
+        self.assertEqual(len((self.index_dir / journal).read_text().splitlines()), 1)
+        self.assertEqual(titles(typeahead.suggest("reverse")), ["How to reverse a list"])
+
+    def test_first_lookup_builds_from_the_database(self):
+        self.ask(self.client, "How to reverse a list")
+        self.ask(self.client, "Reverse proxy with nginx")
+        shutil.rmtree(self.index_dir)
+        forget_index()
+
+        with self.assertLogs("api.typeahead", "WARNING"):
+            self.assertEqual(len(titles(typeahead.suggest("reverse"))), 2)
+        self.ask(self.client, "Reverse a string")
+        self.assertEqual(len(titles(typeahead.suggest("reverse"))), 3)
+
+    def test_workers_replay_each_others_writes(self):
+        question = self.ask(self.client, "How to reverse a list")
+        self.assertEqual(titles(typeahead.suggest("reverse")), ["How to reverse a list"])
+
+        forget_index()
+        typeahead.remove_question(question.id)
+        self.ask(self.client, "Reverse proxy with nginx")
+        self.assertEqual(titles(typeahead.suggest("reverse")), ["Reverse proxy with nginx"])
+
+    def test_snapshot_replaces_the_journal(self):
+        self.ask(self.client, "How to reverse a list")
+        old_journal = (self.index_dir / POINTER_NAME).read_text()
+        self.assertEqual(typeahead.build_snapshot(), 1)
+        self.assertFalse((self.index_dir / old_journal).exists())
+
+        self.ask(self.client, "Reverse proxy with nginx")
+        forget_index()
+        self.assertEqual(len(titles(typeahead.suggest("reverse"))), 2)
+
+    def test_endpoint_does_not_query_the_database(self):
+        self.ask(self.client, "How to reverse a list")
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/questions/suggest/", {"q": "rev"})
+        self.assertEqual(titles(response.data), ["How to reverse a list"])
+        self.assertEqual(self.client.get("/api/questions/suggest/", {"q": "r"}).data["questions"], [])
+
+    def test_deleted_accounts_leave_the_index(self):
+        bob = create_user("bob")
+        bob_client = client_for(bob)
+        self.ask(bob_client, "How to reverse a list")
+        self.answer(bob_client, self.ask(self.client, "Reverse proxy with nginx"))
+        self.assertEqual(bob_client.delete("/api/auth/user/delete/").status_code, 200)
+
+        self.assertEqual(titles(typeahead.suggest("reverse")), ["Reverse proxy with nginx"])
+        bob.refresh_from_db()
+        self.assertEqual((bob.question_count, bob.answer_count), (0, 0))
@@ -0,0 +1,56 @@
+from django.db.models.functions import Lower
+
+from api.models import UserDetail
+from api.utils import prefix_q, resolve_mentions
+
+from .base import APITestCase, client_for, create_admin, create_user
+
+
+class UserSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = create_user("alice", reputation=5)
+        self.alan = create_user("Alan", reputation=9)
+        self.ali = create_user("ali", reputation=5)
+        self.bob = create_user("bob", reputation=50, user_email="al@example.org")
+        create_user("alex", reputation=99, is_user_deleted=True)
+        self.client = client_for(self.alice)
+
+    def search(self, url, client=None):
+        ids = []
+        while url:
+            data = (client or self.client).get(url).data
+            ids += [user["id"] for user in data["results"]]
+            url = data["next"]
+        return ids
+
+    def test_prefix_matches_by_reputation(self):
+        self.assertEqual(
+            self.search("/api/users/search/?q=@AL&limit=1"),
+            [self.alan.id, self.alice.id, self.ali.id],
+        )
+        response = self.client.get("/api/users/search/?q=ali")
+        self.assertNotIn("user_email", response.data["results"][0])
+
+    def test_bad_cursor(self):
+        self.assertEqual(self.client.get("/api/users/search/?after=nope").status_code, 404)
+
+    def test_admins_also_match_emails(self):
+        admin = client_for(create_admin("root"))
+        self.assertEqual(
+            self.search("/api/auth/admin/users/search/?q=al", admin),
+            [self.bob.id, self.alan.id, self.alice.id, self.ali.id],
+        )
+        self.assertEqual(self.client.get("/api/auth/admin/users/search/?q=al").status_code, 403)
+
+    def test_prefix_range_uses_the_lower_index(self):
+        queryset = UserDetail.objects.alias(username_lower=Lower("username")).filter(
+            prefix_q("username", "Al")
+        )
+        self.assertCountEqual(
+            queryset.values_list("username", flat=True), ["alice", "Alan", "ali", "alex"]
+        )
+        self.assertIn("userdetail_username_lower_idx", queryset.explain())
+
+    def test_mentions_resolve_to_live_users(self):
+        self.assertEqual(resolve_mentions({"alice", "alex", "nobody"}), {"alice": self.alice.id})
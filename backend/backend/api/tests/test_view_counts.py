@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api import view_counts
+from api.models import Question
+from api.serializers import QuestionCreateSerializer
+
+from .base import APITestCase, client_for, create_user
+
+
+class ViewCountTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = create_user("alice")
+        self.client = client_for(self.alice)
+        self.questions = [self.ask(self.client, f"Question number {n}") for n in range(3)]
+
+    def view_counts(self):
+        return [
+            Question.objects.get(id=question.id).view_count for question in self.questions
+        ]
+
+    def test_viewer_key(self):
+        factory = RequestFactory()
+        request = factory.get("/", HTTP_X_FORWARDED_FOR="1.2.3.4, 10.0.0.1")
+        self.assertEqual(view_counts.viewer_key(request), "ip:1.2.3.4")
+        self.assertEqual(view_counts.viewer_key(factory.get("/")), "ip:127.0.0.1")
+        self.assertEqual(view_counts.viewer_key(request, self.alice), f"user:{self.alice.id}")
+
+    def test_repeat_views_are_ignored_within_the_window(self):
+        question_id = self.questions[0].id
+        self.assertTrue(view_counts.record_view(question_id, "ip:1"))
+        self.assertFalse(view_counts.record_view(question_id, "ip:1"))
+        self.assertTrue(view_counts.record_view(question_id, "ip:2"))
+        self.assertTrue(view_counts.record_view(question_id))
+        self.assertEqual(view_counts.pending_views(question_id), 3)
+
+        with override_settings(VIEW_COUNTS={"DEDUPE_WINDOW": 0}):
+            self.assertTrue(view_counts.record_view(question_id, "ip:1"))
+
+    def test_flush_writes_one_update_per_distinct_count(self):
+        for question, views in zip(self.questions, (2, 2, 5)):
+            for _ in range(views):
+                view_counts.record_view(question.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(view_counts.flush(), 9)
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.view_counts(), [2, 2, 5])
+        self.assertEqual(view_counts.flush(), 0)
+
+    def test_failed_flush_keeps_the_views(self):
+        view_counts.record_view(self.questions[0].id)
+        with mock.patch.object(Question.objects, "filter", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                view_counts.flush()
+        self.assertEqual(view_counts.pending_views(self.questions[0].id), 1)
+        self.assertEqual(view_counts.flush(), 1)
+
+    def test_full_buffer_wakes_the_flusher(self):
+        with override_settings(VIEW_COUNTS={"MAX_PENDING": 2}), mock.patch.object(
+            view_counts, "_wake"
+        ) as wake:
+            view_counts.record_view(self.questions[0].id)
+            wake.set.assert_not_called()
+            view_counts.record_view(self.questions[1].id)
+            wake.set.assert_called_once()
+
+    def test_detail_view_is_counted_once_per_viewer(self):
+        url = f"/api/questions/{self.questions[0].id}/"
+        self.client.get(url)
+        self.client.get(url)
+        client_for().get(url)
+        view_counts.flush()
+        self.assertEqual(self.view_counts()[0], 2)
+
+    def test_edits_keep_flushed_views(self):
+        stale = Question.objects.get(id=self.questions[0].id)
+        for viewer in ("ip:1", "ip:2"):
+            view_counts.record_view(stale.id, viewer)
+        view_counts.flush()
+
+        serializer = QuestionCreateSerializer(
+            stale, data={"question_title": "A better title"}, partial=True
+        )
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertEqual(self.view_counts()[0], 2)
+
+        response = self.client.put(
+            f"/api/questions/{stale.id}/update/", {"question_tag": "lists"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.view_counts()[0], 2)
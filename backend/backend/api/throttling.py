@@ -0,0 +1,90 @@
+"""
+Token-bucket throttles for the write and auth endpoints.
+
+Each scope's rate comes from REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] as
+"<tokens>/<period>": the bucket holds up to <tokens> requests and refills at
+<tokens> per <period>, so short bursts are allowed while the sustained rate
+stays capped. Buckets live in the "throttle" cache, a file-based cache shared
+by every worker on the host.
+"""
+import math
+import time
+
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .models import Admin, UserDetail
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """Parse "<tokens>/<period>" into (capacity, tokens refilled per second)."""
+    tokens, period = rate.split("/")
+    capacity = int(tokens)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle requests per client with a token bucket. Clients are keyed by
+    the user or admin id from their token, or by IP address when anonymous.
+    """
+
+    scope = None
+    cache_alias = "throttle"
+
+    def __init__(self):
+        self.capacity, self.refill_rate = parse_rate(
+            api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        )
+        self.wait_seconds = None
+
+    def get_cache_key(self, request, view):
+        user = getattr(request, "user", None)
+        if isinstance(user, UserDetail):
+            ident = f"user:{user.id}"
+        elif isinstance(user, Admin):
+            ident = f"admin:{user.id}"
+        else:
+            ident = f"ip:{self.get_ident(request)}"
+        return f"throttle:{self.scope}:{ident}"
+
+    def allow_request(self, request, view):
+        cache = caches[self.cache_alias]
+        key = self.get_cache_key(request, view)
+        now = time.time()
+
+        # Read-modify-write is not atomic across workers; concurrent requests
+        # can overshoot the limit by a few requests, which is acceptable here.
+        tokens, updated = cache.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+        timeout = math.ceil(self.capacity / self.refill_rate)
+
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) / self.refill_rate
+            cache.set(key, (tokens, now), timeout)
+            return False
+
+        cache.set(key, (tokens - 1, now), timeout)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AuthThrottle(TokenBucketThrottle):
+    """Login and registration (password hashing is CPU-bound)."""
+
+    scope = "auth"
+
+
+class VoteThrottle(TokenBucketThrottle):
+    scope = "vote"
+
+
+class WriteThrottle(TokenBucketThrottle):
+    """Posting and editing questions, answers and comments."""
+
+    scope = "write"
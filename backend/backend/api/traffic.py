@@ -0,0 +1,146 @@
+"""
+Capture of sampled API traffic for replay (see TrafficCaptureMiddleware and
+the replay_traffic command).
+
+Every captured request is one compact JSON line:
+
+    {"t": 1718000000.123, "m": "GET", "r": "api/questions/<int:question_id>/",
+     "p": "/api/questions/42/", "q": "answers_sort=votes", "b": null,
+     "s": "user:7", "st": 200, "ms": 12.4}
+
+t is the start time, r the matched route, p the path, q the query string
+with the values of the free-text parameters in FREE_TEXT_PARAMS replaced by
+as many "x" (orderings, flags and cursors are kept, so a replay takes the
+same paths through the views), b the anonymized JSON body (every string
+replaced by as many "x"),
+s the authenticated subject ("user:<id>" / "admin:<id>", never the token),
+st the response status and ms the time spent in the view stack. Each worker
+process appends to its own traffic-<pid>.ndjson in TRAFFIC_CAPTURE["LOG_DIR"],
+rotated at TRAFFIC_CAPTURE["MAX_BYTES"].
+"""
+import json
+import logging
+import os
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+DEFAULTS = {
+    "ENABLED": False,
+    "SAMPLE_RATE": 0.01,
+    "LOG_DIR": None,
+    "MAX_BYTES": 50 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+}
+
+# Bodies larger than this (e.g. corpus uploads) are not recorded
+MAX_BODY_BYTES = 64 * 1024
+
+# Query parameters holding text typed by users (searches, typeahead and
+# similar-question lookups)
+FREE_TEXT_PARAMS = frozenset({"search", "q", "title", "description"})
+
+
+def get_capture_setting(name):
+    value = getattr(settings, "TRAFFIC_CAPTURE", {}).get(name, DEFAULTS[name])
+    if name == "LOG_DIR":
+        value = Path(value or Path(settings.BASE_DIR) / "traffic")
+    return value
+
+
+def anonymize(value):
+    """Replace every string in a JSON value, keeping its shape and sizes."""
+    if isinstance(value, str):
+        return "x" * len(value)
+    if isinstance(value, list):
+        return [anonymize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: anonymize(item) for key, item in value.items()}
+    return value
+
+
+def query_string(request):
+    """The query string with the values of free-text parameters "x"-ed."""
+    pairs = parse_qsl(request.META.get("QUERY_STRING", ""), keep_blank_values=True)
+    return urlencode(
+        [
+            (key, "x" * len(value) if key in FREE_TEXT_PARAMS else value)
+            for key, value in pairs
+        ]
+    )
+
+
+def request_body(request):
+    """The anonymized JSON body; read before the view consumes the stream."""
+    if not request.content_type.startswith("application/json"):
+        return None
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return None
+    if not length or length > MAX_BODY_BYTES:
+        return None
+    try:
+        return anonymize(json.loads(request.body))
+    except ValueError:
+        return None
+
+
+def auth_subject(request):
+    """Return "user:<id>" / "admin:<id>" for a valid bearer token, else None."""
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    scheme, _, raw_token = header.partition(" ")
+    if scheme != "Bearer" or not raw_token:
+        return None
+    try:
+        token = AccessToken(raw_token)
+    except Exception:
+        return None
+    return f"{token.get('user_type', 'user')}:{token.get('user_id')}"
+
+
+_writer = {"pid": None, "logger": None}
+
+
+def _logger():
+    """This process's capture logger, writing its own rotating file."""
+    if _writer["pid"] != os.getpid():
+        log_dir = get_capture_setting("LOG_DIR")
+        log_dir.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            log_dir / f"traffic-{os.getpid()}.ndjson",
+            maxBytes=get_capture_setting("MAX_BYTES"),
+            backupCount=get_capture_setting("BACKUP_COUNT"),
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger = logging.Logger(f"api.traffic.{os.getpid()}")
+        logger.addHandler(handler)
+        _writer.update(pid=os.getpid(), logger=logger)
+    return _writer["logger"]
+
+
+def record(entry):
+    _logger().info(json.dumps(entry, separators=(",", ":")))
+
+
+def read_log(paths):
+    """Return the captured requests of one or more log files, oldest first."""
+    entries = []
+    for path in paths:
+        with open(path, encoding="utf-8") as handle:
+            entries.extend(json.loads(line) for line in handle if line.strip())
+    entries.sort(key=lambda entry: entry["t"])
+    return entries
+
+
+def subject_token(subject):
+    """Mint an access token for a captured subject (SECRET_KEY must match)."""
+    user_type, _, user_id = subject.partition(":")
+    token = AccessToken()
+    token["user_id"] = int(user_id)
+    token["user_type"] = user_type
+    return str(token)
@@ -0,0 +1,335 @@
+"""
+As-you-type suggestions for question titles and tags.
+
+Every worker keeps an in-memory index: sorted arrays of normalized title keys
+(the title starting at each of its words, so "reverse" finds "How to reverse
+a list") and of tag names, searched with bisect. Nothing is queried from the
+database while answering.
+
+The index is loaded from a gzipped snapshot under TYPEAHEAD["INDEX_DIR"],
+written by the build_typeahead_index command. Question writes are appended to
+a journal file next to it (named in the JOURNAL file), and every worker
+replays the journal entries it has not seen yet before answering, so a
+question posted through one worker is suggested by all of them. Rebuilding
+the snapshot starts a fresh journal and workers reload on their next lookup.
+If no snapshot was built yet, the first lookup or write builds one from the
+database, as build_typeahead_index does.
+Popularity (upvotes and answers) is refreshed with each snapshot.
+"""
+import gzip
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from pathlib import Path
+
+from django.conf import settings
+
+from . import sharding
+from .models import Question
+from .utils import split_tags
+
+DEFAULTS = {
+    "INDEX_DIR": None,
+    "MAX_RESULTS": 8,
+    "MIN_PREFIX": 2,
+}
+
+# Title keys are truncated to this many characters to bound memory
+KEY_LENGTH = 48
+# Matching index entries examined per lookup before ranking
+MAX_SCAN = 5000
+# Popularity of a question: upvotes + ANSWER_WEIGHT * answers
+ANSWER_WEIGHT = 2
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+SNAPSHOT_NAME = "snapshot.json.gz"
+POINTER_NAME = "JOURNAL"
+
+logger = logging.getLogger(__name__)
+
+
+def get_typeahead_setting(name):
+    value = getattr(settings, "TYPEAHEAD", {}).get(name, DEFAULTS[name])
+    if name == "INDEX_DIR":
+        value = Path(value or Path(settings.BASE_DIR) / "typeahead_index")
+    return value
+
+
+def normalize(text):
+    """Lower-case text and reduce it to single-space separated words."""
+    return " ".join(TOKEN_PATTERN.findall((text or "").lower()))
+
+
+def popularity(upvotes, answers):
+    return upvotes + ANSWER_WEIGHT * answers
+
+
+def _title_keys(title):
+    words = normalize(title).split()
+    return {" ".join(words[i:])[:KEY_LENGTH] for i in range(len(words))}
+
+
+class TypeaheadIndex:
+    """Sorted-array prefix index over question titles and tags."""
+
+    def __init__(self, rows=()):
+        # id -> (title, tag, popularity)
+        self.questions = {}
+        self.tag_counts = {}
+        title_keys = []
+        for question_id, title, tag, score in rows:
+            self.questions[question_id] = (title, tag, score)
+            title_keys.extend((key, question_id) for key in _title_keys(title))
+            for name in split_tags(tag):
+                self.tag_counts[name] = self.tag_counts.get(name, 0) + 1
+        # (key, question id) pairs, sorted
+        self.title_keys = sorted(title_keys)
+        self.tags = sorted(self.tag_counts)
+
+    def add(self, question_id, title, tag, score):
+        self.remove(question_id)
+        self.questions[question_id] = (title, tag, score)
+        for key in _title_keys(title):
+            insort(self.title_keys, (key, question_id))
+        for name in split_tags(tag):
+            if name not in self.tag_counts:
+                self.tag_counts[name] = 0
+                insort(self.tags, name)
+            self.tag_counts[name] += 1
+
+    def remove(self, question_id):
+        entry = self.questions.pop(question_id, None)
+        if entry is None:
+            return
+        title, tag, _ = entry
+        for key in _title_keys(title):
+            position = bisect_left(self.title_keys, (key, question_id))
+            if position < len(self.title_keys) and self.title_keys[position] == (key, question_id):
+                del self.title_keys[position]
+        for name in split_tags(tag):
+            self.tag_counts[name] -= 1
+            if not self.tag_counts[name]:
+                del self.tag_counts[name]
+                del self.tags[bisect_left(self.tags, name)]
+
+    def suggest(self, prefix, limit):
+        """Return (questions, tags) matching prefix, most popular first."""
+        prefix = normalize(prefix)
+        key_prefix = prefix[:KEY_LENGTH]
+
+        matches = set()
+        position = bisect_left(self.title_keys, (key_prefix,))
+        for key, question_id in self.title_keys[position : position + MAX_SCAN]:
+            if not key.startswith(key_prefix):
+                break
+            matches.add(question_id)
+        if len(prefix) > KEY_LENGTH:
+            # Keys are truncated, so check the full title for long prefixes
+            matches = {
+                question_id
+                for question_id in matches
+                if prefix in normalize(self.questions[question_id][0])
+            }
+        questions = [
+            {"id": question_id, "question_title": title, "question_tag": tag}
+            for question_id, (title, tag, _) in heapq.nlargest(
+                limit,
+                ((question_id, self.questions[question_id]) for question_id in matches),
+                key=lambda item: (item[1][2], item[0]),
+            )
+        ]
+
+        names = []
+        position = bisect_left(self.tags, prefix)
+        for name in self.tags[position : position + MAX_SCAN]:
+            if not name.startswith(prefix):
+                break
+            names.append(name)
+        tags = [
+            {"tag": name, "count": self.tag_counts[name]}
+            for name in heapq.nlargest(limit, names, key=lambda name: self.tag_counts[name])
+        ]
+        return questions, tags
+
+
+# ----------------- Worker state -----------------
+
+_state = {"index": TypeaheadIndex(), "snapshot": None, "journal": None, "offset": 0}
+_lock = threading.Lock()
+
+
+def _apply(index, op):
+    if op["op"] == "add":
+        index.add(op["id"], op["title"], op["tag"], op["popularity"])
+    elif op["op"] == "remove":
+        index.remove(op["id"])
+
+
+def _replay_journal(index_dir):
+    """Apply journal entries appended since the last call."""
+    try:
+        with open(index_dir / _state["journal"], "rb") as journal:
+            journal.seek(_state["offset"])
+            data = journal.read()
+    except FileNotFoundError:
+        # Replaced by a newer snapshot, which the next sync loads
+        return
+    # Only complete lines; a partially written one is picked up next time
+    data = data[: data.rfind(b"\n") + 1]
+    for line in data.splitlines():
+        _apply(_state["index"], json.loads(line))
+    _state["offset"] += len(data)
+
+
+def _sync():
+    index_dir = get_typeahead_setting("INDEX_DIR")
+    if not (index_dir / POINTER_NAME).exists():
+        _bootstrap(index_dir)
+    try:
+        stat = (index_dir / SNAPSHOT_NAME).stat()
+    except FileNotFoundError:
+        # Another worker is still building the first snapshot
+        return
+    snapshot = (stat.st_ino, stat.st_mtime_ns)
+    if snapshot != _state["snapshot"]:
+        data = json.loads(gzip.decompress((index_dir / SNAPSHOT_NAME).read_bytes()))
+        _state.update(
+            index=TypeaheadIndex(data["questions"]),
+            snapshot=snapshot,
+            journal=data["journal"],
+            offset=0,
+        )
+    _replay_journal(index_dir)
+
+
+def load_index():
+    """Load the snapshot into this worker; called at worker start."""
+    with _lock:
+        _sync()
+
+
+def suggest(prefix, limit=None):
+    """
+    Return {"questions": [...], "tags": [...]} for a typed prefix, most
+    popular first. Prefixes shorter than TYPEAHEAD["MIN_PREFIX"] return
+    nothing.
+    """
+    limit = limit or get_typeahead_setting("MAX_RESULTS")
+    if len(normalize(prefix)) < get_typeahead_setting("MIN_PREFIX"):
+        return {"questions": [], "tags": []}
+    with _lock:
+        _sync()
+        questions, tags = _state["index"].suggest(prefix, limit)
+    return {"questions": questions, "tags": tags}
+
+
+# ----------------- Writes -----------------
+
+
+def _write_snapshot(index_dir, journal, rows):
+    staging = index_dir / f"{SNAPSHOT_NAME}.tmp"
+    staging.write_bytes(
+        gzip.compress(
+            json.dumps({"journal": journal, "questions": rows}, separators=(",", ":")).encode(
+                "utf-8"
+            )
+        )
+    )
+    os.replace(staging, index_dir / SNAPSHOT_NAME)
+
+
+def _live_rows():
+    return [
+        [question_id, title, tag, popularity(upvotes, answers)]
+        for question_id, title, tag, upvotes, answers in sharding.scatter(
+            Question.objects.filter(question_deleted=False)
+        )
+        .values_list("id", "question_title", "question_tag", "upvote_count", "answer_count")
+        .iterator(chunk_size=5000)
+    ]
+
+
+def _bootstrap(index_dir):
+    """
+    Build the first snapshot from the database when none was built yet. The
+    pointer is hard-linked into place, which fails if another worker got
+    there first, so only one worker builds; writes made meanwhile go to the
+    new journal and are replayed on top of the snapshot.
+    """
+    index_dir.mkdir(parents=True, exist_ok=True)
+    journal = f"journal-{time.time_ns()}.ndjson"
+    (index_dir / journal).touch()
+    staging = index_dir / f"{POINTER_NAME}.{journal}.tmp"
+    staging.write_text(journal)
+    try:
+        os.link(staging, index_dir / POINTER_NAME)
+    except FileExistsError:
+        (index_dir / journal).unlink()
+        return
+    finally:
+        staging.unlink()
+    logger.warning("No typeahead index in %s, building one from the database", index_dir)
+    _write_snapshot(index_dir, journal, _live_rows())
+
+
+def _append(op):
+    index_dir = get_typeahead_setting("INDEX_DIR")
+    if not (index_dir / POINTER_NAME).exists():
+        _bootstrap(index_dir)
+    journal = (index_dir / POINTER_NAME).read_text().strip()
+    with open(index_dir / journal, "a", encoding="utf-8") as handle:
+        handle.write(json.dumps(op, separators=(",", ":")) + "\n")
+
+
+def record_question(question):
+    """Add or refresh a question in every worker's index."""
+    if question.question_deleted:
+        remove_question(question.id)
+        return
+    _append(
+        {
+            "op": "add",
+            "id": question.id,
+            "title": question.question_title,
+            "tag": question.question_tag,
+            "popularity": popularity(question.upvote_count, question.answer_count),
+        }
+    )
+
+
+def remove_question(question_id):
+    """Drop a question from every worker's index."""
+    _append({"op": "remove", "id": question_id})
+
+
+def build_snapshot():
+    """
+    Write a fresh snapshot of all live questions and start a new journal.
+
+    The new journal is made current before the questions are read, so a write
+    is either already in the snapshot or in the new journal.
+
+    :return: number of questions in the snapshot
+    """
+    index_dir = get_typeahead_setting("INDEX_DIR")
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    journal = f"journal-{time.time_ns()}.ndjson"
+    (index_dir / journal).touch()
+    pointer = index_dir / f"{POINTER_NAME}.tmp"
+    pointer.write_text(journal)
+    os.replace(pointer, index_dir / POINTER_NAME)
+
+    rows = _live_rows()
+    _write_snapshot(index_dir, journal, rows)
+
+    for stale in index_dir.glob("journal-*.ndjson"):
+        if stale.name != journal:
+            stale.unlink(missing_ok=True)
+    return len(rows)
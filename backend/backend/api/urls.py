@@ -13,6 +13,19 @@ urlpatterns = [
     # Profile endpoints
     path("auth/user/profile/", views.user_profile, name="user_profile"),
     path("auth/admin/profile/", views.admin_profile, name="admin_profile"),
+    path("auth/user/activity/", views.user_activity_summary, name="user_activity"),
+    path("users/search/", views.user_search, name="user_search"),
+    # Home feed
+    path("feed/", views.home_feed, name="home_feed"),
+    path("tags/following/", views.followed_tags, name="followed_tags"),
+    path("tags/<str:tag>/follow/", views.follow_tag_view, name="follow_tag"),
+    # Notification endpoints
+    path("notifications/", views.notification_list, name="notification_list"),
+    path(
+        "notifications/read/",
+        views.mark_notifications_read,
+        name="mark_notifications_read",
+    ),
     path(
         "auth/user/profile/update/",
         views.update_user_profile,
@@ -24,16 +37,59 @@ urlpatterns = [
         name="update_admin_profile",
     ),
     # Admin user management
+    path(
+        "auth/admin/users/search/",
+        views.admin_user_search,
+        name="admin_user_search",
+    ),
     path(
         "auth/admin/user/<int:user_id>/",
         views.admin_view_user_profile,
         name="admin_view_user_profile",
     ),
+    path(
+        "auth/admin/user/<int:user_id>/activity/",
+        views.admin_user_activity,
+        name="admin_user_activity",
+    ),
     path(
         "auth/admin/user/<int:user_id>/update/",
         views.admin_update_user_profile,
         name="admin_update_user_profile",
     ),
+    # Admin data export / import
+    path("admin/export/", views.admin_export_corpus, name="admin_export_corpus"),
+    path("admin/import/", views.admin_import_corpus, name="admin_import_corpus"),
+    path(
+        "admin/import/<int:job_id>/",
+        views.admin_import_status,
+        name="admin_import_status",
+    ),
+    # Admin analytics
+    path("admin/analytics/", views.admin_analytics, name="admin_analytics"),
+    # Admin archive
+    path("admin/archive/", views.admin_archive_list, name="admin_archive_list"),
+    path(
+        "admin/archive/restore/",
+        views.admin_archive_restore,
+        name="admin_archive_restore",
+    ),
+    # Admin revision history
+    path(
+        "admin/revisions/<str:record_type>/<int:object_id>/",
+        views.admin_revision_history,
+        name="admin_revision_history",
+    ),
+    path(
+        "admin/revisions/<str:record_type>/<int:object_id>/<int:number>/",
+        views.admin_revision_detail,
+        name="admin_revision_detail",
+    ),
+    path(
+        "admin/revisions/<str:record_type>/<int:object_id>/<int:number>/revert/",
+        views.admin_revision_revert,
+        name="admin_revision_revert",
+    ),
     # Delete endpoints
     path("auth/user/delete/", views.delete_user, name="delete_user"),
     path("auth/admin/delete/", views.delete_admin, name="delete_admin"),
@@ -46,6 +102,18 @@ urlpatterns = [
     path("questions/", views.QuestionListView.as_view(), name="question-list"),
     path("questions/<int:question_id>/", views.question_detail, name="question-detail"),
     path("questions/ask/", views.post_question, name="post-question"),
+    path("questions/similar/", views.similar_questions, name="similar-questions"),
+    path("questions/suggest/", views.suggest, name="suggest"),
+    path(
+        "questions/<int:question_id>/follow/",
+        views.follow,
+        name="follow-question",
+    ),
+    path(
+        "questions/<int:question_id>/related/",
+        views.related_question_list,
+        name="related-questions",
+    ),
     path(
         "questions/<int:question_id>/update/",
         views.update_question,
@@ -61,8 +129,18 @@ urlpatterns = [
     # Answer endpoints
     path("answers/<int:answer_id>/", views.answer_detail, name="answer_detail"),
     path("questions/<int:question_id>/answers/", views.post_answer, name="post_answer"),
+    path(
+        "questions/<int:question_id>/answers/list/",
+        views.question_answer_list,
+        name="question_answer_list",
+    ),
     path("answers/<int:answer_id>/update/", views.update_answer, name="update_answer"),
     path("answers/<int:answer_id>/delete/", views.delete_answer, name="delete_answer"),
+    path(
+        "answers/<int:answer_id>/comments/",
+        views.answer_comment_list,
+        name="answer_comment_list",
+    ),
     # Comment endpoints
     path("comment/add/", views.add_comment, name="add_comment"),
     path("comment/edit/<int:comment_id>/", views.edit_comment, name="edit_comment"),
@@ -1,6 +1,44 @@
 import re
+from django.db.models import F, Q
 from .models import *
 
+MENTION_PATTERN = re.compile(r"@(\w+)")
+
+
+def extract_mentions(text):
+    """Return the set of usernames @mentioned in text."""
+    return set(MENTION_PATTERN.findall(text or ""))
+
+
+def split_tags(value):
+    """Split a comma-separated question_tag into lower-case tag names."""
+    return [tag for tag in (part.strip().lower() for part in (value or "").split(",")) if tag]
+
+
+def prefix_q(field, prefix):
+    """
+    Case-insensitive "field starts with prefix" as a range over Lower(field),
+    which (unlike LIKE / istartswith) can use the Lower(field) index.
+    Querysets must alias the lowered field as "<field>_lower".
+    """
+    lower = prefix.lower()
+    upper = lower[:-1] + chr(ord(lower[-1]) + 1)
+    return Q(**{f"{field}_lower__gte": lower, f"{field}_lower__lt": upper})
+
+
+def resolve_mentions(usernames):
+    """
+    Map a collection of usernames to the ids of live users, in one query.
+    Usernames that don't belong to a live user are left out.
+    """
+    if not usernames:
+        return {}
+    return dict(
+        UserDetail.objects.filter(
+            username__in=set(usernames), is_user_deleted=False
+        ).values_list("username", "id")
+    )
+
 
 def create_mention_notifications(question):
     """
@@ -8,9 +46,7 @@ def create_mention_notifications(question):
     For each valid username, create a Notification entry for that user.
     """
     text_to_search = f"{question.question_title} {question.question_description}"
-    mentions = re.findall(r"@(\w+)", text_to_search)
-
-    unique_mentions = set(mentions)
+    unique_mentions = extract_mentions(text_to_search)
 
     for username in unique_mentions:
         try:
@@ -46,8 +82,7 @@ def create_answer_notification(answer):
         )
 
     # Check for mentions in answer description
-    mentions = re.findall(r"@(\w+)", answer.answer_description)
-    unique_mentions = set(mentions)
+    unique_mentions = extract_mentions(answer.answer_description)
 
     for username in unique_mentions:
         try:
@@ -84,8 +119,7 @@ def create_comment_notification(comment):
         )
 
     # Check for mentions in comment content
-    mentions = re.findall(r"@(\w+)", comment.comment_content)
-    unique_mentions = set(mentions)
+    unique_mentions = extract_mentions(comment.comment_content)
 
     for username in unique_mentions:
         try:
@@ -116,9 +150,9 @@ def update_reputation_for_upvote(question=None, answer=None, vote=1):
     :param vote: +1 for upvote, -1 for removing upvote
     """
     if question:
-        user = question.user
+        user_id = question.user_id
     elif answer:
-        user = answer.user
+        user_id = answer.user_id
     else:
         raise ValueError("Either question or answer must be provided.")
 
@@ -126,5 +160,6 @@ def update_reputation_for_upvote(question=None, answer=None, vote=1):
     if vote not in [1, -1]:
         raise ValueError("Vote must be +1 or -1.")
 
-    user.reputation += vote
-    user.save()
+    # An UPDATE, not a save of a loaded row: concurrent votes and activity
+    # counter writes on the same user must not be lost
+    UserDetail.objects.filter(id=user_id).update(reputation=F("reputation") + vote)
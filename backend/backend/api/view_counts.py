@@ -0,0 +1,165 @@
+"""
+Write-behind question view counter.
+
+Viewing a question must stay a read, so record_view() only increments a
+per-worker in-memory counter (optionally ignoring repeat views of the same
+question by the same viewer within VIEW_COUNTS["DEDUPE_WINDOW"] seconds). A
+background thread in every worker flushes the counters every
+VIEW_COUNTS["FLUSH_INTERVAL"] seconds, or as soon as
+VIEW_COUNTS["MAX_PENDING"] questions have pending views, as one
+`view_count = view_count + n` UPDATE per distinct n (and shard). A worker that dies loses
+at most the views of its last interval; a clean shutdown flushes them.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+
+from . import sharding
+from .models import Question
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "FLUSH_INTERVAL": 10,
+    "MAX_PENDING": 1000,
+    "DEDUPE_WINDOW": 30 * 60,
+    "MAX_VIEWERS": 100_000,
+}
+
+# Question ids per UPDATE
+UPDATE_BATCH_SIZE = 500
+
+
+def get_view_count_setting(name):
+    return getattr(settings, "VIEW_COUNTS", {}).get(name, DEFAULTS[name])
+
+
+_pending = Counter()
+# (viewer, question id) -> when the view was counted, oldest first
+_recent = OrderedDict()
+_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = {"pid": None}
+
+
+def viewer_key(request, user=None):
+    """Identify a viewer by user id if known, else by client address."""
+    if user is not None and getattr(user, "is_authenticated", False):
+        return f"user:{user.id}"
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    address = forwarded.split(",")[0].strip() if forwarded else request.META.get("REMOTE_ADDR")
+    return f"ip:{address}"
+
+
+def _seen_recently(viewer, question_id, now):
+    window = get_view_count_setting("DEDUPE_WINDOW")
+    if not window or viewer is None:
+        return False
+    while _recent and now - next(iter(_recent.values())) >= window:
+        _recent.popitem(last=False)
+    key = (viewer, question_id)
+    if key in _recent:
+        return True
+    _recent[key] = now
+    if len(_recent) > get_view_count_setting("MAX_VIEWERS"):
+        _recent.popitem(last=False)
+    return False
+
+
+def record_view(question_id, viewer=None):
+    """
+    Count a view of a question. Does not touch the database.
+
+    :return: False if it was a repeat view within the dedupe window
+    """
+    with _lock:
+        if _seen_recently(viewer, question_id, time.monotonic()):
+            return False
+        _pending[question_id] += 1
+        full = len(_pending) >= get_view_count_setting("MAX_PENDING")
+    _ensure_flusher()
+    if full:
+        _wake.set()
+    return True
+
+
+def pending_views(question_id):
+    """Views of a question counted by this worker but not flushed yet."""
+    with _lock:
+        return _pending.get(question_id, 0)
+
+
+def flush():
+    """
+    Write this worker's pending views to the database.
+
+    :return: number of views written
+    """
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return 0
+
+    written = {}
+    try:
+        if sharding.enabled():
+            placement = sharding.question_shards(pending)
+        else:
+            placement = dict.fromkeys(pending, None)
+        by_shard = defaultdict(lambda: defaultdict(list))
+        for question_id, n in pending.items():
+            by_shard[placement[question_id]][n].append(question_id)
+        for alias, by_count in by_shard.items():
+            with sharding.use_shard(alias), sharding.atomic():
+                for n, ids in by_count.items():
+                    for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+                        batch = ids[start : start + UPDATE_BATCH_SIZE]
+                        Question.objects.filter(id__in=batch).update(
+                            view_count=F("view_count") + n
+                        )
+            written.update({i: pending[i] for ids in by_count.values() for i in ids})
+    except Exception:
+        # Keep the views not written yet for the next flush
+        with _lock:
+            _pending.update({i: n for i, n in pending.items() if i not in written})
+        raise
+    return sum(written.values())
+
+
+def _run():
+    while True:
+        _wake.wait(get_view_count_setting("FLUSH_INTERVAL"))
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Flushing question view counts failed")
+        finally:
+            connections.close_all()
+
+
+def _ensure_flusher():
+    """Start this process's flush thread (after a fork too)."""
+    if _flusher["pid"] == os.getpid():
+        return
+    with _lock:
+        if _flusher["pid"] == os.getpid():
+            return
+        _flusher["pid"] = os.getpid()
+    threading.Thread(target=_run, name="view-count-flusher", daemon=True).start()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception("Flushing question view counts at exit failed")
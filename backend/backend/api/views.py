@@ -1,20 +1,78 @@
 from rest_framework import status, generics, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+    throttle_classes,
+)
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password, check_password
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models.functions import Lower
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from datetime import timedelta
+from pathlib import Path
+import tempfile
 from .models import *
 from .serializers import *
 from .permissions import *
+from .pagination import (
+    AnswerCursorPagination,
+    CommentCursorPagination,
+    NotificationCursorPagination,
+    ReputationKeysetPagination,
+)
+from .throttling import AuthThrottle, VoteThrottle, WriteThrottle
 from .utils import *
+from .activity import rebuild_user_counters, record_user_activity, user_activity
+from .archive import RestoreError, restore
+from .feed import (
+    fan_out_question,
+    feed_queryset,
+    follow_tag,
+    normalize_tag,
+    unfollow_tag,
+)
+from .follows import (
+    fan_out_answer,
+    follow_question,
+    sync_follow_events,
+    unfollow_question,
+)
+from .analytics import METRICS, PERIODS, last_refreshed, rollup_series, top_tags
+from .ranking import record_answer_vote, record_question_activity
+from .related import related_questions
+from .similarity import find_similar, index_question, remove_question
+from .view_counts import record_view, viewer_key
+from . import identity, revisions, sharding, typeahead
+from .importer import (
+    BulkImportError,
+    expire_stale_imports,
+    get_import_setting,
+    guess_format,
+    read_dump,
+    start_import,
+)
+from .export import (
+    gzip_stream,
+    iter_ndjson,
+    iter_records,
+    parse_since,
+    parse_since_ids,
+    parse_types,
+)
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([AuthThrottle])
 def user_register(request):
     """User registration endpoint"""
     serializer = UserRegistrationSerializer(data=request.data)
@@ -34,6 +92,7 @@ def user_register(request):
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([AuthThrottle])
 def admin_register(request):
     """Admin registration endpoint"""
     serializer = AdminRegistrationSerializer(data=request.data)
@@ -53,6 +112,7 @@ def admin_register(request):
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([AuthThrottle])
 def user_login(request):
     """User login endpoint"""
     serializer = UserLoginSerializer(data=request.data)
@@ -82,6 +142,7 @@ def user_login(request):
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([AuthThrottle])
 def admin_login(request):
     """Admin login endpoint"""
     serializer = AdminLoginSerializer(data=request.data)
@@ -133,13 +194,31 @@ def logout(request):
         )
 
 
+@api_view(["GET"])
+@permission_classes([IsUserAuthenticated])
+def user_search(request):
+    """
+    Live users whose username starts with ?q= (case-insensitive), highest
+    reputation first, keyset-paginated. Used for @mention autocomplete.
+    """
+    queryset = UserDetail.objects.filter(is_user_deleted=False)
+    prefix = request.query_params.get("q", "").strip().lstrip("@")
+    if prefix:
+        queryset = queryset.alias(username_lower=Lower("username")).filter(
+            prefix_q("username", prefix)
+        )
+    paginator = ReputationKeysetPagination()
+    users = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(UserSearchSerializer(users, many=True).data)
+
+
 @api_view(["GET"])
 @permission_classes([IsUserAuthenticated])
 def user_profile(request):
-    """Get user profile"""
+    """Get user profile, with activity counters and recent posts"""
     try:
         user_id = request.user.id
-        user = UserDetail.objects.get(id=user_id)
+        user = identity.get(UserDetail, user_id)
 
         # Check if account is deleted
         if user.is_user_deleted:
@@ -147,12 +226,62 @@ def user_profile(request):
                 {"error": "Account has been deleted"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        serializer = UserProfileSerializer(user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = UserProfileSerializer(user).data
+        data["activity"] = user_activity(user, request)
+        return Response(data, status=status.HTTP_200_OK)
     except UserDetail.DoesNotExist:
         return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(["GET"])
+@permission_classes([IsUserAuthenticated])
+def user_activity_summary(request):
+    """
+    Activity counters and recent questions/answers of the current user.
+    Optional query params: limit, questions_before, answers_before.
+    """
+    return Response(user_activity(request.user, request), status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsUserAuthenticated])
+def notification_list(request):
+    """
+    Notification feed of the current user, newest first (cursor-paginated).
+    Digests of several notifications have event_count > 1.
+    Optional query param: unread=true.
+    """
+    for _ in sharding.each_shard():
+        sync_follow_events(request.user)
+    queryset = Notification.objects.filter(user=request.user).select_related(
+        "question", "mention_by"
+    )
+    if request.query_params.get("unread", "").lower() == "true":
+        queryset = queryset.filter(is_read=False)
+    queryset = sharding.scatter(queryset)
+    paginator = NotificationCursorPagination()
+    notifications = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(
+        NotificationFeedSerializer(notifications, many=True).data
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsUserAuthenticated])
+def mark_notifications_read(request):
+    """Mark the given notification ids (or all of them) of the current user as read"""
+    queryset = Notification.objects.filter(user=request.user, is_read=False)
+    ids = request.data.get("ids")
+    if ids is not None:
+        if not isinstance(ids, list):
+            return Response(
+                {"error": "ids must be a list"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = queryset.filter(id__in=ids)
+    updated = sum(queryset.update(is_read=True) for _ in sharding.each_shard())
+    return Response({"updated": updated}, status=status.HTTP_200_OK)
+
+
 @api_view(["GET"])
 @permission_classes([IsAdminAuthenticated])
 def admin_profile(request):
@@ -179,7 +308,7 @@ def update_user_profile(request):
     """Update user profile"""
     try:
         user_id = request.user.id
-        user = UserDetail.objects.get(id=user_id)
+        user = identity.get(UserDetail, user_id)
 
         # Check if account is deleted
         if user.is_user_deleted:
@@ -231,13 +360,38 @@ def update_admin_profile(request):
         return Response({"error": "Admin not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+def _soft_delete_user_posts(user):
+    """
+    Soft-delete a deleted user's questions and answers and delete their
+    notifications, keeping the typeahead index and activity counters in step.
+    """
+    question_ids = []
+    for _ in sharding.each_shard():
+        questions = Question.objects.filter(user=user, question_deleted=False)
+        question_ids.extend(questions.values_list("id", flat=True))
+        # Soft delete all questions by this user
+        questions.update(question_deleted=True, deleted_at=user.deleted_at)
+        # Soft delete all answers by this user
+        Answer.objects.filter(user=user, answer_deleted=False).update(
+            answer_deleted=True, deleted_at=user.deleted_at
+        )
+
+        # Delete all notifications for this user (as recipient or mention)
+        Notification.objects.filter(user=user).delete()
+        Notification.objects.filter(mention_by=user).delete()
+
+    for question_id in question_ids:
+        typeahead.remove_question(question_id)
+    rebuild_user_counters(ids=[user.id])
+
+
 @api_view(["DELETE"])
 @permission_classes([IsUserAuthenticated])
 def delete_user(request):
     """Delete user account (soft delete), soft-delete all their questions and answers, and delete all their notifications."""
     try:
         user_id = request.user.id
-        user = UserDetail.objects.get(id=user_id)
+        user = identity.get(UserDetail, user_id)
 
         # Check if account is already deleted
         if user.is_user_deleted:
@@ -247,20 +401,10 @@ def delete_user(request):
 
         # Soft delete the user
         user.is_user_deleted = True
-        user.save()
-
-        # Soft delete all questions by this user
-        Question.objects.filter(user=user, question_deleted=False).update(
-            question_deleted=True
-        )
-        # Soft delete all answers by this user
-        Answer.objects.filter(user=user, answer_deleted=False).update(
-            answer_deleted=True
-        )
+        user.deleted_at = timezone.now()
+        user.save(update_fields=["is_user_deleted", "deleted_at"])
 
-        # Delete all notifications for this user (as recipient or mention)
-        Notification.objects.filter(user=user).delete()
-        Notification.objects.filter(mention_by=user).delete()
+        _soft_delete_user_posts(user)
 
         return Response(
             {
@@ -289,7 +433,7 @@ def delete_admin(request):
 
         # Soft delete the admin
         admin.is_admin_deleted = True
-        admin.save()
+        admin.save(update_fields=["is_admin_deleted"])
 
         return Response(
             {"message": "Admin account deleted successfully"}, status=status.HTTP_200_OK
@@ -326,20 +470,10 @@ def delete_user_by_admin(request, user_id):
 
         # Soft delete the user
         user.is_user_deleted = True
-        user.save()
+        user.deleted_at = timezone.now()
+        user.save(update_fields=["is_user_deleted", "deleted_at"])
 
-        # Soft delete all questions by this user
-        Question.objects.filter(user=user, question_deleted=False).update(
-            question_deleted=True
-        )
-        # Soft delete all answers by this user
-        Answer.objects.filter(user=user, answer_deleted=False).update(
-            answer_deleted=True
-        )
-
-        # Delete all notifications for this user (as recipient or mention)
-        Notification.objects.filter(user=user).delete()
-        Notification.objects.filter(mention_by=user).delete()
+        _soft_delete_user_posts(user)
 
         return Response(
             {
@@ -357,7 +491,7 @@ def delete_user_by_admin(request, user_id):
 @api_view(["GET"])
 @permission_classes([IsAdminAuthenticated])
 def admin_view_user_profile(request, user_id):
-    """Admin can view any user's profile"""
+    """Admin can view any user's profile, with activity counters and recent posts"""
     try:
         user = UserDetail.objects.get(id=user_id)
         if user.is_user_deleted:
@@ -365,12 +499,45 @@ def admin_view_user_profile(request, user_id):
                 {"error": "User account has been deleted"},
                 status=status.HTTP_404_NOT_FOUND,
             )
-        serializer = UserProfileSerializer(user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = UserProfileSerializer(user).data
+        data["activity"] = user_activity(user, request)
+        return Response(data, status=status.HTTP_200_OK)
     except UserDetail.DoesNotExist:
         return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(["GET"])
+@permission_classes([IsAdminAuthenticated])
+def admin_user_activity(request, user_id):
+    """
+    Activity counters and recent questions/answers of any user (Admin only).
+    Optional query params: limit, questions_before, answers_before.
+    """
+    try:
+        user = UserDetail.objects.get(id=user_id, is_user_deleted=False)
+    except UserDetail.DoesNotExist:
+        return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(user_activity(user, request), status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminAuthenticated])
+def admin_user_search(request):
+    """
+    Admin lookup of live users whose username or email starts with ?q=
+    (case-insensitive), highest reputation first, keyset-paginated
+    """
+    queryset = UserDetail.objects.filter(is_user_deleted=False)
+    prefix = request.query_params.get("q", "").strip()
+    if prefix:
+        queryset = queryset.alias(
+            username_lower=Lower("username"), user_email_lower=Lower("user_email")
+        ).filter(prefix_q("username", prefix) | prefix_q("user_email", prefix))
+    paginator = ReputationKeysetPagination()
+    users = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(UserMiniSerializer(users, many=True).data)
+
+
 @api_view(["PUT"])
 @permission_classes([IsAdminAuthenticated])
 def admin_update_user_profile(request, user_id):
@@ -397,12 +564,349 @@ def admin_update_user_profile(request, user_id):
         return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(["GET"])
+@permission_classes([IsAdminAuthenticated])
+def admin_export_corpus(request):
+    """
+    Stream the whole Q&A corpus as NDJSON (Admin only).
+    Optional query params: types, since_id, since, compress (gzip|none).
+    """
+    try:
+        types = parse_types(request.query_params.get("types"))
+        since_ids = parse_since_ids(request.query_params.get("since_id"))
+        since = parse_since(request.query_params.get("since"))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    chunks = iter_ndjson(iter_records(types=types, since_ids=since_ids, since=since))
+
+    if request.query_params.get("compress", "gzip") == "gzip":
+        response = StreamingHttpResponse(
+            gzip_stream(chunks), content_type="application/gzip"
+        )
+        response["Content-Disposition"] = 'attachment; filename="corpus.ndjson.gz"'
+    else:
+        response = StreamingHttpResponse(chunks, content_type="application/x-ndjson")
+        response["Content-Disposition"] = 'attachment; filename="corpus.ndjson"'
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminAuthenticated])
+def admin_analytics(request):
+    """
+    Activity counts per day or week, read from the analytics rollups (Admin
+    only). Optional query params: period (day|week), metrics (comma
+    separated), tag, since and until (YYYY-MM-DD).
+    """
+    period = request.query_params.get("period", "day")
+    if period not in PERIODS:
+        return Response(
+            {"error": f"period must be one of: {', '.join(PERIODS)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    metrics = [
+        m.strip() for m in request.query_params.get("metrics", "").split(",") if m.strip()
+    ] or list(METRICS)
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        return Response(
+            {"error": f"Unknown metric(s): {', '.join(sorted(unknown))}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    until = timezone.localdate()
+    since = until - timedelta(days=30 if period == "day" else 7 * 12)
+    try:
+        if request.query_params.get("until"):
+            until = parse_since(request.query_params["until"]).date()
+        if request.query_params.get("since"):
+            since = parse_since(request.query_params["since"]).date()
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Rollups are kept per lower-cased tag name
+    tag = request.query_params.get("tag", "").strip().lower()
+    data = {
+        "period": period,
+        "since": since,
+        "until": until,
+        "tag": tag or None,
+        "updated_at": last_refreshed(),
+        "series": rollup_series(period, metrics, since, until, tag=tag),
+    }
+    if not tag:
+        tag_metrics = [m for m in metrics if METRICS[m][2] is not None]
+        data["top_tags"] = top_tags(period, tag_metrics, since, until)
+    return Response(data, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminAuthenticated])
+def admin_archive_list(request):
+    """
+    Archived (soft-deleted long ago) records, newest first (Admin only).
+    Optional query params: type (user|question|answer|comment), before, limit.
+    """
+    queryset = ArchivedRecord.objects.order_by("-id")
+    record_type = request.query_params.get("type")
+    if record_type:
+        queryset = queryset.filter(record_type=record_type)
+    try:
+        limit = min(int(request.query_params.get("limit", 20)), 100)
+        if request.query_params.get("before"):
+            queryset = queryset.filter(id__lt=int(request.query_params["before"]))
+    except ValueError:
+        return Response(
+            {"error": "before and limit must be integers"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    records = list(
+        queryset.values(
+            "id", "record_type", "original_id", "summary", "deleted_at", "archived_at"
+        )[: limit + 1]
+    )
+    return Response(
+        {
+            "next": records[limit - 1]["id"] if len(records) > limit else None,
+            "results": records[:limit],
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAdminAuthenticated])
+def admin_archive_restore(request):
+    """
+    Move an archived record and its dependent rows back into the live tables,
+    un-deleted (Admin only). Body: record_type, original_id.
+    """
+    record_type = request.data.get("record_type")
+    original_id = request.data.get("original_id")
+    if not record_type or not original_id:
+        return Response(
+            {"error": "record_type and original_id are required"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    record_types = [choice for choice, _ in ArchivedRecord.RECORD_TYPES]
+    if record_type not in record_types:
+        return Response(
+            {"error": f"record_type must be one of: {', '.join(record_types)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        original_id = int(original_id)
+    except (TypeError, ValueError):
+        return Response(
+            {"error": "original_id must be an integer"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        restore(record_type, original_id)
+    except ArchivedRecord.DoesNotExist:
+        return Response(
+            {"error": "Archived record not found"}, status=status.HTTP_404_NOT_FOUND
+        )
+    except RestoreError as e:
+        return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+    return Response(
+        {"message": f"{record_type.capitalize()} restored successfully"},
+        status=status.HTTP_200_OK,
+    )
+
+
+def _revised_record(record_type, object_id):
+    """The question, answer or comment a revision history belongs to, or None."""
+    if record_type not in revisions.TRACKED:
+        return None
+    model, _ = revisions.TRACKED[record_type]
+    return model.objects.filter(id=object_id).first()
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminAuthenticated])
+@sharding.routed
+def admin_revision_history(request, record_type, object_id):
+    """
+    Edit history of a question, answer or comment, newest first (Admin only).
+    Optional query params: before, limit.
+    """
+    instance = _revised_record(record_type, object_id)
+    if instance is None:
+        return Response({"error": "Record not found"}, status=status.HTTP_404_NOT_FOUND)
+    queryset = revisions.history(record_type, object_id)
+    try:
+        limit = min(int(request.query_params.get("limit", 20)), 100)
+        if request.query_params.get("before"):
+            queryset = queryset.filter(number__lt=int(request.query_params["before"]))
+    except ValueError:
+        return Response(
+            {"error": "before and limit must be integers"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    entries = list(queryset[: limit + 1])
+    return Response(
+        {
+            "current_version": revisions.latest_number(record_type, object_id),
+            "next": entries[limit - 1].number if len(entries) > limit else None,
+            "results": RevisionSerializer(entries[:limit], many=True).data,
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminAuthenticated])
+@sharding.routed
+def admin_revision_detail(request, record_type, object_id, number):
+    """Content of one version of a question, answer or comment (Admin only)."""
+    instance = _revised_record(record_type, object_id)
+    if instance is None:
+        return Response({"error": "Record not found"}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        content = revisions.version(instance, number)
+    except Revision.DoesNotExist:
+        return Response({"error": "Version not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"number": number, "content": content}, status=status.HTTP_200_OK)
+
+
+@api_view(["POST"])
+@permission_classes([IsAdminAuthenticated])
+@sharding.routed
+def admin_revision_revert(request, record_type, object_id, number):
+    """
+    Make an earlier version of a question, answer or comment live again
+    (Admin only). The replaced version is kept in the history.
+    """
+    instance = _revised_record(record_type, object_id)
+    if instance is None:
+        return Response({"error": "Record not found"}, status=status.HTTP_404_NOT_FOUND)
+    if getattr(instance, f"{record_type}_deleted"):
+        return Response(
+            {"error": f"Restore the {record_type} before reverting it"},
+            status=status.HTTP_409_CONFLICT,
+        )
+    try:
+        revisions.revert(instance, number, request.user)
+    except Revision.DoesNotExist:
+        return Response({"error": "Version not found"}, status=status.HTTP_404_NOT_FOUND)
+    if record_type == "question":
+        index_question(instance)
+        typeahead.record_question(instance)
+    return Response(
+        {
+            "message": f"{record_type.capitalize()} reverted to version {number}",
+            "current_version": revisions.latest_number(record_type, object_id),
+            "content": revisions.content_of(instance),
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAdminAuthenticated])
+def admin_import_corpus(request):
+    """
+    Bulk import an uploaded legacy dump (Admin only).
+    Multipart fields: file (NDJSON or CSV, optionally .gz), source, format,
+    notify. The upload is stored and imported in the background; the
+    response (202) carries the ImportJob to poll. Posting the same source
+    again resumes an interrupted import.
+    """
+    upload = request.FILES.get("file")
+    if not upload:
+        return Response({"error": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    input_format = request.data.get("format") or guess_format(upload.name)
+    if input_format not in ("ndjson", "csv"):
+        return Response(
+            {"error": "format must be ndjson or csv"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    upload_dir = get_import_setting("UPLOAD_DIR")
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    # Keep the upload's suffix, which tells read_dump to gunzip it
+    with tempfile.NamedTemporaryFile(
+        dir=upload_dir, suffix="-" + get_valid_filename(upload.name), delete=False
+    ) as stored:
+        for chunk in upload.chunks():
+            stored.write(chunk)
+    path = Path(stored.name)
+
+    try:
+        # Reject a file that is not gzip or UTF-8 before accepting the job
+        next(read_dump(path, input_format), None)
+    except BulkImportError as e:
+        path.unlink()
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        job = start_import(
+            request.data.get("source") or upload.name,
+            path,
+            input_format,
+            notify=str(request.data.get("notify", "true")).lower() != "false",
+        )
+    except BulkImportError as e:
+        path.unlink()
+        return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+
+    return Response(
+        {"message": "Import started", "job": import_job_data(job)},
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminAuthenticated])
+def admin_import_status(request, job_id):
+    """Progress of an import started with admin_import_corpus (Admin only)"""
+    expire_stale_imports()
+    try:
+        job = ImportJob.objects.get(id=job_id)
+    except ImportJob.DoesNotExist:
+        return Response({"error": "Import not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(import_job_data(job), status=status.HTTP_200_OK)
+
+
+def import_job_data(job):
+    return {
+        "id": job.id,
+        "source": job.source,
+        "status": job.status,
+        "rows_processed": job.rows_processed,
+        "heartbeat_at": job.heartbeat_at,
+        "started_at": job.started_at,
+        "updated_at": job.updated_at,
+    }
+
+
 class QuestionListPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
 
 
+class QuestionOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that also accepts the feed aliases `hot`, `active` and
+    `popular`, which map onto the indexed ranking columns of Question.
+    """
+
+    ordering_aliases = {
+        "hot": ["-hot_score", "-id"],
+        "active": ["-last_activity", "-id"],
+        "popular": ["-view_count", "-id"],
+    }
+
+    def get_ordering(self, request, queryset, view):
+        param = request.query_params.get(self.ordering_param)
+        if param in self.ordering_aliases:
+            return self.ordering_aliases[param]
+        return super().get_ordering(request, queryset, view)
+
+
 class QuestionListView(generics.ListAPIView):
     queryset = Question.objects.filter(question_deleted=False).select_related("user")
     serializer_class = QuestionListSerializer
@@ -410,49 +914,252 @@ class QuestionListView(generics.ListAPIView):
 
     filter_backends = [
         DjangoFilterBackend,
-        filters.OrderingFilter,
+        QuestionOrderingFilter,
         filters.SearchFilter,
     ]
 
     filterset_fields = ["user", "question_tag"]
 
-    ordering_fields = ["question_title", "question_tag"]
+    ordering_fields = [
+        "question_title",
+        "question_tag",
+        "hot_score",
+        "last_activity",
+        "view_count",
+    ]
 
     ordering = ["id"]
 
     search_fields = ["question_title", "question_description"]
     permission_classes = [AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # Pages over all shards are merged from each shard's top rows
+        page = self.paginate_queryset(sharding.scatter(queryset))
+        context = self.get_serializer_context()
+        context.update(question_list_counts(page))
+        serializer = self.get_serializer(page, many=True, context=context)
+        return self.get_paginated_response(serializer.data)
+
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@sharding.routed
 def question_detail(request, question_id):
-    """Detailed view of a question with answers, comments, upvotes, and users"""
+    """
+    Detailed view of a question with one page of answers (sorted by
+    answers_sort, follow answers_next for more), comment previews, upvotes,
+    and users
+    """
+    try:
+        question = with_question_details(Question.objects).get(
+            id=question_id, question_deleted=False
+        )
+    except Question.DoesNotExist:
+        return Response(
+            {"error": "Question not found"}, status=status.HTTP_404_NOT_FOUND
+        )
+    paginator = AnswerCursorPagination()
+    answers = paginator.paginate_queryset(question_answers(question), request)
+    record_view(question.id, viewer_key(request, request.user))
+    context = {"answers": answers, **compact_context(request)}
+    data = QuestionDetailSerializer(question, context=context).data
+    data["answers_next"] = paginator.get_next_link()
+    return Response(add_side_loaded_users(data, context), status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsUserAuthenticated])
+def home_feed(request):
+    """
+    Newest questions in the tags the current user follows.
+    Optional query params: before (question id), limit.
+    """
+    queryset = sharding.scatter(feed_queryset(request.user))
+    try:
+        limit = min(int(request.query_params.get("limit", 20)), 100)
+        if request.query_params.get("before"):
+            queryset = queryset.filter(id__lt=int(request.query_params["before"]))
+    except ValueError:
+        return Response(
+            {"error": "before and limit must be integers"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    questions = list(queryset[: limit + 1])
+    next_url = None
+    if len(questions) > limit:
+        questions = questions[:limit]
+        next_url = replace_query_param(
+            request.build_absolute_uri(), "before", questions[-1].id
+        )
+    return Response(
+        {"next": next_url, "results": FeedQuestionSerializer(questions, many=True).data},
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsUserAuthenticated])
+def followed_tags(request):
+    """Tags the current user follows"""
+    tags = TagFollow.objects.filter(user=request.user).order_by("tag")
+    return Response(
+        {"tags": list(tags.values_list("tag", flat=True))}, status=status.HTTP_200_OK
+    )
+
+
+@api_view(["POST", "DELETE"])
+@permission_classes([IsUserAuthenticated])
+def follow_tag_view(request, tag):
+    """Follow (POST) or unfollow (DELETE) a tag for the home feed"""
+    tag = normalize_tag(tag)
+    if tag is None:
+        return Response({"error": "Invalid tag"}, status=status.HTTP_400_BAD_REQUEST)
+    if request.method == "POST":
+        if follow_tag(request.user, tag):
+            return Response({"message": "Tag followed"}, status=status.HTTP_201_CREATED)
+        return Response(
+            {"message": "Already following this tag"}, status=status.HTTP_200_OK
+        )
+    if unfollow_tag(request.user, tag):
+        return Response({"message": "Tag unfollowed"}, status=status.HTTP_200_OK)
+    return Response(
+        {"error": "You are not following this tag"}, status=status.HTTP_404_NOT_FOUND
+    )
+
+
+@api_view(["POST", "DELETE"])
+@permission_classes([IsUserAuthenticated])
+@sharding.routed
+def follow(request, question_id):
+    """Follow (POST) or unfollow (DELETE) a question's new answers"""
     try:
         question = Question.objects.get(id=question_id, question_deleted=False)
-        serializer = QuestionDetailSerializer(question)
-        return Response(serializer.data, status=status.HTTP_200_OK)
     except Question.DoesNotExist:
         return Response(
             {"error": "Question not found"}, status=status.HTTP_404_NOT_FOUND
         )
+    if request.method == "POST":
+        if follow_question(request.user, question):
+            return Response(
+                {"message": "Question followed"}, status=status.HTTP_201_CREATED
+            )
+        return Response(
+            {"message": "Already following this question"}, status=status.HTTP_200_OK
+        )
+    if unfollow_question(request.user, question):
+        return Response({"message": "Question unfollowed"}, status=status.HTTP_200_OK)
+    return Response(
+        {"error": "You are not following this question"},
+        status=status.HTTP_404_NOT_FOUND,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+@sharding.routed
+def question_answer_list(request, question_id):
+    """Cursor-paginated answers of a question, sorted by answers_sort"""
+    if not Question.objects.filter(id=question_id, question_deleted=False).exists():
+        return Response(
+            {"error": "Question not found"}, status=status.HTTP_404_NOT_FOUND
+        )
+    paginator = AnswerCursorPagination()
+    answers = paginator.paginate_queryset(
+        question_answers(Question(id=question_id)), request
+    )
+    context = compact_context(request)
+    response = paginator.get_paginated_response(
+        AnswerSerializer(answers, many=True, context=context).data
+    )
+    add_side_loaded_users(response.data, context)
+    return response
+
+
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def suggest(request):
+    """
+    As-you-type title and tag suggestions for ?q=, served from the
+    in-memory typeahead index (no authentication, no database access)
+    """
+    try:
+        limit = int(request.query_params.get("limit", 0))
+    except ValueError:
+        return Response(
+            {"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    limit = min(max(limit, 0), 50)
+    return Response(
+        typeahead.suggest(request.query_params.get("q", ""), limit),
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def similar_questions(request):
+    """
+    Existing questions similar to a title (and optional description), to
+    catch re-asked questions before they are posted
+    """
+    title = request.query_params.get("title", "").strip()
+    if not title:
+        return Response(
+            {"error": "title is required"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    description = request.query_params.get("description", "").strip()
+    return Response(
+        {"results": find_similar(title, description)}, status=status.HTTP_200_OK
+    )
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+@sharding.routed
+def related_question_list(request, question_id):
+    """Questions related to a question, most related first"""
+    if not Question.objects.filter(id=question_id, question_deleted=False).exists():
+        return Response(
+            {"error": "Question not found"}, status=status.HTTP_404_NOT_FOUND
+        )
+    return Response(
+        {"results": related_questions(question_id)}, status=status.HTTP_200_OK
+    )
 
 
 @api_view(["POST"])
 @permission_classes([IsUserAuthenticated])
+@throttle_classes([WriteThrottle])
 def post_question(request):
-    """Post a new question (User only)"""
+    """
+    Post a new question (User only). The response lists existing questions
+    that look like near-duplicates of it.
+    """
     serializer = QuestionCreateSerializer(data=request.data)
     if serializer.is_valid():
-        question = serializer.save(user=request.user)
+        similar = find_similar(
+            serializer.validated_data["question_title"],
+            serializer.validated_data["question_description"],
+        )
+        with sharding.use_shard(sharding.place_question()):
+            question = serializer.save(user=request.user)
 
-        create_mention_notifications(question)
+            create_mention_notifications(question)
+            record_question_activity(question)
+            record_user_activity(request.user.id, questions=1)
+            index_question(question)
+            typeahead.record_question(question)
+            fan_out_question(question)
 
         return Response(
             {
                 "message": "Question posted successfully",
                 "question_id": question.id,
                 "question": serializer.data,
+                "similar_questions": similar,
             },
             status=status.HTTP_201_CREATED,
         )
@@ -462,6 +1169,8 @@ def post_question(request):
 
 @api_view(["PUT"])
 @permission_classes([IsUserAuthenticated])
+@throttle_classes([WriteThrottle])
+@sharding.routed
 def update_question(request, question_id):
     """Update a question (Only by the author)"""
     try:
@@ -476,9 +1185,13 @@ def update_question(request, question_id):
         serializer = QuestionCreateSerializer(question, data=request.data, partial=True)
 
         if serializer.is_valid():
-            updated_question = serializer.save()
+            with revisions.tracking(question, request.user):
+                updated_question = serializer.save()
 
             create_mention_notifications(updated_question)
+            record_question_activity(updated_question)
+            index_question(updated_question)
+            typeahead.record_question(updated_question)
 
             return Response(
                 {
@@ -498,6 +1211,7 @@ def update_question(request, question_id):
 
 @api_view(["DELETE"])
 @permission_classes([IsUserAuthenticated, IsAdminAuthenticated])
+@sharding.routed
 def delete_question(request, question_id):
     """
     Delete a question (only author or admin).
@@ -506,7 +1220,11 @@ def delete_question(request, question_id):
     try:
         question = Question.objects.get(id=question_id, question_deleted=False)
         question.question_deleted = True
-        question.save()
+        question.deleted_at = timezone.now()
+        question.save(update_fields=["question_deleted", "deleted_at"])
+        record_user_activity(question.user_id, questions=-1)
+        remove_question(question.id)
+        typeahead.remove_question(question.id)
 
         return Response(
             {"message": "Question deleted successfully"}, status=status.HTTP_200_OK
@@ -520,6 +1238,8 @@ def delete_question(request, question_id):
 
 @api_view(["POST"])
 @permission_classes([IsUserAuthenticated])
+@throttle_classes([VoteThrottle])
+@sharding.routed
 def toggle_upvote(request):
     """
     POST API to upvote (+1) or remove upvote (-1) on a question or answer.
@@ -562,6 +1282,8 @@ def toggle_upvote(request):
                 )
             Upvote.objects.create(question=question, by_user=user)
             update_reputation_for_upvote(question=question, vote=1)
+            record_question_activity(question, upvotes=1, touch=False)
+            record_user_activity(question.user_id, upvotes_received=1)
             return Response(
                 {"message": "Upvoted successfully"}, status=status.HTTP_201_CREATED
             )
@@ -569,6 +1291,8 @@ def toggle_upvote(request):
             if existing:
                 existing.delete()
                 update_reputation_for_upvote(question=question, vote=-1)
+                record_question_activity(question, upvotes=-1, touch=False)
+                record_user_activity(question.user_id, upvotes_received=-1)
                 return Response(
                     {"message": "Upvote removed"}, status=status.HTTP_200_OK
                 )
@@ -593,6 +1317,8 @@ def toggle_upvote(request):
                 )
             Upvote.objects.create(answer=answer, by_user=user)
             update_reputation_for_upvote(answer=answer, vote=1)
+            record_answer_vote(answer, 1)
+            record_user_activity(answer.user_id, upvotes_received=1)
             return Response(
                 {"message": "Upvoted successfully"}, status=status.HTTP_201_CREATED
             )
@@ -600,6 +1326,8 @@ def toggle_upvote(request):
             if existing:
                 existing.delete()
                 update_reputation_for_upvote(answer=answer, vote=-1)
+                record_answer_vote(answer, -1)
+                record_user_activity(answer.user_id, upvotes_received=-1)
                 return Response(
                     {"message": "Upvote removed"}, status=status.HTTP_200_OK
                 )
@@ -616,6 +1344,8 @@ def toggle_upvote(request):
 
 @api_view(["POST"])
 @permission_classes([IsUserAuthenticated])
+@throttle_classes([WriteThrottle])
+@sharding.routed
 def add_comment(request):
     """
     Add a comment to an answer (User only).
@@ -638,6 +1368,8 @@ def add_comment(request):
     comment = Comment.objects.create(
         answer=answer, user=request.user, comment_content=comment_content
     )
+    record_question_activity(answer.question, comments=1)
+    record_user_activity(request.user.id, comments=1)
 
     return Response(
         {
@@ -650,6 +1382,8 @@ def add_comment(request):
 
 @api_view(["PUT"])
 @permission_classes([IsUserAuthenticated])
+@throttle_classes([WriteThrottle])
+@sharding.routed
 def edit_comment(request, comment_id):
     """
     Edit a comment (only by the author).
@@ -674,8 +1408,10 @@ def edit_comment(request, comment_id):
             {"error": "comment_content is required"}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    comment.comment_content = new_content
-    comment.save()
+    with revisions.tracking(comment, request.user):
+        comment.comment_content = new_content
+        comment.save()
+    record_question_activity(comment.answer.question)
 
     return Response(
         {
@@ -688,6 +1424,7 @@ def edit_comment(request, comment_id):
 
 @api_view(["DELETE"])
 @permission_classes([IsUserAuthenticated, IsAdminAuthenticated])
+@sharding.routed
 def delete_comment(request, comment_id):
     """
     Soft-delete a comment (only by the author).
@@ -706,7 +1443,10 @@ def delete_comment(request, comment_id):
         )
 
     comment.comment_deleted = True
+    comment.deleted_at = timezone.now()
     comment.save()
+    record_question_activity(comment.answer.question, comments=-1, touch=False)
+    record_user_activity(comment.user_id, comments=-1)
 
     return Response(
         {"message": "Comment deleted successfully"}, status=status.HTTP_200_OK
@@ -715,18 +1455,46 @@ def delete_comment(request, comment_id):
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@sharding.routed
 def answer_detail(request, answer_id):
     """View a single answer by its ID"""
     try:
-        answer = Answer.objects.get(id=answer_id, answer_deleted=False)
-        serializer = AnswerSerializer(answer)
-        return Response(serializer.data, status=200)
+        answer = with_answer_details(Answer.objects).get(
+            id=answer_id, answer_deleted=False
+        )
+        context = compact_context(request)
+        serializer = AnswerSerializer(answer, context=context)
+        return Response(add_side_loaded_users(serializer.data, context), status=200)
     except Answer.DoesNotExist:
         return Response({"error": "Answer not found"}, status=404)
 
 
+@api_view(["GET"])
+@permission_classes([AllowAny])
+@sharding.routed
+def answer_comment_list(request, answer_id):
+    """Cursor-paginated comments of an answer"""
+    if not Answer.objects.filter(id=answer_id, answer_deleted=False).exists():
+        return Response({"error": "Answer not found"}, status=404)
+    paginator = CommentCursorPagination()
+    comments = paginator.paginate_queryset(
+        Comment.objects.filter(answer_id=answer_id, comment_deleted=False).select_related(
+            "user"
+        ),
+        request,
+    )
+    context = compact_context(request)
+    response = paginator.get_paginated_response(
+        CommentSerializer(comments, many=True, context=context).data
+    )
+    add_side_loaded_users(response.data, context)
+    return response
+
+
 @api_view(["POST"])
 @permission_classes([IsUserAuthenticated])
+@throttle_classes([WriteThrottle])
+@sharding.routed
 def post_answer(request, question_id):
     """Post a new answer to a question (User only)"""
     try:
@@ -736,8 +1504,9 @@ def post_answer(request, question_id):
     serializer = AnswerCreateSerializer(data=request.data)
     if serializer.is_valid():
         answer = serializer.save(user=request.user, question=question)
-    if serializer.is_valid():
-        answer = serializer.save(user=request.user)
+        record_question_activity(question, answers=1)
+        record_user_activity(request.user.id, answers=1)
+        fan_out_answer(answer)
         # Notification logic for mentions in answer_description
         # create_mention_notifications(answer)
         return Response(
@@ -752,6 +1521,8 @@ def post_answer(request, question_id):
 
 @api_view(["PUT"])
 @permission_classes([IsUserAuthenticated])
+@throttle_classes([WriteThrottle])
+@sharding.routed
 def update_answer(request, answer_id):
     """Update an answer (only by the author or admin)"""
     try:
@@ -769,7 +1540,9 @@ def update_answer(request, answer_id):
             )
         serializer = AnswerUpdateSerializer(answer, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with revisions.tracking(answer, request.user):
+                serializer.save()
+            record_question_activity(answer.question)
             # Notification logic for mentions in answer_description
             # create_mention_notifications(answer)
             return Response(
@@ -786,6 +1559,7 @@ def update_answer(request, answer_id):
 
 @api_view(["DELETE"])
 @permission_classes([IsUserAuthenticated, IsAdminAuthenticated])
+@sharding.routed
 def delete_answer(request, answer_id):
     """Delete an answer (soft delete, only by the author or admin)"""
     try:
@@ -802,7 +1576,10 @@ def delete_answer(request, answer_id):
                 {"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN
             )
         answer.answer_deleted = True
-        answer.save()
+        answer.deleted_at = timezone.now()
+        answer.save(update_fields=["answer_deleted", "deleted_at"])
+        record_question_activity(answer.question, answers=-1, touch=False)
+        record_user_activity(answer.user_id, answers=-1)
         # Delete all notifications related to this answer
         Notification.objects.filter(answer=answer).delete()
         return Response(
@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Route the read endpoints to their async implementations (api/async_views.py)
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'backend.asgi_urls')
 
 application = get_asgi_application()
+
+# Load the typeahead index before the first request (see api/typeahead.py)
+from api.typeahead import load_index  # noqa: E402
+
+load_index()
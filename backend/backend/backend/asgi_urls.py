@@ -0,0 +1,14 @@
+"""
+URL configuration used when the project is served through backend/asgi.py.
+
+Same routes as backend/urls.py, except that the API's read endpoints are
+served by the async views in api/async_views.py.
+"""
+from django.contrib import admin
+from django.urls import path, include
+import api.async_urls
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('api/', include(api.async_urls)),
+]
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +50,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.TrafficCaptureMiddleware',
+    'api.middleware.LoadSheddingMiddleware',
+    'api.middleware.IdentityMapMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,7 +62,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'backend.urls'
+# backend/asgi.py switches this to 'backend.asgi_urls' to serve the async views
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'backend.urls')
 
 TEMPLATES = [
     {
@@ -88,6 +94,110 @@ DATABASES = {
     }
 }
 
+# Questions and their answers, comments, votes and notifications sharded
+# across databases by question (see api/sharding.py); users, admins and the
+# other account-level tables stay in GLOBAL_DATABASE. Sharding is on with
+# more than one shard. Shards may only be appended. QA_SHARDS=<n> adds n - 1
+# local SQLite shards next to the default database for trying it out; run
+# `migrate --database <alias>` for each shard, then `init_shards`.
+SHARDING = {
+    'SHARDS': ['default'],
+    'GLOBAL_DATABASE': 'default',
+    'PLACEMENT_SHARDS': None,  # shards new questions go to (None: all)
+}
+for _shard in range(1, int(os.environ.get('QA_SHARDS', '1'))):
+    DATABASES[f'shard{_shard}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db-shard{_shard}.sqlite3',
+    }
+    SHARDING['SHARDS'].append(f'shard{_shard}')
+
+# Archived soft-deleted rows (see api/archive.py). Point DATABASE at another
+# alias (e.g. a separate SQLite file) to keep the archive out of the main
+# database; run `migrate --database <alias>` for it.
+ARCHIVE = {
+    'DATABASE': 'default',
+    'RETENTION_DAYS': 30,  # days a row stays soft-deleted before archival
+    'BATCH_SIZE': 200,  # top-level records archived per transaction
+}
+DATABASE_ROUTERS = ['api.routers.ArchiveRouter', 'api.routers.ShardRouter']
+
+# Write-behind question view counts (see api/view_counts.py)
+VIEW_COUNTS = {
+    'FLUSH_INTERVAL': 10,  # seconds between flushes of each worker's counts
+    'MAX_PENDING': 1000,  # questions with pending views that force a flush
+    'DEDUPE_WINDOW': 30 * 60,  # seconds repeat views are ignored (0: count all)
+    'MAX_VIEWERS': 100_000,  # (viewer, question) pairs remembered per worker
+}
+
+# Question follows (see api/follows.py)
+FOLLOWS = {
+    'FANOUT_MAX_FOLLOWERS': 1000,  # above this, followers are notified on read
+    'BATCH_SIZE': 500,  # notifications inserted per query
+}
+
+# Tag home feeds (see api/feed.py)
+FEED = {
+    'FANOUT_MAX_FOLLOWERS': 1000,  # above this, a tag's questions are merged on read
+    'MAX_ENTRIES': 500,  # feed entries kept per user (and per tag)
+    'BATCH_SIZE': 500,
+}
+
+# Compressed answer and comment text (see api/compression.py). CODEC "zstd"
+# needs the optional zstandard package and falls back to zlib without it.
+COMPRESSION = {
+    'ENABLED': True,
+    'THRESHOLD': 1024,  # values at least this long are stored compressed
+    'CODEC': 'zstd',
+    'LEVEL': 6,
+    'ZSTD_DICTIONARY': None,  # path written by compress_text_columns --train-dictionary
+    # Dictionaries replaced by a retrained one; rows compressed with them stay readable
+    'ZSTD_PREVIOUS_DICTIONARIES': [],
+}
+
+# Edit history (see api/revisions.py)
+REVISIONS = {
+    'SNAPSHOT_INTERVAL': 10,  # every Nth revision is stored in full, bounding rebuilds
+}
+
+# Sampled request capture for the replay_traffic command (see api/traffic.py)
+TRAFFIC_CAPTURE = {
+    'ENABLED': os.environ.get('TRAFFIC_CAPTURE', '') == '1',
+    'SAMPLE_RATE': 0.01,  # fraction of requests recorded
+    'LOG_DIR': BASE_DIR / 'traffic',
+    'MAX_BYTES': 50 * 1024 * 1024,  # per file before rotating
+    'BACKUP_COUNT': 5,
+}
+
+# Uploaded dumps waiting to be imported (see api/importer.py)
+IMPORTS = {
+    'UPLOAD_DIR': BASE_DIR / 'imports',
+    # Seconds without a heartbeat before a running import is marked failed
+    'STALE_AFTER': 600,
+}
+
+# Notification compaction (see api/notifications.py)
+NOTIFICATIONS = {
+    'DIGEST_WINDOW_HOURS': 24,  # notifications this close together are digested
+    'READ_RETENTION_DAYS': 90,  # read notifications older than this are purged
+    'BATCH_SIZE': 1000,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by all workers on the host so they agree on throttle buckets
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'qa_throttle_cache'),
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -108,6 +218,26 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.1/topics/auth/passwords/
+
+PASSWORD_HASHERS = [
+    'api.hashing.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Hashing pool used by login and registration (see api/hashing.py)
+PASSWORD_HASHING = {
+    'WORKERS': 2,  # hashing processes per web worker, 0 hashes inline
+    'MAX_PENDING': 32,  # hash requests allowed to wait for a free process
+    'QUEUE_TIMEOUT': 5,  # seconds to wait for a slot before answering 503
+    'PBKDF2_ITERATIONS': 870000,  # changing this rehashes passwords on next login
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -143,6 +273,33 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Token-bucket rates for the scopes in api/throttling.py
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': '10/min',
+        'vote': '60/min',
+        'write': '20/min',
+    },
+}
+
+# Load shedding (see api/middleware.py)
+LOAD_SHEDDING = {
+    'MAX_IN_FLIGHT': 200,  # requests in flight per worker before shedding everything
+    'MAX_PENDING_WRITES': 16,  # write requests in flight before shedding writes
+    'RETRY_AFTER': 2,  # seconds, sent in the Retry-After header
+}
+
+# Related-questions index (see api/related.py)
+RELATED_QUESTIONS = {
+    'INDEX_DIR': BASE_DIR / 'related_index',
+    'N_FEATURES': 2 ** 18,  # hashed TF-IDF feature space
+    'TOP_K': 10,  # neighbours kept per question
+}
+
+# Title and tag suggestions (see api/typeahead.py)
+TYPEAHEAD = {
+    'INDEX_DIR': BASE_DIR / 'typeahead_index',
+    'MAX_RESULTS': 8,
+    'MIN_PREFIX': 2,  # characters typed before suggesting anything
 }
 
 # JWT settings
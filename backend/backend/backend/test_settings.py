@@ -0,0 +1,21 @@
+"""
+Settings for the test suite:
+
+    python manage.py test --settings=backend.test_settings
+
+The test databases are built straight from the models (migrations are
+generated locally, see the README), and a second database is added for the
+sharding tests, which turn sharding on with override_settings.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+MIGRATION_MODULES = {'api': None}
+
+DATABASES = {
+    'shard1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-shard1.sqlite3',
+    },
+    **DATABASES,
+}
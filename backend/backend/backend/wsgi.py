@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Load the typeahead index before the first request (see api/typeahead.py)
+from api.typeahead import load_index  # noqa: E402
+
+load_index()
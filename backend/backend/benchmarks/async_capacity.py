@@ -0,0 +1,140 @@
+"""
+Concurrent-connection capacity benchmark: WSGI vs. ASGI.
+
+Opens an increasing number of concurrent keep-alive connections against each
+target and has every connection issue GET requests back to back for a fixed
+time, then reports throughput, latency percentiles and errors per
+concurrency level. Start both servers against the same database first, e.g.
+
+    python manage.py runserver 127.0.0.1:8000 --noreload
+    uvicorn backend.asgi:application --port 8001
+
+and run
+
+    python benchmarks/async_capacity.py \\
+        --target wsgi=http://127.0.0.1:8000 \\
+        --target asgi=http://127.0.0.1:8001 \\
+        --path /api/questions/ --path /api/questions/1/ \\
+        --concurrency 50,100,200,400 --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response and return its status code."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status_code = int(status_line.split()[1])
+
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(length)
+    return status_code
+
+
+async def connection_worker(host, port, paths, deadline, stats, timeout):
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+        for path in itertools.cycle(paths):
+            if time.monotonic() >= deadline:
+                break
+            request = (
+                f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                "Connection: keep-alive\r\n\r\n"
+            ).encode()
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status_code = await asyncio.wait_for(read_response(reader), timeout)
+            if status_code >= 500:
+                stats["errors"] += 1
+            else:
+                stats["latencies"].append((time.perf_counter() - started) * 1000)
+    except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+        stats["errors"] += 1
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def run_level(base_url, paths, concurrency, duration, timeout):
+    url = urlsplit(base_url)
+    stats = {"latencies": [], "errors": 0}
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(
+        *(
+            connection_worker(url.hostname, url.port or 80, paths, deadline, stats, timeout)
+            for _ in range(concurrency)
+        )
+    )
+    return stats, time.monotonic() - started
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--target",
+        action="append",
+        required=True,
+        help="name=base_url, may be repeated (e.g. asgi=http://127.0.0.1:8001)",
+    )
+    parser.add_argument("--path", action="append", help="Request path(s) to cycle through")
+    parser.add_argument("--concurrency", default="50,100,200,400")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per level")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout")
+    args = parser.parse_args()
+
+    paths = args.path or ["/api/questions/"]
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    print(f"{'target':<8} {'conns':>6} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for target in args.target:
+        name, _, base_url = target.partition("=")
+        for concurrency in levels:
+            stats, elapsed = await run_level(
+                base_url, paths, concurrency, args.duration, args.timeout
+            )
+            latencies = stats["latencies"]
+            p50 = statistics.median(latencies) if latencies else 0.0
+            p99 = percentile(latencies, 99) if latencies else 0.0
+            print(
+                f"{name:<8} {concurrency:>6} {len(latencies) / elapsed:>9.1f} "
+                f"{p50:>8.1f} {p99:>8.1f} {stats['errors']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
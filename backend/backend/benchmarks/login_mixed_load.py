@@ -0,0 +1,110 @@
+"""
+Mixed-load benchmark: login throughput vs. read-endpoint latency.
+
+Runs a pool of clients hammering the login endpoint next to a pool of clients
+reading the question list, against an already running server, and reports
+logins/sec plus read latency percentiles. Run it once with
+PASSWORD_HASHING["WORKERS"] = 0 (inline hashing) and once with the pool
+enabled to compare how much a login storm hurts read latency.
+
+Usage:
+    python benchmarks/login_mixed_load.py \\
+        --base-url http://127.0.0.1:8000/api \\
+        --email bench@example.com --password 'S3cret-pass!' \\
+        --login-clients 16 --read-clients 4 --duration 30
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import requests
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def login_worker(args, deadline, results, lock):
+    session = requests.Session()
+    ok = failed = rejected = 0
+    while time.monotonic() < deadline:
+        response = session.post(
+            f"{args.base_url}/auth/user/login/",
+            json={"email": args.email, "password": args.password},
+        )
+        if response.status_code == 200:
+            ok += 1
+        elif response.status_code == 503:
+            rejected += 1
+        else:
+            failed += 1
+    with lock:
+        results["logins"] += ok
+        results["login_failures"] += failed
+        results["login_rejected"] += rejected
+
+
+def read_worker(args, deadline, results, lock):
+    session = requests.Session()
+    latencies = []
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        response = session.get(f"{args.base_url}/questions/")
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    with lock:
+        results["read_latencies"].extend(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000/api")
+    parser.add_argument("--email", required=True, help="Email of an existing user")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--login-clients", type=int, default=16)
+    parser.add_argument("--read-clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    args = parser.parse_args()
+
+    results = {
+        "logins": 0,
+        "login_failures": 0,
+        "login_rejected": 0,
+        "read_latencies": [],
+    }
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+
+    threads = [
+        threading.Thread(target=login_worker, args=(args, deadline, results, lock))
+        for _ in range(args.login_clients)
+    ] + [
+        threading.Thread(target=read_worker, args=(args, deadline, results, lock))
+        for _ in range(args.read_clients)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies = results["read_latencies"]
+    print(f"duration          {elapsed:.1f}s")
+    print(f"logins/sec        {results['logins'] / elapsed:.1f}")
+    print(f"login failures    {results['login_failures']}")
+    print(f"login 503s        {results['login_rejected']}")
+    print(f"reads/sec         {len(latencies) / elapsed:.1f}")
+    if latencies:
+        print(f"read p50          {statistics.median(latencies):.1f} ms")
+        print(f"read p95          {percentile(latencies, 95):.1f} ms")
+        print(f"read p99          {percentile(latencies, 99):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
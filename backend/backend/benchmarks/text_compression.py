@@ -0,0 +1,197 @@
+"""
+Database size and read latency benchmark for compressed text columns.
+
+Works on a scratch copy of a database: measures its size and the latency of
+reading answers and comments, compresses the existing rows the way
+`manage.py compress_text_columns` does, vacuums, and measures again. Either
+copy an existing snapshot
+
+    python benchmarks/text_compression.py --db db.sqlite3
+
+or generate a synthetic one with code-heavy posts
+
+    python benchmarks/text_compression.py --generate 20000
+
+Set COMPRESSION["CODEC"] (zlib / zstd) in settings to compare codecs.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+SNIPPET = '''def {name}(items, key=None):
+    """Return the {name} of items, optionally by key."""
+    result = []
+    for index, item in enumerate(items):
+        value = key(item) if key else item
+        if value is not None and value not in result:
+            result.append(value)
+    return result
+'''
+
+PROSE = (
+    "You can do this with a generator expression instead of building the list "
+    "first. Note that the order is preserved, which matters if you rely on it "
+    "later. See the documentation for details. "
+)
+
+
+def synthetic_post(rng):
+    parts = []
+    for _ in range(rng.randint(1, 6)):
+        parts.append(PROSE * rng.randint(1, 3))
+        parts.append(SNIPPET.format(name=f"unique_{rng.randint(0, 10**6)}"))
+    return "\n".join(parts)
+
+
+def generate(count, rng):
+    from api import compression
+    from api.models import Answer, Comment, Question, UserDetail
+
+    user = UserDetail.objects.create(
+        username="bench", user_email="bench@example.com", user_password="-"
+    )
+    questions = Question.objects.bulk_create(
+        Question(
+            user=user, question_title=f"Question {i}", question_description="", question_tag="python"
+        )
+        for i in range(max(1, count // 10))
+    )
+    # Rows written before the columns were compressed
+    with compression.disabled():
+        answers = Answer.objects.bulk_create(
+            (
+                Answer(
+                    user=user,
+                    question=rng.choice(questions),
+                    answer_description=synthetic_post(rng),
+                )
+                for _ in range(count)
+            ),
+            batch_size=500,
+        )
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    user=user,
+                    answer=rng.choice(answers),
+                    comment_content=PROSE * rng.randint(1, 8),
+                )
+                for _ in range(count)
+            ),
+            batch_size=500,
+        )
+
+
+def measure(rounds, rng):
+    from django.db import connection
+
+    from api.models import Answer, Comment
+
+    with connection.cursor() as cursor:
+        cursor.execute("VACUUM")
+        cursor.execute("PRAGMA page_count")
+        pages = cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_size")
+        page_size = cursor.fetchone()[0]
+
+    question_ids = list(Answer.objects.values_list("question_id", flat=True).distinct())
+    latencies = []
+    for _ in range(rounds):
+        question_id = rng.choice(question_ids)
+        started = time.perf_counter()
+        answers = list(Answer.objects.filter(question_id=question_id))
+        list(Comment.objects.filter(answer__in=answers))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    texts = Answer.objects.values_list("answer_description", flat=True).iterator()
+    characters = sum(len(text) for text in texts)
+    scan = time.perf_counter() - started
+    return {
+        "size_mb": pages * page_size / 1024 / 1024,
+        "pages": pages,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "scan_s": scan,
+        "characters": characters,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db", help="SQLite snapshot to copy and measure")
+    source.add_argument("--generate", type=int, help="Build a synthetic DB with this many answers")
+    parser.add_argument("--rounds", type=int, default=500, help="Question pages read per measurement")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="text-compression-")
+    path = os.path.join(workdir, "bench.sqlite3")
+    if args.db:
+        shutil.copyfile(args.db, path)
+
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.DATABASES["default"]["NAME"] = path
+    from django.core.management import call_command
+
+    from api.compression import codec, compress_column
+    from api.management.commands.compress_text_columns import compressed_columns
+
+    rng = random.Random(args.seed)
+    try:
+        if args.generate:
+            # Build the schema straight from the current models
+            settings.MIGRATION_MODULES = {"api": None}
+            call_command("migrate", run_syncdb=True, verbosity=0)
+            generate(args.generate, rng)
+
+        before = measure(args.rounds, random.Random(args.seed))
+        started = time.perf_counter()
+        rewritten = sum(
+            compress_column(model, field_name, batch_size=args.batch_size)
+            for model, field_name in compressed_columns()
+        )
+        elapsed = time.perf_counter() - started
+        after = measure(args.rounds, random.Random(args.seed))
+        assert after["characters"] == before["characters"], "text changed"
+
+        print(f"codec: {codec()}, rows compressed: {rewritten} in {elapsed:.1f}s")
+        print(
+            f"{'':<8} {'size MB':>10} {'pages':>10} "
+            f"{'page p50 ms':>12} {'page p95 ms':>12} {'scan s':>8}"
+        )
+        for name, result in (("before", before), ("after", after)):
+            print(
+                f"{name:<8} {result['size_mb']:>10.2f} {result['pages']:>10} "
+                f"{result['p50']:>12.2f} {result['p95']:>12.2f} {result['scan_s']:>8.2f}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()